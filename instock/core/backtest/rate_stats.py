@@ -4,6 +4,8 @@
 import logging
 import numpy as np
 import pandas as pd
+import instock.core.hist_store as hst
+import instock.core.hist_panel as hpl
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
@@ -48,3 +50,55 @@ def get_rates(code_name, data, stock_column, threshold=101):
         logging.error(f"rate_stats.get_rates处理异常：{code}代码{e}")
 
     return pd.Series(stock_data_list, index=stock_column)
+
+
+# 批量计算收益率，结果同逐只调用 get_rates。
+# stocks 为信号的 (日期, 代码, 名称) 列表，data_all 为 {(date, 代码, 名称): DataFrame} 或 hist_panel 面板。
+# 每只股票的收盘价后面补 threshold 个 NaN 拼成一个数组，信号日期在各自日期序列上 searchsorted 得到起始行，
+# 再一次取出 (信号数, threshold) 的收盘价，算出各日相对首日的累计涨幅。
+# 返回 有结果的信号下标 和 (信号数, threshold - 1) 的收益率矩阵，不足的为 NaN。
+def get_rates_matrix(stocks, data_all, date, threshold=101):
+    is_panel = isinstance(data_all, hpl.PanelData)
+    if is_panel:
+        date_row = data_all.columns.index('date')
+        close_row = data_all.columns.index('close')
+    start_dates = [stock[0] for stock in stocks]
+    start_dates = hst.to_days(start_dates).astype(np.float64) if is_panel else np.array(start_dates, dtype=object)
+    groups = {}
+    for i, stock in enumerate(stocks):
+        groups.setdefault((date, stock[1], stock[2]), []).append(i)
+    closes = []
+    starts = np.full(len(stocks), -1, dtype=np.int64)
+    counts = np.zeros(len(stocks), dtype=np.int64)
+    offset = 0
+    pad = np.full(threshold, np.nan)
+    for key, index in groups.items():
+        try:
+            index = np.array(index, dtype=np.int64)
+            if is_panel:
+                extent = data_all.extents_of(key)
+                if extent is None:
+                    continue
+                block = data_all.block_at(*extent)
+                dates, close = block[date_row], block[close_row]
+            else:
+                data = data_all.get(key)
+                if data is None:
+                    continue
+                dates, close = data['date'].values, data['close'].values
+            rows = np.searchsorted(dates, start_dates[index], side='left')
+            starts[index] = offset + rows
+            counts[index] = np.minimum(len(close) - rows, threshold)
+            closes.append(np.asarray(close, dtype=np.float64))
+            closes.append(pad)
+            offset += len(close) + threshold
+        except Exception as e:
+            logging.error(f"rate_stats.get_rates_matrix处理异常：{key[1]}代码{e}")
+    valid = np.flatnonzero(counts > 1)
+    if len(valid) == 0:
+        return valid, np.zeros((0, threshold - 1))
+    values = np.concatenate(closes)[starts[valid, None] + np.arange(threshold)]
+    close1 = values[:, :1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = np.around(100 * (values[:, 1:] - close1) / close1, decimals=2)
+    return valid, rates
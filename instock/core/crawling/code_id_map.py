@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+Date: 2026/10/18
+Desc: 东方财富-代码和市场标识映射，本地文件缓存
+"""
+import os.path
+import json
+import logging
+import datetime
+import threading
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 代码 -> 东方财富市场标识(secid 前缀，1 上海，0 深圳/北京)。
+# 映射保存在本地文件里，每天第一次使用时重新下载一次，下载失败继续用旧文件；
+# 文件里没有的代码(如新上市)按代码前缀推断，不再为了一个代码下载整个列表。
+
+cpath_current = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+code_id_cache_path = os.path.join(cpath_current, 'cache', 'code_id')
+
+
+# 股票：6开头上海，900开头上海B股，920开头北交所，其他深圳/北交所。
+def stock_market_id(code):
+    if code.startswith('92'):
+        return 0
+    if code.startswith(('6', '9')):
+        return 1
+    return 0
+
+
+# ETF：5开头上海，1开头深圳。
+def etf_market_id(code):
+    if code.startswith('5'):
+        return 1
+    return 0
+
+
+class CodeIdMap(dict):
+    def __init__(self, name, fetch_fun, prefix_fun):
+        super().__init__()
+        self.name = name
+        self.fetch_fun = fetch_fun
+        self.prefix_fun = prefix_fun
+        self.cache_file = os.path.join(code_id_cache_path, f"{name}.json")
+        self.load_date = None
+        self.load()
+
+    # 按市场分组保存：{"date": 下载日期, "ids": {市场标识: "代码,代码,..."}}
+    def _read(self):
+        if not os.path.isfile(self.cache_file):
+            return None, {}
+        try:
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+            codes = {}
+            for market_id, text in data['ids'].items():
+                codes.update(dict.fromkeys(text.split(','), int(market_id)))
+            return data['date'], codes
+        except Exception as e:
+            logging.error(f"code_id_map.CodeIdMap读取异常：{self.cache_file}{e}")
+            return None, {}
+
+    def _write(self, date, codes):
+        groups = {}
+        for code, market_id in codes.items():
+            groups.setdefault(str(market_id), []).append(code)
+        data = {'date': date, 'ids': {k: ','.join(sorted(v)) for k, v in groups.items()}}
+        if not os.path.exists(code_id_cache_path):
+            os.makedirs(code_id_cache_path)
+        tmp_file = self.cache_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_file, self.cache_file)
+
+    # 用当天的数据替换全部内容，已退市、已改市场的代码和按前缀推断的代码不会留下。
+    def load(self):
+        today = datetime.date.today().strftime("%Y-%m-%d")
+        self.load_date = today
+        date, codes = self._read()
+        if date != today:
+            try:
+                fetched = self.fetch_fun()
+                if fetched:
+                    codes = {str(k): int(v) for k, v in fetched.items()}
+                    self._write(today, codes)
+            except Exception as e:
+                logging.error(f"code_id_map.CodeIdMap下载异常，使用本地数据：{self.name}{e}")
+        self.clear()
+        self.update(codes)
+
+    def __missing__(self, code):
+        market_id = self.prefix_fun(code)
+        self[code] = market_id
+        return market_id
+
+
+_maps = {}
+_maps_lock = threading.Lock()
+
+
+# 同一名称在进程内只加载一次，长期运行的进程(web)跨天后重新加载成新的对象再替换，
+# 其他线程不会读到加载到一半的内容。
+def get_map(name, fetch_fun, prefix_fun):
+    with _maps_lock:
+        m = _maps.get(name)
+        if m is None or m.load_date != datetime.date.today().strftime("%Y-%m-%d"):
+            m = CodeIdMap(name, fetch_fun, prefix_fun)
+            _maps[name] = m
+        return m
@@ -6,7 +6,7 @@ Desc: 新浪财经-龙虎榜
 https://vip.stock.finance.sina.com.cn/q/go.php/vInvestConsult/kind/lhb/index.phtml
 """
 import pandas as pd
-import requests
+import instock.lib.fetcher as fetcher
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 
@@ -27,7 +27,7 @@ def stock_lhb_detail_daily_sina(
     trade_date = "-".join([trade_date[:4], trade_date[4:6], trade_date[6:]])
     url = "http://vip.stock.finance.sina.com.cn/q/go.php/vInvestConsult/kind/lhb/index.phtml"
     params = {"tradedate": trade_date}
-    r = requests.get(url, params=params)
+    r = fetcher.get(url, params=params)
     soup = BeautifulSoup(r.text, "lxml")
     table_name_list = [
         item.get_text().strip()
@@ -59,7 +59,7 @@ def _find_last_page(url: str = None, recent_day: str = "60"):
         "last": recent_day,
         "p": "1",
     }
-    r = requests.get(url, params=params)
+    r = fetcher.get(url, params=params)
     soup = BeautifulSoup(r.text, "lxml")
     try:
         previous_page = int(soup.find_all(attrs={"class": "page"})[-2].text)
@@ -71,7 +71,7 @@ def _find_last_page(url: str = None, recent_day: str = "60"):
                 "last": recent_day,
                 "p": previous_page,
             }
-            r = requests.get(url, params=params)
+            r = fetcher.get(url, params=params)
             soup = BeautifulSoup(r.text, "lxml")
             last_page = int(soup.find_all(attrs={"class": "page"})[-2].text)
             if last_page != previous_page:
@@ -99,7 +99,7 @@ def stock_lhb_ggtj_sina(recent_day: str = "30") -> pd.DataFrame:
             "last": recent_day,
             "p": page,
         }
-        r = requests.get(url, params=params)
+        r = fetcher.get(url, params=params)
         temp_df = pd.read_html(r.text)[0].iloc[0:, :]
         big_df = pd.concat([big_df, temp_df], ignore_index=True)
     big_df["股票代码"] = big_df["股票代码"].astype(str).str.zfill(6)
@@ -124,7 +124,7 @@ def stock_lhb_yytj_sina(recent_day: str = "5") -> pd.DataFrame:
             "last": "5",
             "p": page,
         }
-        r = requests.get(url, params=params)
+        r = fetcher.get(url, params=params)
         temp_df = pd.read_html(r.text)[0].iloc[0:, :]
         big_df = pd.concat([big_df, temp_df], ignore_index=True)
     big_df.columns = ["营业部名称", "上榜次数", "累积购买额", "买入席位数", "累积卖出额", "卖出席位数", "买入前三股票"]
@@ -151,7 +151,7 @@ def stock_lhb_jgzz_sina(recent_day: str = "5") -> pd.DataFrame:
             "last": recent_day,
             "p": page,
         }
-        r = requests.get(url, params=params)
+        r = fetcher.get(url, params=params)
         temp_df = pd.read_html(r.text)[0].iloc[0:, :]
         big_df = pd.concat([big_df, temp_df], ignore_index=True)
     big_df["股票代码"] = big_df["股票代码"].astype(str).str.zfill(6)
@@ -174,7 +174,7 @@ def stock_lhb_jgmx_sina() -> pd.DataFrame:
     params = {
         "p": "1",
     }
-    r = requests.get(url, params=params)
+    r = fetcher.get(url, params=params)
     soup = BeautifulSoup(r.text, "lxml")
     try:
         last_page_num = int(soup.find_all(attrs={"class": "page"})[-2].text)
@@ -185,7 +185,7 @@ def stock_lhb_jgmx_sina() -> pd.DataFrame:
         params = {
             "p": page,
         }
-        r = requests.get(url, params=params)
+        r = fetcher.get(url, params=params)
         temp_df = pd.read_html(r.text)[0].iloc[0:, :]
         big_df = pd.concat([big_df, temp_df], ignore_index=True)
     big_df["股票代码"] = big_df["股票代码"].astype(str).str.zfill(6)
@@ -2,7 +2,7 @@
 # !/usr/bin/env python
 
 import pandas as pd
-import requests
+import instock.lib.fetcher as fetcher
 
 import sys
 import os
@@ -34,7 +34,7 @@ def stock_selection() -> pd.DataFrame:
         "source": "SELECT_SECURITIES",
         "client": "WEB"
     }
-    r = requests.get(url, params=params)
+    r = fetcher.get(url, params=params)
     data_json = r.json()
     data = data_json["result"]["data"]
     if not data:
@@ -73,7 +73,7 @@ def stock_selection_params():
         "client": "WEB"
     }
 
-    r = requests.get(url, params=params)
+    r = fetcher.get(url, params=params)
     data_json = r.json()
     zxzb = data_json["zxzb"]  # 指标
     print(zxzb)
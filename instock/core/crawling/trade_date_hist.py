@@ -8,8 +8,7 @@ https://finance.sina.com.cn/realstock/company/klc_td_sh.txt
 """
 import datetime
 import pandas as pd
-import requests
-from py_mini_racer import py_mini_racer
+import instock.lib.fetcher as fetcher
 
 hk_js_decode = """
 function d(t) {
@@ -310,7 +309,8 @@ def tool_trade_date_hist_sina() -> pd.DataFrame:
     :rtype: pandas.DataFrame
     """
     url = "https://finance.sina.com.cn/realstock/company/klc_td_sh.txt"
-    r = requests.get(url)
+    r = fetcher.get(url)
+    from py_mini_racer import py_mini_racer  # 只在下载日历时加载 V8
     js_code = py_mini_racer.MiniRacer()
     js_code.eval(hk_js_decode)
     dict_list = js_code.call(
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import json
+import logging
+import threading
+import contextlib
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+import instock.core.hist_store as hst
+import instock.lib.table_version as tvr
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 当天全部股票历史行情的面板文件，收盘后加载一次，各作业、各进程共用。
+# 数据文件 <日期>.bin 里每只股票一个数据块：(列数, 行数) 的 float64，日期列存为距1970-01-01的天数；
+# 描述文件 <日期>.json 记录列名、股票键和每只股票的起始行、行数以及没有抓取到的股票，数据文件写完后才写描述文件。
+# 读取用只读 np.memmap，多个进程映射同一份页缓存，取出的 DataFrame 数值列是零拷贝的只读视图。
+# 加载时逐只写入数据文件，内存里只保留正在处理的股票，加载完成后改为映射文件。
+# 同一天的加载用文件锁互斥，其他进程等待后直接映射，不重复抓取。
+
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+hist_panel_cache_path = os.path.join(cpath_current, 'cache', 'hist_panel')
+PANEL_VERSION = 1
+KEEP_PANELS = 3  # 保留最近几天的面板文件
+DATE_FIELD = hst.DATE_FIELD
+HIST_TABLE = 'cn_stock_hist'  # 面板发布后更新这个名字的数据版本(table_version)
+_VALUE_DTYPE = np.dtype('<f8')
+
+
+def _files(date, path=hist_panel_cache_path):
+    base = os.path.join(path, date.replace('-', ''))
+    return base + '.bin', base + '.json', base + '.lock'
+
+
+# DataFrame 转成一个数据块。
+def frame_block(data, columns):
+    block = np.empty((len(columns), len(data.index)), dtype=_VALUE_DTYPE)
+    for j, c in enumerate(columns):
+        if c == DATE_FIELD:
+            block[j] = hst.to_days(data[c].values)
+        else:
+            block[j] = data[c].values
+    return block
+
+
+class PanelData(Mapping):
+    # values 为全部数据块拼成的一维 float64 数组(映射的数据文件)，extents 为每只股票的(起始行, 行数)。
+    def __init__(self, values, columns, keys, extents, first_day, last_day, missing=()):
+        self.values = values
+        self.columns = tuple(columns)
+        self.keys_list = [tuple(k) for k in keys]
+        self.extents = [tuple(e) for e in extents]
+        self._index = dict(zip(self.keys_list, self.extents))
+        self._codes = {k[1]: e for k, e in zip(self.keys_list, self.extents)}
+        self.first_day = first_day
+        self.last_day = last_day
+        # 日期字符串表，同一天的字符串所有股票共用，取数时按天数下标直接取出。
+        self._date_str = hst.to_date_str(np.arange(first_day, last_day + 1)).astype(object)
+        self.missing = [tuple(k) for k in missing]  # 发布时没有抓取到数据的股票键
+        self.stamp = None  # 描述文件的修改时间，重新发布后据此重新映射
+
+    # 一只股票的数据块 (列数, 行数)，零拷贝。
+    def block_at(self, start, n):
+        width = len(self.columns)
+        return self.values[start * width:(start + n) * width].reshape(width, n)
+
+    def frame_at(self, start, n):
+        block = self.block_at(start, n)
+        data = {}
+        for j, c in enumerate(self.columns):
+            if c == DATE_FIELD:
+                data[c] = self._date_str[block[j].astype(np.int64) - self.first_day]
+            else:
+                data[c] = block[j]
+        return pd.DataFrame(data, copy=False)
+
+    def __getitem__(self, key):
+        return self.frame_at(*self._index[key])
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    # 股票键对应的(起始行, 行数)，没有返回 None。
+    def extents_of(self, key):
+        return self._index.get(tuple(key))
+
+    def get_frame(self, code):
+        extent = self._codes.get(code)
+        if extent is None:
+            return None
+        return self.frame_at(*extent)
+
+
+# 映射已发布的面板文件，没有或版本不符返回 None。
+def attach(date, path=hist_panel_cache_path):
+    data_file, meta_file, _ = _files(date, path)
+    if not os.path.isfile(meta_file) or not os.path.isfile(data_file):
+        return None
+    try:
+        with open(meta_file, 'r') as f:
+            meta = json.load(f)
+        if meta['version'] != PANEL_VERSION or meta['date'] != date:
+            return None
+        width = len(meta['columns'])
+        rows = meta['rows']
+        if os.path.getsize(data_file) != rows * width * _VALUE_DTYPE.itemsize:
+            logging.error(f"hist_panel.attach数据文件不完整：{data_file}")
+            return None
+        values = np.memmap(data_file, dtype=_VALUE_DTYPE, mode='r', shape=(rows * width,))
+        panel = PanelData(values, meta['columns'], meta['keys'], meta['extents'], meta['first_day'],
+                          meta['last_day'], meta.get('missing', ()))
+        panel.stamp = os.stat(meta_file).st_mtime_ns
+        return panel
+    except Exception as e:
+        logging.error(f"hist_panel.attach处理异常：{meta_file}{e}")
+    return None
+
+
+class PanelWriter:
+    def __init__(self, date, path=hist_panel_cache_path):
+        self.date = date
+        self.path = path
+        self.data_file, self.meta_file, _ = _files(date, path)
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self._tmp_file = self.data_file + '.tmp'
+        self._file = open(self._tmp_file, 'wb')
+        self._lock = threading.Lock()
+        self.columns = None
+        self.keys = []
+        self.extents = []
+        self.rows = 0
+        self.first_day = None
+        self.last_day = None
+
+    # 写入一只股票，之后不再需要保留这个 DataFrame。
+    def add(self, key, data):
+        if data is None or len(data.index) == 0:
+            return
+        with self._lock:
+            columns = tuple(data.columns)
+            if self.columns is None:
+                self.columns = columns
+            elif columns != self.columns:
+                raise ValueError(f"字段不一致：{key[1]}{columns}")
+            block = frame_block(data, columns)
+            self._file.write(block.tobytes())
+            n = len(data.index)
+            days = block[columns.index(DATE_FIELD)]
+            first_day, last_day = int(days.min()), int(days.max())
+            self.first_day = first_day if self.first_day is None else min(self.first_day, first_day)
+            self.last_day = last_day if self.last_day is None else max(self.last_day, last_day)
+            self.keys.append(list(key))
+            self.extents.append((self.rows, n))
+            self.rows += n
+
+    # 复制已发布面板的全部股票，补抓缺失的股票后重新发布时使用。
+    def add_panel(self, panel):
+        with self._lock:
+            if self.columns is None:
+                self.columns = panel.columns
+            elif panel.columns != self.columns:
+                raise ValueError(f"字段不一致：{panel.columns}")
+            for key, (start, n) in zip(panel.keys_list, panel.extents):
+                self._file.write(panel.block_at(start, n).tobytes())
+                self.keys.append(list(key))
+                self.extents.append((self.rows, n))
+                self.rows += n
+            self.first_day = panel.first_day if self.first_day is None else min(self.first_day, panel.first_day)
+            self.last_day = panel.last_day if self.last_day is None else max(self.last_day, panel.last_day)
+
+    # 发布并映射面板文件，没有数据返回 None。
+    # missing 为没有抓取到数据的股票键，记录在描述文件里，之后加载同一天的面板时重新抓取。
+    def finish(self, missing=()):
+        self._file.close()
+        if not self.keys:
+            os.remove(self._tmp_file)
+            return None
+        os.replace(self._tmp_file, self.data_file)
+        meta = {'version': PANEL_VERSION, 'date': self.date, 'columns': list(self.columns), 'rows': self.rows,
+                'first_day': self.first_day, 'last_day': self.last_day, 'keys': self.keys,
+                'extents': self.extents, 'missing': [list(k) for k in missing]}
+        tmp_file = self.meta_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(meta, f, separators=(',', ':'))
+        os.replace(tmp_file, self.meta_file)
+        _remove_old(self.path, self.date)
+        tvr.touch(HIST_TABLE, [self.date])
+        return attach(self.date, self.path)
+
+    def abort(self):
+        try:
+            self._file.close()
+            os.remove(self._tmp_file)
+        except Exception:
+            pass
+
+
+# 按发布时间只保留最近发布的 KEEP_PANELS 个面板，刚发布的 keep_date 不删除(补跑过去的日期时它不是最新的日期)。
+# 已映射的进程不受删除影响。<日期>.lock 不删除：其他进程可能正持有或等待这个文件上的锁，
+# 删除后再加载同一天会新建一个锁文件，两个进程就会同时加载。
+def _remove_old(path, keep_date=None):
+    try:
+        keep = None if keep_date is None else keep_date.replace('-', '')
+        metas = [f for f in os.listdir(path) if f.endswith('.json') and f[:-5] != keep]
+        metas.sort(key=lambda f: os.path.getmtime(os.path.join(path, f)))
+        for meta in metas[:max(0, len(metas) - (KEEP_PANELS - 1))]:
+            for file in _files(meta[:-5], path)[:2]:
+                if os.path.isfile(file):
+                    os.remove(file)
+    except Exception as e:
+        logging.error(f"hist_panel._remove_old处理异常：{e}")
+
+
+# 同一天的面板加载在进程间互斥。
+@contextlib.contextmanager
+def lock(date, path=hist_panel_cache_path):
+    if fcntl is None:
+        yield
+        return
+    if not os.path.exists(path):
+        os.makedirs(path)
+    with open(_files(date, path)[2], 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_panels = {}
+_panels_lock = threading.Lock()
+
+
+# 进程内按日期缓存映射，供 web 等单只股票读取。
+def get_panel(date):
+    with _panels_lock:
+        panel = _panels.get(date)
+        if panel is not None and panel.stamp != _stamp(date):
+            panel = None
+        if panel is None:
+            panel = attach(date)
+            if panel is not None:
+                _panels.clear()
+                _panels[date] = panel
+        return panel
+
+
+def _stamp(date, path=hist_panel_cache_path):
+    try:
+        return os.stat(_files(date, path)[1]).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_frame(date, code):
+    panel = get_panel(date)
+    if panel is None:
+        return None
+    return panel.get_frame(code)
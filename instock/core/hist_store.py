@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import json
+import logging
+import threading
+import contextlib
+import numpy as np
+import pandas as pd
+import instock.core.tablestructure as tbs
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 列式历史行情存储。
+# 全部代码的同一字段存放在一个二进制文件里（<field>.<generation>.bin），
+# 索引文件 meta.json 记录每个代码占用的行区间（extents）。
+# 读取使用 np.memmap，单区间时直接返回零拷贝切片。
+# 追加只写文件尾部并更新索引，碎片或废弃行过多时自动压缩(compact)成每个代码一个连续区间。
+# web 进程和作业进程共用同一个存储：写入(追加、保存索引、压缩)持有 store.lock 文件锁，批量写入时整批持有，
+# 取得锁后重新读取索引，并丢弃上次异常退出时写了一半的尾部数据。
+# 读取不加锁，索引文件变化时重新读取；同一 generation 的数据文件只在索引登记的行之后追加，已登记的行不会改变。
+
+HIST_FIELDS = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
+DATE_FIELD = 'date'
+_DATE_DTYPE = np.dtype('<i4')  # 距1970-01-01的天数
+_VALUE_DTYPE = np.dtype('<f8')
+_META_FILE = 'meta.json'
+_LOCK_FILE = 'store.lock'
+_COMPACT_RATIO = 8  # 平均每个代码的区间数超过该值时压缩
+
+
+def _field_dtype(field):
+    return _DATE_DTYPE if field == DATE_FIELD else _VALUE_DTYPE
+
+
+# 日期字符串/日期 转 天数
+def to_days(dates):
+    return pd.to_datetime(pd.Series(dates)).values.astype('datetime64[D]').astype(_DATE_DTYPE)
+
+
+# 天数 转 日期字符串 YYYY-MM-DD
+def to_date_str(days):
+    return np.datetime_as_string(np.asarray(days).astype('datetime64[D]'), unit='D')
+
+
+# 天数 转 datetime.date
+def to_date(day):
+    return (np.datetime64(int(day), 'D')).astype(object)
+
+
+class HistStore:
+    def __init__(self, path, fields=HIST_FIELDS):
+        self.path = path
+        self.fields = tuple(fields)
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._dirty = False
+        self._maps = None
+        self._maps_key = None
+        self._meta_stamp = None
+        self._writers = 0
+        self._lock_file = None
+        if not os.path.exists(path):
+            os.makedirs(path, exist_ok=True)
+        self._load_meta()
+
+    def _file(self, field, generation=None):
+        if generation is None:
+            generation = self._generation
+        return os.path.join(self.path, f"{field}.{generation}.bin")
+
+    def _stamp(self):
+        try:
+            st = os.stat(os.path.join(self.path, _META_FILE))
+            return st.st_ino, st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    # 读取索引，不修改文件。
+    def _load_meta(self):
+        meta_file = os.path.join(self.path, _META_FILE)
+        self._meta_stamp = self._stamp()
+        self._generation = 0
+        self._rows = 0
+        self._index = {}
+        self._maps = None
+        if os.path.isfile(meta_file):
+            try:
+                with open(meta_file, 'r') as f:
+                    meta = json.load(f)
+                if tuple(meta['fields']) == self.fields:
+                    self._generation = meta['generation']
+                    self._rows = meta['rows']
+                    self._index = {k: [tuple(e) for e in v] for k, v in meta['codes'].items()}
+                else:
+                    logging.error(f"hist_store.HistStore字段不一致，重建存储：{self.path}")
+            except Exception as e:
+                logging.error(f"hist_store.HistStore读取索引异常，重建存储：{self.path}{e}")
+                self._rows = 0
+                self._index = {}
+        if self._rows > 0 and not all(os.path.isfile(self._file(f)) for f in self.fields):
+            logging.error(f"hist_store.HistStore数据文件缺失，重建存储：{self.path}")
+            self._rows = 0
+            self._index = {}
+
+    # 其它进程保存了索引时重新读取，本进程正在写入时内存里的索引是最新的。
+    def _refresh(self):
+        if self._writers == 0 and self._stamp() != self._meta_stamp:
+            self._load_meta()
+
+    # 写入期间持有文件锁，可嵌套，同一进程内的多个线程共用。
+    @contextlib.contextmanager
+    def _writing(self):
+        with self._lock:
+            if self._writers == 0:
+                self._acquire()
+            self._writers += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._writers -= 1
+                if self._writers == 0:
+                    self._release()
+
+    def _acquire(self):
+        if fcntl is not None:
+            self._lock_file = open(os.path.join(self.path, _LOCK_FILE), 'a')
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            self._load_meta()
+            # 丢弃上次异常退出时写了一半、没有登记到索引的尾部数据。
+            for field in self.fields:
+                file = self._file(field)
+                size = self._rows * _field_dtype(field).itemsize
+                if not os.path.isfile(file) or size == 0:
+                    open(file, 'wb').close()
+                elif os.path.getsize(file) != size:
+                    with open(file, 'r+b') as f:
+                        f.truncate(size)
+        except Exception:
+            self._release()
+            raise
+
+    def _release(self):
+        if self._lock_file is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            finally:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def _write_meta(self):
+        meta = {'fields': list(self.fields), 'generation': self._generation, 'rows': self._rows,
+                'codes': {k: [list(e) for e in v] for k, v in self._index.items()}}
+        meta_file = os.path.join(self.path, _META_FILE)
+        tmp_file = meta_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(meta, f, separators=(',', ':'))
+        os.replace(tmp_file, meta_file)
+        self._meta_stamp = self._stamp()
+
+    def _memmaps(self):
+        maps = self._maps
+        if maps is None or self._maps_key != (self._generation, self._rows):
+            maps = {}
+            for field in self.fields:
+                if self._rows == 0:
+                    maps[field] = np.empty(0, dtype=_field_dtype(field))
+                else:
+                    maps[field] = np.memmap(self._file(field), dtype=_field_dtype(field), mode='r',
+                                            shape=(self._rows,))
+            self._maps = maps
+            self._maps_key = (self._generation, self._rows)
+        return maps
+
+    # 其它进程压缩后旧 generation 的文件已删除，重新读取索引后再打开。
+    def _open_maps(self):
+        try:
+            return self._memmaps()
+        except FileNotFoundError:
+            self._load_meta()
+            return self._memmaps()
+
+    def has(self, code):
+        with self._lock:
+            self._refresh()
+            return code in self._index
+
+    def codes(self):
+        with self._lock:
+            self._refresh()
+            return list(self._index.keys())
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._index)
+
+    def length(self, code):
+        extents = self._index.get(code)
+        if not extents:
+            return 0
+        return sum(e - s for s, e in extents)
+
+    def last_day(self, code):
+        with self._lock:
+            self._refresh()
+            extents = self._index.get(code)
+            if not extents:
+                return None
+            return int(self._open_maps()[DATE_FIELD][extents[-1][1] - 1])
+
+    # 返回 字段->数组，单区间时为零拷贝的只读 memmap 切片。
+    def get_arrays(self, code, fields=None):
+        with self._lock:
+            self._refresh()
+            extents = self._index.get(code)
+            if not extents:
+                return None
+            maps = self._open_maps()
+        if fields is None:
+            fields = self.fields
+        if len(extents) == 1:
+            s, e = extents[0]
+            return {f: maps[f][s:e] for f in fields}
+        return {f: np.concatenate([maps[f][s:e] for s, e in extents]) for f in fields}
+
+    # 返回和原 pickle 缓存同样列的 DataFrame，数值列不复制。
+    def get_frame(self, code):
+        arrays = self.get_arrays(code)
+        if arrays is None:
+            return None
+        columns = {}
+        for field in self.fields:
+            if field == DATE_FIELD:
+                columns[field] = to_date_str(arrays[field]).astype(object)
+            else:
+                columns[field] = arrays[field]
+        return pd.DataFrame(columns, copy=False)
+
+    # 追加一个代码的新数据（按日期升序）到文件尾部。
+    def append(self, code, data):
+        if data is None or len(data.index) == 0:
+            return
+        with self._lock, self._writing():
+            n = len(data.index)
+            for field in self.fields:
+                if field == DATE_FIELD:
+                    values = to_days(data[field].values)
+                else:
+                    values = np.ascontiguousarray(data[field].values, dtype=_VALUE_DTYPE)
+                with open(self._file(field), 'ab') as f:
+                    f.write(values.tobytes())
+            start = self._rows
+            self._rows += n
+            extents = self._index.setdefault(code, [])
+            if extents and extents[-1][1] == start:
+                extents[-1] = (extents[-1][0], self._rows)
+            else:
+                extents.append((start, self._rows))
+            self._dirty = True
+            if self._batch_depth == 0:
+                self.flush()
+
+    # 按日期合并新数据：丢弃已有的、日期不早于新数据第一天的行，再追加到尾部。
+    # 被丢弃的行只是不再被索引引用，压缩时回收。
+    def upsert(self, code, data):
+        if data is None or len(data.index) == 0:
+            return
+        data = data.drop_duplicates(subset=DATE_FIELD, keep='last')
+        with self._lock, self._writing():
+            dates = self.get_arrays(code, (DATE_FIELD,))
+            if dates is not None:
+                first_day = to_days(data[DATE_FIELD].values[:1])[0]
+                self._truncate(code, int(np.searchsorted(dates[DATE_FIELD], first_day, side='left')))
+            self.append(code, data)
+
+    # 只保留一个代码的前 n 行。
+    def _truncate(self, code, n):
+        extents = self._index.get(code)
+        if not extents or self.length(code) == n:
+            return
+        kept = []
+        for s, e in extents:
+            if n <= 0:
+                break
+            kept.append((s, s + min(e - s, n)))
+            n -= e - s
+        if kept:
+            self._index[code] = kept
+        else:
+            del self._index[code]
+        self._dirty = True
+
+    # 批量写入时整批持有文件锁，只在结束时保存一次索引。
+    @contextlib.contextmanager
+    def batch(self):
+        with self._writing():
+            with self._lock:
+                self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                with self._lock:
+                    self._batch_depth -= 1
+                    if self._batch_depth == 0:
+                        self.flush()
+
+    def flush(self):
+        with self._lock, self._writing():
+            if not self._dirty:
+                return
+            n_extents = sum(len(v) for v in self._index.values())
+            n_live = sum(self.length(code) for code in self._index)
+            if (self._index and n_extents > _COMPACT_RATIO * len(self._index)) or n_live * 2 < self._rows:
+                self.compact()
+            else:
+                self._write_meta()
+            self._dirty = False
+
+    # 重写成每个代码一个连续区间，写入新的 generation 文件后再切换索引。
+    def compact(self):
+        with self._lock, self._writing():
+            maps = self._memmaps()
+            generation = self._generation + 1
+            index = {}
+            rows = 0
+            for code, extents in self._index.items():
+                n = sum(e - s for s, e in extents)
+                index[code] = [(rows, rows + n)]
+                rows += n
+            for field in self.fields:
+                with open(self._file(field, generation), 'wb') as f:
+                    for extents in self._index.values():
+                        for s, e in extents:
+                            f.write(np.ascontiguousarray(maps[field][s:e]).tobytes())
+            old_generation = self._generation
+            self._generation = generation
+            self._rows = rows
+            self._index = index
+            self._maps = None
+            self._write_meta()
+            for field in self.fields:
+                try:
+                    os.remove(self._file(field, old_generation))
+                except Exception:
+                    pass
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+# 同一路径只打开一次。
+def open_store(path, fields=HIST_FIELDS):
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = HistStore(path, fields)
+            _stores[path] = store
+        return store
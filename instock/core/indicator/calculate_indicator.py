@@ -2,407 +2,439 @@
 # -*- coding: utf-8 -*-
 
 import logging
+from functools import lru_cache
 import pandas as pd
 import numpy as np
-import talib as tl
+import instock.core.indicator.panel_talib as ptl
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
 
 
-def get_indicators(data, end_date=None, threshold=120, calc_threshold=None):
+# 指标计算图。
+# 每个指标声明为一个节点：输入列、输出列和计算函数，输入可以是K线的列，也可以是其他节点的输出(如 prev_close、atr)。
+# 节点函数的输入输出是一维(单只股票)或二维(股票数 × 天数，panel_indicator 批量计算)数组，
+# talib 函数通过 panel_talib 调用，两种数组用同一套公式。
+# plan 把需要的列解析成最少的节点并排好顺序，中间结果在最后一次使用后释放；
+# 新增指标只需要用 @indicator 声明一个节点。
+
+# K线原始列，不需要计算
+BASE_COLUMNS = ('date', 'open', 'high', 'low', 'close', 'volume', 'amount', 'p_change')
+
+
+class IndicatorNode:
+    def __init__(self, fun, outputs, inputs):
+        self.fun = fun
+        self.outputs = outputs
+        self.inputs = inputs
+
+
+_NODES = []
+_PRODUCERS = {}
+
+
+# 声明指标节点，函数参数依次为 inputs 的数组，返回 outputs 对应的数组(一个输出时直接返回数组)。
+def indicator(outputs, inputs):
+    def decorator(fun):
+        node = IndicatorNode(fun, tuple(outputs), tuple(inputs))
+        for name in node.outputs:
+            if name in _PRODUCERS:
+                raise ValueError(f"指标{name}重复定义")
+            _PRODUCERS[name] = node
+        _NODES.append(node)
+        return fun
+    return decorator
+
+
+def _nan0(x):
+    x[np.isnan(x)] = 0.0
+    return x
+
+
+def _inf0(x):
+    x[~np.isfinite(x)] = 0.0
+    return x
+
+
+# 按最后一维(天)平移，一维、二维数组通用。
+def _shift(x, n):
+    out = np.empty(x.shape, dtype=np.float64)
+    out[..., :n] = 0.0
+    out[..., n:] = x[..., :x.shape[-1] - n]
+    return out
+
+
+# 和前一天的差，第一天为 0。
+def _diff(x):
+    out = np.zeros(x.shape, dtype=np.float64)
+    out[..., 1:] = np.diff(x, axis=-1)
+    return out
+
+
+@indicator(('macd', 'macds', 'macdh'), ('close',))
+def _macd(close):
+    macd, macds, macdh = ptl.MACD(close, fastperiod=12, slowperiod=26, signalperiod=9)
+    return _nan0(macd), _nan0(macds), _nan0(macdh)
+
+
+@indicator(('kdjk', 'kdjd', 'kdjj'), ('high', 'low', 'close'))
+def _kdj(high, low, close):
+    kdjk, kdjd = ptl.STOCH(high, low, close, fastk_period=9, slowk_period=5, slowk_matype=1, slowd_period=5,
+                           slowd_matype=1)
+    kdjk, kdjd = _nan0(kdjk), _nan0(kdjd)
+    return kdjk, kdjd, 3 * kdjk - 2 * kdjd
+
+
+# boll 计算结果和stockstats不同boll_ub,boll_lb
+@indicator(('boll_ub', 'boll', 'boll_lb'), ('close',))
+def _boll(close):
+    boll_ub, boll, boll_lb = ptl.BBANDS(close, timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
+    return _nan0(boll_ub), _nan0(boll), _nan0(boll_lb)
+
+
+@indicator(('trix', 'trix_20_sma'), ('close',))
+def _trix(close):
+    trix = _nan0(ptl.TRIX(close, timeperiod=12))
+    return trix, _nan0(ptl.MA(trix, timeperiod=20))
+
+
+@indicator(('m_price',), ('amount', 'volume'))
+def _m_price(amount, volume):
+    return amount / volume
+
+
+@indicator(('m_price_sf1',), ('m_price',))
+def _m_price_sf1(m_price):
+    return _shift(m_price, 1)
+
+
+@indicator(('cr', 'cr-ma1', 'cr-ma2', 'cr-ma3'), ('high', 'low', 'm_price_sf1'))
+def _cr(high, low, m_price_sf1):
+    h_m = high - np.minimum(m_price_sf1, high)
+    m_l = m_price_sf1 - np.minimum(m_price_sf1, low)
+    cr = _inf0(ptl.SUM(h_m, timeperiod=26) / ptl.SUM(m_l, timeperiod=26)) * 100
+    return cr, _nan0(ptl.MA(cr, timeperiod=5)), _nan0(ptl.MA(cr, timeperiod=10)), _nan0(ptl.MA(cr, timeperiod=20))
+
+
+def _rsi(period):
+    def fun(close):
+        return _nan0(ptl.RSI(close, timeperiod=period))
+    return fun
+
+
+for _name, _period in (('rsi', 14), ('rsi_6', 6), ('rsi_12', 12), ('rsi_24', 24)):
+    indicator((_name,), ('close',))(_rsi(_period))
+
+
+@indicator(('vr', 'vr_6_sma'), ('p_change', 'volume'))
+def _vr(p_change, volume):
+    avs = ptl.SUM(np.where(p_change > 0, volume, 0), timeperiod=26)
+    bvs = ptl.SUM(np.where(p_change < 0, volume, 0), timeperiod=26)
+    cvs = ptl.SUM(np.where(p_change == 0, volume, 0), timeperiod=26)
+    vr = _inf0((avs + cvs / 2) / (bvs + cvs / 2)) * 100
+    return vr, _nan0(ptl.MA(vr, timeperiod=6))
+
+
+@indicator(('prev_close',), ('close',))
+def _prev_close(close):
+    return _shift(close, 1)
+
+
+@indicator(('h_l', 'h_cy', 'cy_l'), ('high', 'low', 'prev_close'))
+def _h_l(high, low, prev_close):
+    return high - low, high - prev_close, prev_close - low
+
+
+@indicator(('tr',), ('h_l', 'h_cy', 'cy_l'))
+def _tr(h_l, h_cy, cy_l):
+    return _nan0(np.fmax(np.fmax(h_l, abs(h_cy)), abs(cy_l)))
+
+
+@indicator(('atr',), ('high', 'low', 'close'))
+def _atr(high, low, close):
+    return _nan0(ptl.ATR(high, low, close, timeperiod=14))
+
+
+# DMI，talib计算公式和stockstats不同，采用stockstats计算公式
+@indicator(('pdi', 'mdi'), ('high', 'low', 'atr'))
+def _dmi(high, low, atr):
+    high_delta = _diff(high)
+    high_m = (high_delta + abs(high_delta)) / 2
+    low_delta = -_diff(low)
+    low_m = (low_delta + abs(low_delta)) / 2
+    pdm = _nan0(ptl.EMA(np.where(high_m > low_m, high_m, 0), timeperiod=14))
+    mdm = _nan0(ptl.EMA(np.where(low_m > high_m, low_m, 0), timeperiod=14))
+    return _inf0(pdm / atr) * 100, _inf0(mdm / atr) * 100
+
+
+@indicator(('dx',), ('pdi', 'mdi'))
+def _dx(pdi, mdi):
+    return _inf0(abs(pdi - mdi) / (pdi + mdi)) * 100
+
+
+@indicator(('adx',), ('dx',))
+def _adx(dx):
+    return _nan0(ptl.EMA(dx, timeperiod=6))
+
+
+@indicator(('adxr',), ('adx',))
+def _adxr(adx):
+    return _nan0(ptl.EMA(adx, timeperiod=6))
+
+
+def _wr(period):
+    def fun(high, low, close):
+        return _nan0(ptl.WILLR(high, low, close, timeperiod=period))
+    return fun
+
+
+for _name, _period in (('wr_6', 6), ('wr_10', 10), ('wr_14', 14)):
+    indicator((_name,), ('high', 'low', 'close'))(_wr(_period))
+
+
+# cci 计算方法和结果和stockstats不同，stockstats典型价采用均价(总额/成交量)计算
+def _cci(period):
+    def fun(high, low, close):
+        return _nan0(ptl.CCI(high, low, close, timeperiod=period))
+    return fun
+
+
+for _name, _period in (('cci', 14), ('cci_84', 84)):
+    indicator((_name,), ('high', 'low', 'close'))(_cci(_period))
+
+
+def _ma(period):
+    def fun(x):
+        return _nan0(ptl.MA(x, timeperiod=period))
+    return fun
+
+
+for _name, _input, _period in (('ma6', 'close', 6), ('ma10', 'close', 10), ('ma12', 'close', 12),
+                               ('ma20', 'close', 20), ('ma24', 'close', 24), ('ma50', 'close', 50),
+                               ('ma200', 'close', 200), ('vol_5', 'volume', 5), ('vol_10', 'volume', 10)):
+    indicator((_name,), (_input,))(_ma(_period))
+
+
+@indicator(('dma', 'dma_10_sma'), ('ma10', 'ma50'))
+def _dma(ma10, ma50):
+    dma = ma10 - ma50
+    return dma, _nan0(ptl.MA(dma, timeperiod=10))
+
+
+@indicator(('tema',), ('close',))
+def _tema(close):
+    return _nan0(ptl.TEMA(close, timeperiod=14))
+
+
+# mfi 计算方法和结果和stockstats不同，stockstats典型价采用均价(总额/成交量)计算
+@indicator(('mfi', 'mfisma'), ('high', 'low', 'close', 'volume'))
+def _mfi(high, low, close, volume):
+    mfi = _nan0(ptl.MFI(high, low, close, volume, timeperiod=14))
+    return mfi, ptl.MA(mfi, timeperiod=6)
+
+
+@indicator(('vwma', 'mvwma'), ('amount', 'volume'))
+def _vwma(amount, volume):
+    vwma = _inf0(ptl.SUM(amount, timeperiod=14) / ptl.SUM(volume, timeperiod=14))
+    return vwma, ptl.MA(vwma, timeperiod=6)
+
+
+@indicator(('ppo', 'ppos', 'ppoh'), ('close',))
+def _ppo(close):
+    ppo = _nan0(ptl.PPO(close, fastperiod=12, slowperiod=26, matype=1))
+    ppos = _nan0(ptl.EMA(ppo, timeperiod=9))
+    return ppo, ppos, ppo - ppos
+
+
+# stochrsi，talib计算公式和stockstats不同，采用stockstats计算公式
+@indicator(('stochrsi_k', 'stochrsi_d'), ('rsi',))
+def _stochrsi(rsi):
+    rsi_min = ptl.MIN(rsi, timeperiod=14)
+    rsi_max = ptl.MAX(rsi, timeperiod=14)
+    stochrsi_k = _inf0((rsi - rsi_min) / (rsi_max - rsi_min)) * 100
+    return stochrsi_k, ptl.MA(stochrsi_k, timeperiod=3)
+
+
+@indicator(('wt1', 'wt2'), ('m_price',))
+def _wt(m_price):
+    esa = _nan0(ptl.EMA(m_price, timeperiod=10))
+    esa_d = ptl.EMA(abs(m_price - esa), timeperiod=10)
+    esa_ci = _inf0((m_price - esa) / (0.015 * esa_d))
+    wt1 = _nan0(ptl.EMA(esa_ci, timeperiod=21))
+    return wt1, _nan0(ptl.MA(wt1, timeperiod=4))
+
+
+@indicator(('hl_avg',), ('high', 'low'))
+def _hl_avg(high, low):
+    return (high + low) / 2.0
+
+
+@indicator(('supertrend_ub', 'supertrend_lb', 'supertrend'), ('close', 'hl_avg', 'atr'))
+def _supertrend(close, hl_avg, atr):
+    m_atr = atr * 3
+    return supertrend(close, hl_avg + m_atr, hl_avg - m_atr)
+
+
+# ----------stockstats没有以下指标-----------------
+@indicator(('roc', 'rocma', 'rocema'), ('close',))
+def _roc(close):
+    roc = _nan0(ptl.ROC(close, timeperiod=12))
+    return roc, _nan0(ptl.MA(roc, timeperiod=6)), _nan0(ptl.EMA(roc, timeperiod=9))
+
+
+@indicator(('obv',), ('close', 'volume'))
+def _obv(close, volume):
+    return _nan0(ptl.OBV(close, volume))
+
+
+@indicator(('sar',), ('high', 'low'))
+def _sar(high, low):
+    return _nan0(ptl.SAR(high, low))
+
+
+@indicator(('psy', 'psyma'), ('close', 'prev_close'))
+def _psy(close, prev_close):
+    price_up = np.where(close > prev_close, 1.0, 0.0)
+    psy = _nan0(ptl.SUM(price_up, timeperiod=12) / 12.0) * 100
+    return psy, ptl.MA(psy, timeperiod=6)
+
+
+@indicator(('ar',), ('open', 'high', 'low'))
+def _ar(open, high, low):
+    return _inf0(ptl.SUM(high - open, timeperiod=26) / ptl.SUM(open - low, timeperiod=26)) * 100
+
+
+@indicator(('br',), ('h_cy', 'cy_l'))
+def _br(h_cy, cy_l):
+    return _inf0(ptl.SUM(h_cy, timeperiod=26) / ptl.SUM(cy_l, timeperiod=26)) * 100
+
+
+@indicator(('prev_high', 'prev_low'), ('high', 'low'))
+def _prev_high_low(high, low):
+    return _shift(high, 1), _shift(low, 1)
+
+
+@indicator(('emv', 'emva'), ('hl_avg', 'prev_high', 'prev_low', 'h_l', 'amount'))
+def _emv(hl_avg, prev_high, prev_low, h_l, amount):
+    phl_avg = (prev_high + prev_low) / 2.0
+    emv = _nan0(ptl.SUM((hl_avg - phl_avg) * h_l / amount, timeperiod=14))
+    return emv, _nan0(ptl.MA(emv, timeperiod=9))
+
+
+def _bias(ma_name):
+    def fun(close, ma):
+        return _inf0((close - ma) / ma) * 100
+    return fun
+
+
+for _name, _ma_name in (('bias', 'ma6'), ('bias_12', 'ma12'), ('bias_24', 'ma24')):
+    indicator((_name,), ('close', _ma_name))(_bias(_ma_name))
+
+
+@indicator(('dpo', 'madpo'), ('close',))
+def _dpo(close):
+    dpo = _nan0(close - _shift(ptl.MA(close, timeperiod=11), 1))
+    return dpo, _nan0(ptl.MA(dpo, timeperiod=6))
+
+
+@indicator(('vhf',), ('close', 'prev_close'))
+def _vhf(close, prev_close):
+    hcp_lcp = _nan0(ptl.MAX(close, timeperiod=28) - ptl.MIN(close, timeperiod=28))
+    return _nan0(np.divide(hcp_lcp, ptl.SUM(abs(close - prev_close), timeperiod=28)))
+
+
+@indicator(('rvi', 'rvis'), ('open', 'high', 'low', 'close', 'prev_close', 'prev_high', 'prev_low'))
+def _rvi(open, high, low, close, prev_close, prev_high, prev_low):
+    rvi_x = ((close - open) +
+             2 * (prev_close - _shift(open, 1)) +
+             2 * (_shift(close, 2) - _shift(open, 2)) +
+             (_shift(close, 3) - _shift(open, 3))) / 6
+    rvi_y = ((high - low) +
+             2 * (prev_high - prev_low) +
+             2 * (_shift(high, 2) - _shift(low, 2)) +
+             (_shift(high, 3) - _shift(low, 3))) / 6
+    rvi = _inf0(ptl.MA(rvi_x, timeperiod=10) / ptl.MA(rvi_y, timeperiod=10))
+    return rvi, (rvi + 2 * _shift(rvi, 1) + 2 * _shift(rvi, 2) + _shift(rvi, 3)) / 6
+
+
+@indicator(('fi', 'force_2', 'force_13'), ('close', 'volume'))
+def _fi(close, volume):
+    fi = _diff(close) * volume
+    return fi, _nan0(ptl.EMA(fi, timeperiod=2)), _nan0(ptl.EMA(fi, timeperiod=13))
+
+
+@indicator(('ene_ue', 'ene_le', 'ene'), ('ma10',))
+def _ene(ma10):
+    ene_ue = (1 + 11 / 100) * ma10
+    ene_le = (1 - 9 / 100) * ma10
+    return ene_ue, ene_le, (ene_ue + ene_le) / 2
+
+
+# 全部指标列(不含中间结果)，按声明顺序
+ALL_COLUMNS = tuple(name for node in _NODES for name in node.outputs
+                    if name not in ('m_price', 'm_price_sf1', 'prev_close', 'h_l', 'h_cy', 'cy_l', 'hl_avg',
+                                    'prev_high', 'prev_low', 'ma6', 'ma12', 'ma24'))
+
+
+# 解析需要的列，返回 (按依赖排好序的节点, 每个节点计算后可以释放的中间结果)。
+@lru_cache(maxsize=64)
+def plan(columns=ALL_COLUMNS):
+    order = []
+    visited = set()
+
+    def visit(name):
+        node = _PRODUCERS.get(name)
+        if node is None or id(node) in visited:
+            return
+        visited.add(id(node))
+        for i in node.inputs:
+            visit(i)
+        order.append(node)
+
+    for name in columns:
+        visit(name)
+    wanted = set(columns)
+    last_use = {}
+    for k, node in enumerate(order):
+        for i in node.inputs:
+            last_use[i] = k
+    frees = [[] for _ in order]
+    for k, node in enumerate(order):
+        for name in node.outputs:
+            if name not in wanted:
+                frees[last_use.get(name, k)].append(name)
+    return tuple(order), tuple(tuple(f) for f in frees)
+
+
+# 按计算图计算 columns 里的指标，base 为K线列名 -> 数组(一维或二维)，返回 指标 -> 数组。
+def calculate(base, columns=ALL_COLUMNS):
+    order, frees = plan(columns)
+    values = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for node, free in zip(order, frees):
+            outputs = node.fun(*[values[i] if i in values else base[i] for i in node.inputs])
+            if len(node.outputs) == 1:
+                outputs = (outputs,)
+            values.update(zip(node.outputs, outputs))
+            for name in free:
+                del values[name]
+    return values
+
+
+# 计算指标，columns 为需要的指标列，默认全部，返回K线数据加上指标列的 DataFrame。
+def get_indicators(data, end_date=None, threshold=120, calc_threshold=None, columns=None):
     try:
-        isCopy = False
         if end_date is not None:
             mask = (data['date'] <= end_date)
             data = data.loc[mask]
-            isCopy = True
         if calc_threshold is not None:
             data = data.tail(n=calc_threshold)
-            isCopy = True
-
-        if isCopy:
-            data = data.copy()
-
-        # import stockstats
-        # test = data.copy()
-        # test = stockstats.StockDataFrame.retype(test)  # 验证计算结果
-
-        with np.errstate(divide='ignore', invalid='ignore'):
-
-            # macd
-            data.loc[:, 'macd'], data.loc[:, 'macds'], data.loc[:, 'macdh'] = tl.MACD(
-                data['close'].values, fastperiod=12, slowperiod=26, signalperiod=9)
-            data['macd'].values[np.isnan(data['macd'].values)] = 0.0
-            data['macds'].values[np.isnan(data['macds'].values)] = 0.0
-            data['macdh'].values[np.isnan(data['macdh'].values)] = 0.0
-
-            # kdjk
-            data.loc[:, 'kdjk'], data.loc[:, 'kdjd'] = tl.STOCH(
-                data['high'].values, data['low'].values, data['close'].values, fastk_period=9,
-                slowk_period=5, slowk_matype=1, slowd_period=5, slowd_matype=1)
-            data['kdjk'].values[np.isnan(data['kdjk'].values)] = 0.0
-            data['kdjd'].values[np.isnan(data['kdjd'].values)] = 0.0
-            data.loc[:, 'kdjj'] = 3 * data['kdjk'].values - 2 * data['kdjd'].values
-
-            # boll 计算结果和stockstats不同boll_ub,boll_lb
-            data.loc[:, 'boll_ub'], data.loc[:, 'boll'], data.loc[:, 'boll_lb'] = tl.BBANDS \
-                (data['close'].values, timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
-            data['boll_ub'].values[np.isnan(data['boll_ub'].values)] = 0.0
-            data['boll'].values[np.isnan(data['boll'].values)] = 0.0
-            data['boll_lb'].values[np.isnan(data['boll_lb'].values)] = 0.0
-
-            # trix
-            data.loc[:, 'trix'] = tl.TRIX(data['close'].values, timeperiod=12)
-            data['trix'].values[np.isnan(data['trix'].values)] = 0.0
-            data.loc[:, 'trix_20_sma'] = tl.MA(data['trix'].values, timeperiod=20)
-            data['trix_20_sma'].values[np.isnan(data['trix_20_sma'].values)] = 0.0
-
-            # cr
-            data.loc[:, 'm_price'] = data['amount'].values / data['volume'].values
-            data.loc[:, 'm_price_sf1'] = data['m_price'].shift(1, fill_value=0.0).values
-            data.loc[:, 'h_m'] = data['high'].values - data[['m_price_sf1', 'high']].values.min(axis=1)
-            data.loc[:, 'm_l'] = data['m_price_sf1'].values - data[['m_price_sf1', 'low']].values.min(axis=1)
-            data.loc[:, 'h_m_sum'] = tl.SUM(data['h_m'].values, timeperiod=26)
-            data.loc[:, 'm_l_sum'] = tl.SUM(data['m_l'].values, timeperiod=26)
-            data.loc[:, 'cr'] = data['h_m_sum'].values / data['m_l_sum'].values
-            data['cr'].values[np.isnan(data['cr'].values)] = 0.0
-            data['cr'].values[np.isinf(data['cr'].values)] = 0.0
-            data['cr'] = data['cr'].values * 100
-            data.loc[:, 'cr-ma1'] = tl.MA(data['cr'].values, timeperiod=5)
-            data['cr-ma1'].values[np.isnan(data['cr-ma1'].values)] = 0.0
-            data.loc[:, 'cr-ma2'] = tl.MA(data['cr'].values, timeperiod=10)
-            data['cr-ma2'].values[np.isnan(data['cr-ma2'].values)] = 0.0
-            data.loc[:, 'cr-ma3'] = tl.MA(data['cr'].values, timeperiod=20)
-            data['cr-ma3'].values[np.isnan(data['cr-ma3'].values)] = 0.0
-
-            # rsi
-            data.loc[:, 'rsi'] = tl.RSI(data['close'].values, timeperiod=14)
-            data['rsi'].values[np.isnan(data['rsi'].values)] = 0.0
-            data.loc[:, 'rsi_6'] = tl.RSI(data['close'].values, timeperiod=6)
-            data['rsi_6'].values[np.isnan(data['rsi_6'].values)] = 0.0
-            data.loc[:, 'rsi_12'] = tl.RSI(data['close'].values, timeperiod=12)
-            data['rsi_12'].values[np.isnan(data['rsi_12'].values)] = 0.0
-            data.loc[:, 'rsi_24'] = tl.RSI(data['close'].values, timeperiod=24)
-            data['rsi_24'].values[np.isnan(data['rsi_24'].values)] = 0.0
-
-            # vr
-            data.loc[:, 'av'] = np.where(data['p_change'].values > 0, data['volume'].values, 0)
-            data.loc[:, 'avs'] = tl.SUM(data['av'].values, timeperiod=26)
-            data.loc[:, 'bv'] = np.where(data['p_change'].values < 0, data['volume'].values, 0)
-            data.loc[:, 'bvs'] = tl.SUM(data['bv'].values, timeperiod=26)
-            data.loc[:, 'cv'] = np.where(data['p_change'].values == 0, data['volume'].values, 0)
-            data.loc[:, 'cvs'] = tl.SUM(data['cv'].values, timeperiod=26)
-            data.loc[:, 'vr'] = (data['avs'].values + data['cvs'].values / 2) / (data['bvs'].values + data['cvs'].values / 2)
-            data['vr'].values[np.isnan(data['vr'].values)] = 0.0
-            data['vr'].values[np.isinf(data['vr'].values)] = 0.0
-            data['vr'] = data['vr'].values * 100
-            data.loc[:, 'vr_6_sma'] = tl.MA(data['vr'].values, timeperiod=6)
-            data['vr_6_sma'].values[np.isnan(data['vr_6_sma'].values)] = 0.0
-
-            # atr
-            data.loc[:, 'prev_close'] = data['close'].shift(1, fill_value=0.0).values
-            data.loc[:, 'h_l'] = data['high'].values - data['low'].values
-            data.loc[:, 'h_cy'] = data['high'].values - data['prev_close'].values
-            data.loc[:, 'cy_l'] = data['prev_close'].values - data['low'].values
-            data.loc[:, 'h_cy_a'] = abs(data['h_cy'].values)
-            data.loc[:, 'cy_l_a'] = abs(data['cy_l'].values)
-            data.loc[:, 'tr'] = data.loc[:, ['h_l', 'h_cy_a', 'cy_l_a']].T.max().values
-            data['tr'].values[np.isnan(data['tr'].values)] = 0.0
-            data.loc[:, 'atr'] = tl.ATR(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            data['atr'].values[np.isnan(data['atr'].values)] = 0.0
-
-            # DMI
-            # talib计算公式和stockstats不同
-            # talib计算公式
-            # data.loc[:, 'pdi'] = tl.PLUS_DI(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            # data['pdi'].values[np.isnan(data['pdi'].values)] = 0.0
-            # data.loc[:, 'mdi'] = tl.MINUS_DI(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            # data['mdi'].values[np.isnan(data['mdi'].values)] = 0.0
-            # data.loc[:, 'dx'] = tl.DX(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            # data['dx'].values[np.isnan(data['dx'].values)] = 0.0
-            # data.loc[:, 'adx'] = tl.ADX(data['high'].values, data['low'].values, data['close'].values, timeperiod=6)
-            # data['adx'].values[np.isnan(data['adx'].values)] = 0.0
-            # data.loc[:, 'adxr'] = tl.ADXR(data['high'].values, data['low'].values, data['close'].values, timeperiod=6)
-            # data['adxr'].values[np.isnan(data['adxr'].values)] = 0.0
-            # stockstats计算公式
-            data.loc[:, 'high_delta'] = np.insert(np.diff(data['high'].values), 0, 0.0)
-            data.loc[:, 'high_m'] = (data['high_delta'].values + abs(data['high_delta'].values)) / 2
-            data.loc[:, 'low_delta'] = np.insert(-np.diff(data['low'].values), 0, 0.0)
-            data.loc[:, 'low_m'] = (data['low_delta'].values + abs(data['low_delta'].values)) / 2
-            data.loc[:, 'pdm'] = tl.EMA(np.where(data['high_m'].values > data['low_m'].values, data['high_m'].values, 0), timeperiod=14)
-            data['pdm'].values[np.isnan(data['pdm'].values)] = 0.0
-            data.loc[:, 'pdi'] = data['pdm'].values / data['atr'].values
-            data['pdi'].values[np.isnan(data['pdi'].values)] = 0.0
-            data['pdi'].values[np.isinf(data['pdi'].values)] = 0.0
-            data['pdi'] = data['pdi'].values * 100
-            data.loc[:, 'mdm'] = tl.EMA(np.where(data['low_m'].values > data['high_m'].values, data['low_m'].values, 0), timeperiod=14)
-            data['mdm'].values[np.isnan(data['mdm'].values)] = 0.0
-            data.loc[:, 'mdi'] = data['mdm'].values / data['atr'].values
-            data['mdi'].values[np.isnan(data['mdi'].values)] = 0.0
-            data['mdi'].values[np.isinf(data['mdi'].values)] = 0.0
-            data['mdi'] = data['mdi'].values * 100
-            data.loc[:, 'dx'] = abs(data['pdi'].values - data['mdi'].values) / (data['pdi'].values + data['mdi'].values)
-            data['dx'].values[np.isnan(data['dx'].values)] = 0.0
-            data['dx'].values[np.isinf(data['dx'].values)] = 0.0
-            data['dx'] = data['dx'].values * 100
-            data.loc[:, 'adx'] = tl.EMA(data['dx'].values, timeperiod=6)
-            data['adx'].values[np.isnan(data['adx'].values)] = 0.0
-            data.loc[:, 'adxr'] = tl.EMA(data['adx'].values, timeperiod=6)
-            data['adxr'].values[np.isnan(data['adxr'].values)] = 0.0
-
-            # wr
-            data.loc[:, 'wr_6'] = tl.WILLR(data['high'].values, data['low'].values, data['close'].values, timeperiod=6)
-            data['wr_6'].values[np.isnan(data['wr_6'].values)] = 0.0
-            data.loc[:, 'wr_10'] = tl.WILLR(data['high'].values, data['low'].values, data['close'].values, timeperiod=10)
-            data['wr_10'].values[np.isnan(data['wr_10'].values)] = 0.0
-            data.loc[:, 'wr_14'] = tl.WILLR(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            data['wr_14'].values[np.isnan(data['wr_14'].values)] = 0.0
-
-            # cci 计算方法和结果和stockstats不同，stockstats典型价采用均价(总额/成交量)计算
-            data.loc[:, 'cci'] = tl.CCI(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            data['cci'].values[np.isnan(data['cci'].values)] = 0.0
-            data.loc[:, 'cci_84'] = tl.CCI(data['high'].values, data['low'].values, data['close'].values, timeperiod=84)
-            data['cci_84'].values[np.isnan(data['cci_84'].values)] = 0.0
-
-            # dma
-            data.loc[:, 'ma10'] = tl.MA(data['close'].values, timeperiod=10)
-            data['ma10'].values[np.isnan(data['ma10'].values)] = 0.0
-            data.loc[:, 'ma50'] = tl.MA(data['close'].values, timeperiod=50)
-            data['ma50'].values[np.isnan(data['ma50'].values)] = 0.0
-            data.loc[:, 'dma'] = data['ma10'].values - data['ma50'].values
-            data.loc[:, 'dma_10_sma'] = tl.MA(data['dma'].values, timeperiod=10)
-            data['dma_10_sma'].values[np.isnan(data['dma_10_sma'].values)] = 0.0
-
-            # tema
-            data.loc[:, 'tema'] = tl.TEMA(data['close'].values, timeperiod=14)
-            data['tema'].values[np.isnan(data['tema'].values)] = 0.0
-
-            # mfi 计算方法和结果和stockstats不同，stockstats典型价采用均价(总额/成交量)计算
-            data.loc[:, 'mfi'] = tl.MFI(data['high'].values, data['low'].values, data['close'].values, data['volume'].values, timeperiod=14)
-            data['mfi'].values[np.isnan(data['mfi'].values)] = 0.0
-            data.loc[:, 'mfisma'] = tl.MA(data['mfi'].values, timeperiod=6)
-
-            # vwma
-            data.loc[:, 'tpv_14'] = tl.SUM(data['amount'].values, timeperiod=14)
-            data.loc[:, 'vol_14'] = tl.SUM(data['volume'].values, timeperiod=14)
-            data.loc[:, 'vwma'] = data['tpv_14'].values / data['vol_14'].values
-            data['vwma'].values[np.isnan(data['vwma'].values)] = 0.0
-            data['vwma'].values[np.isinf(data['vwma'].values)] = 0.0
-            data.loc[:, 'mvwma'] = tl.MA(data['vwma'].values, timeperiod=6)
-
-            # ppo
-            data.loc[:, 'ppo'] = tl.PPO(data['close'].values, fastperiod=12, slowperiod=26, matype=1)
-            data['ppo'].values[np.isnan(data['ppo'].values)] = 0.0
-            data.loc[:, 'ppos'] = tl.EMA(data['ppo'].values, timeperiod=9)
-            data['ppos'].values[np.isnan(data['ppos'].values)] = 0.0
-            data.loc[:, 'ppoh'] = data['ppo'].values - data['ppos'].values
-
-            # stochrsi
-            # talib计算公式和stockstats不同
-            # talib计算公式
-            # data.loc[:, 'stochrsi_k'], data.loc[:, 'stochrsi_d'] = tl.STOCHRSI(data['close'].values, timeperiod=14, fastk_period=5, fastd_period=3, fastd_matype=0)
-            data.loc[:, 'rsi_min'] = tl.MIN(data['rsi'].values, timeperiod=14)
-            data.loc[:, 'rsi_max'] = tl.MAX(data['rsi'].values, timeperiod=14)
-            data.loc[:, 'stochrsi_k'] = (data['rsi'].values - data['rsi_min'].values) / (data['rsi_max'].values - data['rsi_min'].values)
-            data['stochrsi_k'].values[np.isnan(data['stochrsi_k'].values)] = 0.0
-            data['stochrsi_k'].values[np.isinf(data['stochrsi_k'].values)] = 0.0
-            data['stochrsi_k'] = data['stochrsi_k'].values * 100
-            data.loc[:, 'stochrsi_d'] = tl.MA(data['stochrsi_k'].values, timeperiod=3)
-
-            # wt
-            data.loc[:, 'esa'] = tl.EMA(data['m_price'].values, timeperiod=10)
-            data['esa'].values[np.isnan(data['esa'].values)] = 0.0
-            data.loc[:, 'esa_d'] = tl.EMA(abs(data['m_price'].values - data['esa'].values), timeperiod=10)
-            data.loc[:, 'esa_ci'] = (data['m_price'].values - data['esa'].values) / (0.015 * data['esa_d'].values)
-            data['esa_ci'].values[np.isnan(data['esa_ci'].values)] = 0.0
-            data['esa_ci'].values[np.isinf(data['esa_ci'].values)] = 0.0
-            data.loc[:, 'wt1'] = tl.EMA(data['esa_ci'].values, timeperiod=21)
-            data['wt1'].values[np.isnan(data['wt1'].values)] = 0.0
-            data.loc[:, 'wt2'] = tl.MA(data['wt1'].values, timeperiod=4)
-            data['wt2'].values[np.isnan(data['wt2'].values)] = 0.0
-
-            # Supertrend
-            data.loc[:, 'm_atr'] = data['atr'].values * 3
-            data.loc[:, 'hl_avg'] = (data['high'].values + data['low'].values) / 2.0
-            data.loc[:, 'b_ub'] = data['hl_avg'].values + data['m_atr'].values
-            data.loc[:, 'b_lb'] = data['hl_avg'].values - data['m_atr'].values
-            size = len(data.index)
-            ub = np.empty(size, dtype=np.float64)
-            lb = np.empty(size, dtype=np.float64)
-            st = np.empty(size, dtype=np.float64)
-            for i in range(size):
-                if i == 0:
-                    ub[i] = data['b_ub'].iloc[i]
-                    lb[i] = data['b_lb'].iloc[i]
-                    if data['close'].iloc[i] <= ub[i]:
-                        st[i] = ub[i]
-                    else:
-                        st[i] = lb[i]
-                    continue
-
-                last_close = data['close'].iloc[i - 1]
-                curr_close = data['close'].iloc[i]
-                last_ub = ub[i - 1]
-                last_lb = lb[i - 1]
-                last_st = st[i - 1]
-                curr_b_ub = data['b_ub'].iloc[i]
-                curr_b_lb = data['b_lb'].iloc[i]
-
-                # calculate current upper band
-                if curr_b_ub < last_ub or last_close > last_ub:
-                    ub[i] = curr_b_ub
-                else:
-                    ub[i] = last_ub
-
-                # calculate current lower band
-                if curr_b_lb > last_lb or last_close < last_lb:
-                    lb[i] = curr_b_lb
-                else:
-                    lb[i] = last_lb
-
-                # calculate supertrend
-                if last_st == last_ub:
-                    if curr_close <= ub[i]:
-                        st[i] = ub[i]
-                    else:
-                        st[i] = lb[i]
-                elif last_st == last_lb:
-                    if curr_close > lb[i]:
-                        st[i] = lb[i]
-                    else:
-                        st[i] = ub[i]
-
-            data.loc[:, 'supertrend_ub'] = ub
-            data.loc[:, 'supertrend_lb'] = lb
-            data.loc[:, 'supertrend'] = st
-            data = data.copy()
-            # ----------stockstats没有以下指标-----------------
-            # roc
-            data.loc[:, 'roc'] = tl.ROC(data['close'].values, timeperiod=12)
-            data['roc'].values[np.isnan(data['roc'].values)] = 0.0
-            data.loc[:, 'rocma'] = tl.MA(data['roc'].values, timeperiod=6)
-            data['rocma'].values[np.isnan(data['rocma'].values)] = 0.0
-            data.loc[:, 'rocema'] = tl.EMA(data['roc'].values, timeperiod=9)
-            data['rocema'].values[np.isnan(data['rocema'].values)] = 0.0
-
-            # obv
-            data.loc[:, 'obv'] = tl.OBV(data['close'].values, data['volume'].values)
-            data['obv'].values[np.isnan(data['obv'].values)] = 0.0
-
-            # sar
-            data.loc[:, 'sar'] = tl.SAR(data['high'].values, data['low'].values)
-            data['sar'].values[np.isnan(data['sar'].values)] = 0.0
-
-            # psy
-            data.loc[:, 'price_up'] = 0.0
-            data.loc[data['close'].values > data['prev_close'].values, 'price_up'] = 1.0
-            data.loc[:, 'price_up_sum'] = tl.SUM(data['price_up'].values, timeperiod=12)
-            data.loc[:, 'psy'] = data['price_up_sum'].values / 12.0
-            data['psy'].values[np.isnan(data['psy'].values)] = 0.0
-            data['psy'] = data['psy'].values * 100
-            data.loc[:, 'psyma'] = tl.MA(data['psy'].values, timeperiod=6)
-
-            # BRAR
-            data.loc[:, 'h_o'] = data['high'].values - data['open'].values
-            data.loc[:, 'o_l'] = data['open'].values - data['low'].values
-            data.loc[:, 'h_o_sum'] = tl.SUM(data['h_o'].values, timeperiod=26)
-            data.loc[:, 'o_l_sum'] = tl.SUM(data['o_l'].values, timeperiod=26)
-            data.loc[:, 'ar'] = data['h_o_sum'] .values / data['o_l_sum'].values
-            data['ar'].values[np.isnan(data['ar'].values)] = 0.0
-            data['ar'].values[np.isinf(data['ar'].values)] = 0.0
-            data['ar'] = data['ar'].values * 100
-            data.loc[:, 'h_cy_sum'] = tl.SUM(data['h_cy'].values, timeperiod=26)
-            data.loc[:, 'cy_l_sum'] = tl.SUM(data['cy_l'].values, timeperiod=26)
-            data.loc[:, 'br'] = data['h_cy_sum'].values / data['cy_l_sum'].values
-            data['br'].values[np.isnan(data['br'].values)] = 0.0
-            data['br'].values[np.isinf(data['br'].values)] = 0.0
-            data['br'] = data['br'].values * 100
-
-            # EMV
-            data.loc[:, 'prev_high'] = data['high'].shift(1, fill_value=0.0).values
-            data.loc[:, 'prev_low'] = data['low'].shift(1, fill_value=0.0).values
-            data.loc[:, 'phl_avg'] = (data['prev_high'].values + data['prev_low'].values) / 2.0
-            data.loc[:, 'emva_em'] = (data['hl_avg'].values - data['phl_avg'].values) * data['h_l'].values / data['amount'].values
-            data.loc[:, 'emv'] = tl.SUM(data['emva_em'].values, timeperiod=14)
-            data['emv'].values[np.isnan(data['emv'].values)] = 0.0
-            data.loc[:, 'emva'] = tl.MA(data['emv'].values, timeperiod=9)
-            data['emva'].values[np.isnan(data['emva'].values)] = 0.0
-
-            # BIAS
-            data.loc[:, 'ma6'] = tl.MA(data['close'].values, timeperiod=6)
-            data['ma6'].values[np.isnan(data['ma6'].values)] = 0.0
-            data.loc[:, 'ma12'] = tl.MA(data['close'].values, timeperiod=12)
-            data['ma12'].values[np.isnan(data['ma12'].values)] = 0.0
-            data.loc[:, 'ma24'] = tl.MA(data['close'].values, timeperiod=24)
-            data['ma24'].values[np.isnan(data['ma24'].values)] = 0.0
-            data.loc[:, 'bias'] = ((data['close'].values - data['ma6'].values) / data['ma6'].values)
-            data['bias'].values[np.isnan(data['bias'].values)] = 0.0
-            data['bias'].values[np.isinf(data['bias'].values)] = 0.0
-            data['bias'] = data['bias'].values * 100
-            data.loc[:, 'bias_12'] = (data['close'].values - data['ma12'].values) / data['ma12'].values
-            data['bias_12'].values[np.isnan(data['bias_12'].values)] = 0.0
-            data['bias_12'].values[np.isinf(data['bias_12'].values)] = 0.0
-            data['bias_12'] = data['bias_12'].values * 100
-            data.loc[:, 'bias_24'] = (data['close'].values - data['ma24'].values) / data['ma24'].values
-            data['bias_24'].values[np.isnan(data['bias_24'].values)] = 0.0
-            data['bias_24'].values[np.isinf(data['bias_24'].values)] = 0.0
-            data['bias_24'] = data['bias_24'].values * 100
-
-            # DPO
-            data.loc[:, 'c_m_11'] = tl.MA(data['close'].values, timeperiod=11)
-            data.loc[:, 'dpo'] = data['close'].values - data['c_m_11'].shift(1, fill_value=0.0).values
-            data['dpo'].values[np.isnan(data['dpo'].values)] = 0.0
-            data.loc[:, 'madpo'] = tl.MA(data['dpo'].values, timeperiod=6)
-            data['madpo'].values[np.isnan(data['madpo'].values)] = 0.0
-
-            # VHF
-            data.loc[:, 'hcp_lcp'] = tl.MAX(data['close'].values, timeperiod=28) - tl.MIN(data['close'].values, timeperiod=28)
-            data['hcp_lcp'].values[np.isnan(data['hcp_lcp'].values)] = 0.0
-            data.loc[:, 'vhf'] = np.divide(data['hcp_lcp'].values, tl.SUM(abs(data['close'].values - data['prev_close'].values), timeperiod=28))
-            data['vhf'].values[np.isnan(data['vhf'].values)] = 0.0
-
-            # RVI
-            data.loc[:, 'rvi_x'] = ((data['close'].values - data['open'].values) +
-                                    2 * (data['prev_close'].values - data['open'].shift(1, fill_value=0.0).values) +
-                                    2 * (data['close'].shift(2, fill_value=0.0).values - data['open'].shift(2, fill_value=0.0).values) +
-                                    (data['close'].shift(3, fill_value=0.0).values - data['open'].shift(3, fill_value=0.0).values)) / 6
-            data.loc[:, 'rvi_y'] = ((data['high'].values - data['low'].values) +
-                                    2 * (data['prev_high'].values - data['prev_low'].values) +
-                                    2 * (data['high'].shift(2, fill_value=0.0).values - data['low'].shift(2, fill_value=0.0).values) +
-                                    (data['high'].shift(3, fill_value=0.0).values - data['low'].shift(3, fill_value=0.0).values)) / 6
-            data.loc[:, 'rvi'] = tl.MA(data['rvi_x'].values, timeperiod=10) / tl.MA(data['rvi_y'].values, timeperiod=10)
-            data['rvi'].values[np.isnan(data['rvi'].values)] = 0.0
-            data['rvi'].values[np.isinf(data['rvi'].values)] = 0.0
-            data.loc[:, 'rvis'] = (data['rvi'].values +
-                                   2 * data['rvi'].shift(1, fill_value=0.0).values +
-                                   2 * data['rvi'].shift(2, fill_value=0.0).values +
-                                   data['rvi'].shift(3, fill_value=0.0).values) / 6
-
-            # FI
-            data.loc[:, 'fi'] = np.insert(np.diff(data['close'].values), 0, 0.0) * data['volume'].values
-            data.loc[:, 'force_2'] = tl.EMA(data['fi'].values, timeperiod=2)
-            data['force_2'].values[np.isnan(data['force_2'].values)] = 0.0
-            data.loc[:, 'force_13'] = tl.EMA(data['fi'].values, timeperiod=13)
-            data['force_13'].values[np.isnan(data['force_13'].values)] = 0.0
-
-            # ENE
-            data.loc[:, 'ene_ue'] = (1 + 11 / 100) * data['ma10'].values
-            data.loc[:, 'ene_le'] = (1 - 9 / 100) * data['ma10'].values
-            data.loc[:, 'ene'] = (data['ene_ue'].values + data['ene_le'].values) / 2
-
-            # VOL
-            data.loc[:, 'vol_5'] = tl.MA(data['volume'].values, timeperiod=5)
-            data['vol_5'].values[np.isnan(data['vol_5'].values)] = 0.0
-            data.loc[:, 'vol_10'] = tl.MA(data['volume'].values, timeperiod=10)
-            data['vol_10'].values[np.isnan(data['vol_10'].values)] = 0.0
-
-            # MA
-            data.loc[:, 'ma20'] = tl.MA(data['close'].values, timeperiod=20)
-            data['ma20'].values[np.isnan(data['ma20'].values)] = 0.0
-            data.loc[:, 'ma200'] = tl.MA(data['close'].values, timeperiod=200)
-            data['ma200'].values[np.isnan(data['ma200'].values)] = 0.0
 
+        columns = ALL_COLUMNS if columns is None else tuple(c for c in columns if c not in BASE_COLUMNS)
+        values = calculate({c: data[c].values for c in BASE_COLUMNS if c in data.columns}, columns)
+
+        data = data.drop(columns=[c for c in columns if c in data.columns])
+        data = pd.concat([data, pd.DataFrame({c: values[c] for c in columns}, index=data.index)], axis=1)
         if threshold is not None:
             data = data.tail(n=threshold).copy()
         return data
@@ -411,6 +443,67 @@ def get_indicators(data, end_date=None, threshold=120, calc_threshold=None):
     return None
 
 
+# 上下轨棘轮：b_ub 不高于前一天上轨或前一天收盘价突破上轨时上轨取 b_ub，否则沿用前一天的上轨，下轨相反。
+# 二维时按天递推、每天对全部股票一起计算；只有一只股票时直接用浮点数递推，比逐天调用 numpy 快。
+def _band_ratchet(b_ub, b_lb, close):
+    n, t = close.shape
+    if t == 0:
+        return np.empty(close.shape, dtype=np.float64), np.empty(close.shape, dtype=np.float64)
+    if n == 1:
+        bu, bl, c = b_ub[0].tolist(), b_lb[0].tolist(), close[0].tolist()
+        ub, lb = [bu[0]], [bl[0]]
+        u, l = bu[0], bl[0]
+        for i in range(1, t):
+            if bu[i] < u or c[i - 1] > u:
+                u = bu[i]
+            if bl[i] > l or c[i - 1] < l:
+                l = bl[i]
+            ub.append(u)
+            lb.append(l)
+        return np.array([ub], dtype=np.float64), np.array([lb], dtype=np.float64)
+    bu, bl, c = np.ascontiguousarray(b_ub.T), np.ascontiguousarray(b_lb.T), np.ascontiguousarray(close.T)
+    ub = np.empty((t, n), dtype=np.float64)
+    lb = np.empty((t, n), dtype=np.float64)
+    ub[0] = bu[0]
+    lb[0] = bl[0]
+    with np.errstate(invalid='ignore'):
+        for i in range(1, t):
+            ub[i] = ub[i - 1]
+            np.copyto(ub[i], bu[i], where=(bu[i] < ub[i - 1]) | (c[i - 1] > ub[i - 1]))
+            lb[i] = lb[i - 1]
+            np.copyto(lb[i], bl[i], where=(bl[i] > lb[i - 1]) | (c[i - 1] < lb[i - 1]))
+    return ub.T, lb.T
+
+
+# Supertrend，close/b_ub/b_lb 为一维(天数)或二维(股票数 × 天数)数组，返回 (supertrend_ub, supertrend_lb, supertrend)。
+# 趋势线是两状态(贴上轨/贴下轨)的递推：每天要么确定状态，要么保持，要么翻转，
+# 用最近一次确定状态的位置加翻转次数的奇偶得到每天的状态。
+# 前一天的趋势线既不等于上轨也不等于下轨(出现 NaN)时，之后都为 NaN。
+def supertrend(close, b_ub, b_lb):
+    close = np.asarray(close, dtype=np.float64)
+    shape = close.shape
+    close = close.reshape(int(np.prod(shape[:-1])), shape[-1])
+    b_ub = np.asarray(b_ub, dtype=np.float64).reshape(close.shape)
+    b_lb = np.asarray(b_lb, dtype=np.float64).reshape(close.shape)
+    ub, lb = _band_ratchet(b_ub, b_lb, close)
+    if close.shape[1] == 0:
+        return ub.reshape(shape), lb.reshape(shape), np.empty(shape, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        # keep_u：前一天贴上轨时当天仍贴上轨；keep_l：前一天贴下轨时当天仍贴下轨
+        keep_u = (close <= ub) | (ub == lb)
+        keep_l = (close > lb) & (ub != lb)
+    fixed = keep_u != keep_l
+    fixed[:, 0] = True
+    flip = ~keep_u & ~keep_l
+    cols = np.arange(close.shape[1])
+    last = np.maximum.accumulate(np.where(fixed, cols, 0), axis=1)
+    flips = np.cumsum(flip, axis=1)
+    on_ub = np.take_along_axis(keep_u, last, axis=1) ^ ((flips - np.take_along_axis(flips, last, axis=1)) % 2 == 1)
+    st = np.where(on_ub, ub, lb)
+    st[np.maximum.accumulate(np.isnan(st), axis=1)] = np.nan
+    return ub.reshape(shape), lb.reshape(shape), st.reshape(shape)
+
+
 def get_indicator(code_name, data, stock_column, date=None, calc_threshold=90):
     try:
         if date is None:
@@ -428,7 +521,8 @@ def get_indicator(code_name, data, stock_column, date=None, calc_threshold=90):
                 stock_data_list.append(0)
             return pd.Series(stock_data_list, index=stock_column)
 
-        idr_data = get_indicators(data, end_date=end_date, threshold=1, calc_threshold=calc_threshold)
+        idr_data = get_indicators(data, end_date=end_date, threshold=1, calc_threshold=calc_threshold,
+                                  columns=tuple(stock_column[2:]))
 
         # 增加空判断，如果是空返回 0 数据。
         if idr_data is None:
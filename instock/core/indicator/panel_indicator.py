@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import datetime
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+import instock.core.indicator.calculate_indicator as idr
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 截面批量指标计算。
+# 把全部股票同一长度的K线窗口堆成 (股票数 × 天数) 的二维数组，用 calculate_indicator 的指标节点整体计算
+# (talib 函数由 panel_talib 按列(时间)循环、整列(全部股票)计算)，
+# 一次得到所有股票的 STOCK_STATS_DATA 指标，结果和 calculate_indicator.get_indicator 逐只计算一致。
+
+PANEL_FIELDS = ('open', 'high', 'low', 'close', 'volume', 'amount', 'p_change')
+CHUNK_ROWS = 2048  # 多日期计算时每批的面板行数
+
+
+# 计算 STOCK_STATS_DATA 的指标，输入为 字段 -> (股票数 × 天数) 数组，返回 指标 -> 同形状数组。
+# columns 为要计算的指标，None 时计算全部；按 calculate_indicator 的计算图只计算需要的节点，K线原始列直接返回。
+def get_panel_indicators(panel, columns=None):
+    if columns is None:
+        columns = idr.ALL_COLUMNS
+    base = {c: panel[c] for c in columns if c in idr.BASE_COLUMNS}
+    values = idr.calculate(panel, tuple(c for c in columns if c not in idr.BASE_COLUMNS))
+    values.update(base)
+    return values
+
+
+# 按窗口长度分组堆叠，同组内各股票天数相同，不需要补齐。
+# 窗口为 date <= end_date 的最后 calc_threshold 天；有 start_date 时窗口从 start_date 之前 calc_threshold 天开始。
+# 返回 ({长度: (股票键列表, 字段 -> 二维数组)}, 需要逐只计算的股票键列表)。
+def build_panels(stocks, end_date=None, calc_threshold=90, fields=PANEL_FIELDS, start_date=None):
+    groups = {}
+    others = []
+    for key, data in stocks.items():
+        try:
+            if data is None or len(data.index) <= 1:
+                others.append(key)
+                continue
+            date = end_date if end_date is not None else key[0]
+            end = int(np.searchsorted(data['date'].values, date, side='right'))
+            first = end if start_date is None else int(np.searchsorted(data['date'].values, start_date, side='right'))
+            start = 0 if calc_threshold is None else max(0, first - calc_threshold)
+            if end - start < 2:
+                others.append(key)
+                continue
+            values = [np.asarray(data[f].values[start:end], dtype=np.float64) for f in fields]
+            # 有缺失、成交量或成交额为0时，talib 会跳过开头的 NaN，逐只计算保证一致。
+            if not all(np.isfinite(x).all() for x in values) or (values[4] <= 0).any() or (values[5] <= 0).any():
+                others.append(key)
+                continue
+            groups.setdefault(end - start, ([], []))
+            groups[end - start][0].append(key)
+            groups[end - start][1].append(values)
+        except Exception as e:
+            logging.error(f"panel_indicator.build_panels处理异常：{key[1]}代码{e}")
+            others.append(key)
+    panels = {}
+    for length, (keys, rows) in groups.items():
+        panels[length] = (keys, {f: np.array([row[i] for row in rows]) for i, f in enumerate(fields)})
+    return panels, others
+
+
+# 批量计算每只股票最后一天的指标，返回和 get_indicator 相同的 {股票键: pd.Series}。
+def get_indicators_last(stocks, stock_column, date=None, calc_threshold=90):
+    end_date = None if date is None else date.strftime("%Y-%m-%d")
+    panels, others = build_panels(stocks, end_date, calc_threshold)
+    columns = list(stock_column[2:])
+    results = {}
+    for length, (keys, panel) in panels.items():
+        try:
+            indicators = get_panel_indicators(panel, columns)
+            values = np.column_stack([indicators[col][:, -1] for col in columns])
+            values[~np.isfinite(values)] = 0
+            for key, row in zip(keys, values):
+                _end_date = key[0] if end_date is None else end_date
+                results[key] = pd.Series([_end_date, key[1]] + row.tolist(), index=stock_column)
+        except Exception as e:
+            logging.error(f"panel_indicator.get_indicators_last处理异常：{e}")
+            others.extend(keys)
+    for key in others:
+        if key in results:
+            continue
+        _data = idr.get_indicator(key, stocks[key], stock_column, date=date, calc_threshold=calc_threshold)
+        if _data is not None:
+            results[key] = _data
+    return results
+
+
+# 批量计算多个日期的指标，返回列为 stock_column 的 DataFrame，每个日期每只股票一行，结果同逐日调用 get_indicators_last。
+# 每只股票每个日期取截止那天的最后 calc_threshold 行作为面板的一行(sliding_window_view)，按窗口长度分组，
+# 每组按 CHUNK_ROWS 行分批执行一次 get_panel_indicators，取最后一列。
+# 和 get_indicators_last 一样，某天停牌的股票取那天之前最后一天的指标，截止那天只有1天数据的逐只计算。
+def get_indicators_range(stocks, stock_column, dates, calc_threshold=90):
+    date_strs = np.array(sorted(set(d.strftime("%Y-%m-%d") for d in dates)), dtype=object)
+    columns = list(stock_column[2:])
+    parts = []
+    groups = {}  # 窗口长度 -> ([代码], [日期], 字段 -> [窗口数组])
+    others = []
+
+    def flush(length):
+        codes, days, windows = groups.pop(length)
+        try:
+            indicators = get_panel_indicators({f: np.concatenate(windows[f]) for f in PANEL_FIELDS}, columns)
+            values = np.column_stack([indicators[col][:, -1] for col in columns])
+            values[~np.isfinite(values)] = 0
+            data = pd.DataFrame(values, columns=columns)
+            data.insert(0, 'code', np.concatenate(codes))
+            data.insert(0, 'date', np.concatenate(days))
+            parts.append(data)
+        except Exception as e:
+            logging.error(f"panel_indicator.get_indicators_range处理异常：{e}")
+            others.extend(zip(np.concatenate(codes), np.concatenate(days)))
+
+    keys = {}
+    for key, data in stocks.items():
+        if data is None:
+            continue
+        keys[key[1]] = key
+        try:
+            ends = np.searchsorted(data['date'].values, date_strs, side='right')
+            others.extend((key[1], d) for d in date_strs[ends == 1])
+            has = ends >= 2
+            if not has.any():
+                continue
+            ends = ends[has]
+            requested = date_strs[has]
+            starts = np.zeros_like(ends) if calc_threshold is None else np.maximum(0, ends - calc_threshold)
+            values = [np.asarray(data[f].values[:ends[-1]], dtype=np.float64) for f in PANEL_FIELDS]
+            # 窗口内有缺失、成交量或成交额为0时，talib 会跳过开头的 NaN，逐只计算保证一致。
+            bad = ~np.isfinite(np.vstack(values)).all(axis=0) | (values[4] <= 0) | (values[5] <= 0)
+            count = np.concatenate(([0], np.cumsum(bad)))
+            ok = count[ends] == count[starts]
+            others.extend((key[1], d) for d in requested[~ok])
+            lengths = ends - starts
+            for length in np.unique(lengths[ok]):
+                at = np.flatnonzero(ok & (lengths == length))
+                length = int(length)
+                codes, days, windows = groups.setdefault(length, ([], [], {f: [] for f in PANEL_FIELDS}))
+                for f, v in zip(PANEL_FIELDS, values):
+                    windows[f].append(sliding_window_view(v, length)[starts[at]])
+                codes.append(np.full(len(at), key[1], dtype=object))
+                days.append(requested[at])
+                if sum(len(x) for x in days) >= CHUNK_ROWS:
+                    flush(length)
+        except Exception as e:
+            logging.error(f"panel_indicator.get_indicators_range处理异常：{key[1]}代码{e}")
+            others.extend((key[1], d) for d in date_strs)
+    for length in list(groups):
+        flush(length)
+
+    rows = []
+    for code, date in others:
+        key = keys[code]
+        data = stocks[key]
+        if np.searchsorted(data['date'].values, date, side='right') < 1:
+            continue
+        _data = idr.get_indicator(key, data, stock_column,
+                                  date=datetime.datetime.strptime(date, "%Y-%m-%d").date(),
+                                  calc_threshold=calc_threshold)
+        if _data is not None:
+            rows.append(_data)
+    if rows:
+        parts.append(pd.DataFrame(rows))
+    if not parts:
+        return None
+    return pd.concat(parts, ignore_index=True)[list(stock_column)]
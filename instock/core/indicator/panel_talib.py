@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import talib as tl
+from numpy.lib.stride_tricks import sliding_window_view
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# calculate_indicator 指标节点用到的 talib 函数。
+# 一维数组直接调用 talib；二维数组 (股票数 × 天数) 按列(时间)循环、整列(全部股票)计算，
+# 按 talib 的计算顺序实现(包括 EMA 用前 n 个值的均值做初值、MACD 的快线 EMA 初值取自慢线起点之前的窗口等细节)，
+# 输出在 lookback 之前为 NaN，每行结果和对这一行调用 talib 相同。
+# 二维只实现指标节点用到的参数，输入需要没有 NaN(talib 会跳过开头的 NaN)。
+
+
+def _nan(x):
+    return np.full(x.shape, np.nan)
+
+
+def _sum(x, p):
+    out = _nan(x)
+    t = x.shape[1]
+    if t < p:
+        return out
+    total = np.zeros(x.shape[0])
+    for i in range(p - 1):
+        total += x[:, i]
+    for i in range(p - 1, t):
+        total += x[:, i]
+        out[:, i] = total
+        total -= x[:, i - p + 1]
+    return out
+
+
+# talib.MA(matype=0)
+def _sma(x, p):
+    out = _nan(x)
+    t = x.shape[1]
+    if t < p:
+        return out
+    total = np.zeros(x.shape[0])
+    for i in range(p - 1):
+        total += x[:, i]
+    for i in range(p - 1, t):
+        total += x[:, i]
+        out[:, i] = total / p
+        total -= x[:, i - p + 1]
+    return out
+
+
+# talib.EMA，start 为计算初值窗口的起点，初值(前 p 个值的均值)落在 start + p - 1。
+def _ema(x, p, start=0):
+    out = _nan(x)
+    t = x.shape[1]
+    if t < start + p:
+        return out
+    k = 2.0 / (p + 1)
+    total = np.zeros(x.shape[0])
+    for i in range(start, start + p):
+        total += x[:, i]
+    prev = total / p
+    out[:, start + p - 1] = prev
+    for i in range(start + p, t):
+        prev = ((x[:, i] - prev) * k) + prev
+        out[:, i] = prev
+    return out
+
+
+def _max(x, p):
+    out = _nan(x)
+    if x.shape[1] >= p:
+        out[:, p - 1:] = sliding_window_view(x, p, axis=1).max(axis=2)
+    return out
+
+
+def _min(x, p):
+    out = _nan(x)
+    if x.shape[1] >= p:
+        out[:, p - 1:] = sliding_window_view(x, p, axis=1).min(axis=2)
+    return out
+
+
+# talib.ROC
+def _roc(x, p):
+    out = _nan(x)
+    if x.shape[1] > p:
+        prev = x[:, :-p]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[:, p:] = np.where(prev != 0.0, ((x[:, p:] / prev) - 1.0) * 100.0, 0.0)
+    return out
+
+
+def _macd(x, fast=12, slow=26, signal=9):
+    t = x.shape[1]
+    macd, macds, macdh = _nan(x), _nan(x), _nan(x)
+    begin = slow - 1 + signal - 1
+    if t <= begin:
+        return macd, macds, macdh
+    line = _ema(x, fast, start=slow - fast) - _ema(x, slow)
+    sig = _ema(line, signal, start=slow - 1)
+    macd[:, begin:] = line[:, begin:]
+    macds[:, begin:] = sig[:, begin:]
+    macdh[:, begin:] = line[:, begin:] - sig[:, begin:]
+    return macd, macds, macdh
+
+
+# talib.PPO(matype=1)
+def _ppo(x, fast=12, slow=26):
+    out = _nan(x)
+    if x.shape[1] < slow:
+        return out
+    fast_ema = _ema(x, fast)
+    slow_ema = _ema(x, slow)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ppo = np.where((slow_ema > -1e-8) & (slow_ema < 1e-8), 0.0, ((fast_ema - slow_ema) / slow_ema) * 100.0)
+    out[:, slow - 1:] = ppo[:, slow - 1:]
+    return out
+
+
+# talib.STOCH(slowk_matype=1, slowd_matype=1)
+def _stoch(high, low, close, fastk=9, slowk=5, slowd=5):
+    k, d = _nan(close), _nan(close)
+    begin = fastk - 1 + slowk - 1 + slowd - 1
+    if close.shape[1] <= begin:
+        return k, d
+    highest = _max(high, fastk)
+    lowest = _min(low, fastk)
+    diff = (highest - lowest) / 100.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fast = np.where(diff != 0.0, (close - lowest) / diff, 0.0)
+    slow_k = _ema(fast, slowk, start=fastk - 1)
+    slow_d = _ema(slow_k, slowd, start=fastk - 1 + slowk - 1)
+    k[:, begin:] = slow_k[:, begin:]
+    d[:, begin:] = slow_d[:, begin:]
+    return k, d
+
+
+# talib.BBANDS(matype=0)，nbdevup == nbdevdn
+def _bbands(x, p=20, nbdev=2.0):
+    mid = _sma(x, p)
+    ub, lb = _nan(x), _nan(x)
+    t = x.shape[1]
+    if t < p:
+        return ub, mid, lb
+    total2 = np.zeros(x.shape[0])
+    for i in range(p - 1):
+        total2 += x[:, i] * x[:, i]
+    for i in range(p - 1, t):
+        total2 += x[:, i] * x[:, i]
+        mean2 = total2 / p
+        total2 -= x[:, i - p + 1] * x[:, i - p + 1]
+        mean2 -= mid[:, i] * mid[:, i]
+        with np.errstate(invalid='ignore'):
+            std = np.where(mean2 < 1e-8, 0.0, np.sqrt(np.maximum(mean2, 0.0)))
+        dev = std * nbdev
+        ub[:, i] = mid[:, i] + dev
+        lb[:, i] = mid[:, i] - dev
+    return ub, mid, lb
+
+
+def _trix(x, p=12):
+    out = _nan(x)
+    e1 = _ema(x, p)
+    e2 = _ema(e1, p, start=p - 1)
+    e3 = _ema(e2, p, start=2 * (p - 1))
+    begin = 3 * (p - 1) + 1
+    if x.shape[1] > begin:
+        prev = e3[:, begin - 1:-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[:, begin:] = np.where(prev != 0.0, ((e3[:, begin:] / prev) - 1.0) * 100.0, 0.0)
+    return out
+
+
+def _tema(x, p=14):
+    e1 = _ema(x, p)
+    e2 = _ema(e1, p, start=p - 1)
+    e3 = _ema(e2, p, start=2 * (p - 1))
+    return ((3.0 * e1) - (3.0 * e2)) + e3
+
+
+def _rsi(x, p):
+    out = _nan(x)
+    t = x.shape[1]
+    if t <= p:
+        return out
+    gain = np.zeros(x.shape[0])
+    loss = np.zeros(x.shape[0])
+    for i in range(1, p + 1):
+        diff = x[:, i] - x[:, i - 1]
+        neg = diff < 0
+        loss[neg] -= diff[neg]
+        gain[~neg] += diff[~neg]
+    loss /= p
+    gain /= p
+
+    def value():
+        total = gain + loss
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where((total > -1e-8) & (total < 1e-8), 0.0, 100.0 * (gain / total))
+
+    out[:, p] = value()
+    for i in range(p + 1, t):
+        diff = x[:, i] - x[:, i - 1]
+        loss *= (p - 1)
+        gain *= (p - 1)
+        neg = diff < 0
+        loss[neg] -= diff[neg]
+        gain[~neg] += diff[~neg]
+        loss /= p
+        gain /= p
+        out[:, i] = value()
+    return out
+
+
+# talib.TRANGE，从第二天开始
+def _trange(high, low, close):
+    out = _nan(close)
+    prev = close[:, :-1]
+    h = high[:, 1:]
+    lo = low[:, 1:]
+    greatest = h - lo
+    greatest = np.where(np.abs(prev - h) > greatest, np.abs(prev - h), greatest)
+    greatest = np.where(np.abs(prev - lo) > greatest, np.abs(prev - lo), greatest)
+    out[:, 1:] = greatest
+    return out
+
+
+def _atr(high, low, close, p=14):
+    out = _nan(close)
+    t = close.shape[1]
+    if t <= p:
+        return out
+    tr = _trange(high, low, close)
+    total = np.zeros(close.shape[0])
+    for i in range(1, p + 1):
+        total += tr[:, i]
+    prev = total / p
+    out[:, p] = prev
+    for i in range(p + 1, t):
+        prev = prev * (p - 1)
+        prev = prev + tr[:, i]
+        prev = prev / p
+        out[:, i] = prev
+    return out
+
+
+def _willr(high, low, close, p):
+    highest = _max(high, p)
+    lowest = _min(low, p)
+    diff = (highest - lowest) / (-100.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = np.where(diff != 0.0, (highest - close) / diff, 0.0)
+    out[:, :p - 1] = np.nan
+    return out
+
+
+def _cci(high, low, close, p):
+    out = _nan(close)
+    if close.shape[1] < p:
+        return out
+    tp = (high + low + close) / 3
+    window = sliding_window_view(tp, p, axis=1)
+    total = window[:, :, 0].copy()
+    for j in range(1, p):
+        total += window[:, :, j]
+    avg = total / p
+    dev = np.abs(window[:, :, 0] - avg)
+    for j in range(1, p):
+        dev += np.abs(window[:, :, j] - avg)
+    last = tp[:, p - 1:] - avg
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[:, p - 1:] = np.where((last != 0.0) & (dev != 0.0), last / (0.015 * (dev / p)), 0.0)
+    return out
+
+
+def _mfi(high, low, close, volume, p=14):
+    out = _nan(close)
+    n, t = close.shape
+    if t <= p:
+        return out
+    tp = (high + low + close) / 3
+    pos = np.zeros((n, t))
+    neg = np.zeros((n, t))
+    diff = tp[:, 1:] - tp[:, :-1]
+    flow = tp[:, 1:] * volume[:, 1:]
+    pos[:, 1:] = np.where(diff > 0, flow, 0.0)
+    neg[:, 1:] = np.where(diff < 0, flow, 0.0)
+    pos_sum = np.zeros(n)
+    neg_sum = np.zeros(n)
+    for i in range(1, p + 1):
+        pos_sum += pos[:, i]
+        neg_sum += neg[:, i]
+
+    def value():
+        total = pos_sum + neg_sum
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(total < 1.0, 0.0, 100.0 * (pos_sum / total))
+
+    out[:, p] = value()
+    for i in range(p + 1, t):
+        pos_sum -= pos[:, i - p]
+        neg_sum -= neg[:, i - p]
+        pos_sum += pos[:, i]
+        neg_sum += neg[:, i]
+        out[:, i] = value()
+    return out
+
+
+def _obv(close, volume):
+    sign = np.zeros(close.shape)
+    sign[:, 1:] = np.where(close[:, 1:] > close[:, :-1], 1.0, np.where(close[:, 1:] < close[:, :-1], -1.0, 0.0))
+    step = sign * volume
+    step[:, 0] = volume[:, 0]
+    return np.cumsum(step, axis=1)
+
+
+# talib.SAR(acceleration=0.02, maximum=0.2)
+def _sar(high, low, acceleration=0.02, maximum=0.2):
+    out = _nan(high)
+    t = high.shape[1]
+    if t < 2:
+        return out
+    diff_p = high[:, 1] - high[:, 0]
+    diff_m = low[:, 0] - low[:, 1]
+    is_long = ~((diff_m > 0) & (diff_p < diff_m))
+    af = np.full(high.shape[0], acceleration)
+    ep = np.where(is_long, high[:, 1], low[:, 1])
+    sar = np.where(is_long, low[:, 0], high[:, 0])
+    new_low = low[:, 1]
+    new_high = high[:, 1]
+    for i in range(1, t):
+        prev_low, prev_high = new_low, new_high
+        new_low, new_high = low[:, i], high[:, i]
+        # 多头反转为空头
+        to_short = is_long & (new_low <= sar)
+        # 空头反转为多头
+        to_long = ~is_long & (new_high >= sar)
+        keep_long = is_long & ~to_short
+        keep_short = ~is_long & ~to_long
+
+        rev_sar = np.where(to_short, np.maximum(np.maximum(ep, prev_high), new_high),
+                           np.minimum(np.minimum(ep, prev_low), new_low))
+        out[:, i] = np.where(to_short | to_long, rev_sar, sar)
+
+        up = keep_long & (new_high > ep)
+        down = keep_short & (new_low < ep)
+        af = np.where(up | down, np.minimum(af + acceleration, maximum), af)
+        af = np.where(to_short | to_long, acceleration, af)
+        ep = np.where(up | to_long, new_high, np.where(down | to_short, new_low, ep))
+        base = np.where(to_short | to_long, rev_sar, sar)
+        sar = base + af * (ep - base)
+        long_now = keep_long | to_long
+        sar = np.where(long_now, np.minimum(np.minimum(sar, prev_low), new_low),
+                       np.maximum(np.maximum(sar, prev_high), new_high))
+        is_long = long_now
+    return out
+
+
+def _check(supported, name):
+    if not supported:
+        raise ValueError(f"panel_talib.{name}二维不支持的参数")
+
+
+def MA(x, timeperiod=30, matype=0):
+    if x.ndim == 1:
+        return tl.MA(x, timeperiod=timeperiod, matype=matype)
+    _check(matype == 0, 'MA')
+    return _sma(x, timeperiod)
+
+
+def EMA(x, timeperiod=30):
+    if x.ndim == 1:
+        return tl.EMA(x, timeperiod=timeperiod)
+    return _ema(x, timeperiod)
+
+
+def SUM(x, timeperiod=30):
+    if x.ndim == 1:
+        return tl.SUM(x, timeperiod=timeperiod)
+    return _sum(x, timeperiod)
+
+
+def MAX(x, timeperiod=30):
+    if x.ndim == 1:
+        return tl.MAX(x, timeperiod=timeperiod)
+    return _max(x, timeperiod)
+
+
+def MIN(x, timeperiod=30):
+    if x.ndim == 1:
+        return tl.MIN(x, timeperiod=timeperiod)
+    return _min(x, timeperiod)
+
+
+def ROC(x, timeperiod=10):
+    if x.ndim == 1:
+        return tl.ROC(x, timeperiod=timeperiod)
+    return _roc(x, timeperiod)
+
+
+def MACD(x, fastperiod=12, slowperiod=26, signalperiod=9):
+    if x.ndim == 1:
+        return tl.MACD(x, fastperiod=fastperiod, slowperiod=slowperiod, signalperiod=signalperiod)
+    return _macd(x, fastperiod, slowperiod, signalperiod)
+
+
+def PPO(x, fastperiod=12, slowperiod=26, matype=0):
+    if x.ndim == 1:
+        return tl.PPO(x, fastperiod=fastperiod, slowperiod=slowperiod, matype=matype)
+    _check(matype == 1, 'PPO')
+    return _ppo(x, fastperiod, slowperiod)
+
+
+def STOCH(high, low, close, fastk_period=5, slowk_period=3, slowk_matype=0, slowd_period=3, slowd_matype=0):
+    if close.ndim == 1:
+        return tl.STOCH(high, low, close, fastk_period=fastk_period, slowk_period=slowk_period,
+                        slowk_matype=slowk_matype, slowd_period=slowd_period, slowd_matype=slowd_matype)
+    _check(slowk_matype == 1 and slowd_matype == 1, 'STOCH')
+    return _stoch(high, low, close, fastk_period, slowk_period, slowd_period)
+
+
+def BBANDS(x, timeperiod=5, nbdevup=2, nbdevdn=2, matype=0):
+    if x.ndim == 1:
+        return tl.BBANDS(x, timeperiod=timeperiod, nbdevup=nbdevup, nbdevdn=nbdevdn, matype=matype)
+    _check(matype == 0 and nbdevup == nbdevdn, 'BBANDS')
+    return _bbands(x, timeperiod, nbdevup)
+
+
+def TRIX(x, timeperiod=30):
+    if x.ndim == 1:
+        return tl.TRIX(x, timeperiod=timeperiod)
+    return _trix(x, timeperiod)
+
+
+def TEMA(x, timeperiod=30):
+    if x.ndim == 1:
+        return tl.TEMA(x, timeperiod=timeperiod)
+    return _tema(x, timeperiod)
+
+
+def RSI(x, timeperiod=14):
+    if x.ndim == 1:
+        return tl.RSI(x, timeperiod=timeperiod)
+    return _rsi(x, timeperiod)
+
+
+def ATR(high, low, close, timeperiod=14):
+    if close.ndim == 1:
+        return tl.ATR(high, low, close, timeperiod=timeperiod)
+    return _atr(high, low, close, timeperiod)
+
+
+def WILLR(high, low, close, timeperiod=14):
+    if close.ndim == 1:
+        return tl.WILLR(high, low, close, timeperiod=timeperiod)
+    return _willr(high, low, close, timeperiod)
+
+
+def CCI(high, low, close, timeperiod=14):
+    if close.ndim == 1:
+        return tl.CCI(high, low, close, timeperiod=timeperiod)
+    return _cci(high, low, close, timeperiod)
+
+
+def MFI(high, low, close, volume, timeperiod=14):
+    if close.ndim == 1:
+        return tl.MFI(high, low, close, volume, timeperiod=timeperiod)
+    return _mfi(high, low, close, volume, timeperiod)
+
+
+def OBV(close, volume):
+    if close.ndim == 1:
+        return tl.OBV(close, volume)
+    return _obv(close, volume)
+
+
+def SAR(high, low, acceleration=0.02, maximum=0.2):
+    if high.ndim == 1:
+        return tl.SAR(high, low, acceleration=acceleration, maximum=maximum)
+    return _sar(high, low, acceleration, maximum)
@@ -20,12 +20,16 @@ import instock.core.kline.indicator_web_dic as iwd
 __author__ = 'myh '
 __date__ = '2023/4/6 '
 
+# 图中用到的指标列：均线、成交量均线和各指标页
+PLOT_COLUMNS = tuple(dict.fromkeys(("ma10", "ma20", "ma50", "ma200", "vol_5", "vol_10") +
+                                   tuple(name for conf in iwd.indicators_dic for name in conf["dic"])))
+
 
 def get_plot_kline(code, stock, date, stock_name):
     plot_list = []
     threshold = 360
     try:
-        data = idr.get_indicators(stock, date, threshold=threshold)
+        data = idr.get_indicators(stock, date, threshold=threshold, columns=PLOT_COLUMNS)
         if data is None:
             return None
 
@@ -2,6 +2,9 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import numpy as np
+import instock.core.hist_store as hst
+import instock.core.hist_panel as hpl
 
 __author__ = 'myh '
 __date__ = '2023/3/24 '
@@ -68,3 +71,133 @@ def get_pattern_recognition(code_name, data, stock_column, date=None, calc_thres
         logging.error(f"pattern_recognitions.get_pattern_recognition处理异常：{code}代码{e}")
 
     return None
+
+
+_OHLC = ('open', 'high', 'low', 'close')
+
+
+# 取每只股票截止日(含)的最后 calc_threshold 行开高低收，右对齐写入预先分配的 (4, 股票数, calc_threshold) 数组，
+# 返回 股票键、窗口数组、每只股票的窗口行数。面板文件直接读数据块，不构造 DataFrame。
+def _tail_windows(stocks, date, calc_threshold):
+    if isinstance(stocks, hpl.PanelData):
+        items = zip(stocks.keys_list, stocks.extents)
+        date_row = stocks.columns.index('date')
+        rows = [stocks.columns.index(f) for f in _OHLC]
+    else:
+        items = stocks.items()
+    size = len(stocks)
+    windows = np.zeros((len(_OHLC), size, calc_threshold), dtype=np.float64)
+    lengths = np.zeros(size, dtype=np.int64)
+    keys = []
+    end_date = None if date is None else date.strftime("%Y-%m-%d")
+    end_days = {}
+    i = 0
+    for key, data in items:
+        if isinstance(stocks, hpl.PanelData):
+            if data[1] <= 1:
+                continue
+            block = stocks.block_at(*data)
+            _date = key[0] if end_date is None else end_date
+            day = end_days.get(_date)
+            if day is None:
+                day = end_days[_date] = int(hst.to_days([_date])[0])
+            e = int(np.searchsorted(block[date_row], day, side='right'))
+            columns = [block[r] for r in rows]
+        else:
+            if data is None or len(data.index) <= 1:
+                continue
+            e = int(np.searchsorted(data['date'].values, key[0] if end_date is None else end_date, side='right'))
+            columns = [data[f].values for f in _OHLC]
+        n = min(e, calc_threshold)
+        if n == 0:
+            continue
+        for f, values in enumerate(columns):
+            windows[f, i, calc_threshold - n:] = values[e - n:e]
+        lengths[i] = n
+        keys.append(key)
+        i += 1
+    return keys, windows[:, :i], lengths[:i]
+
+
+# 批量识别截止日的K线形态，结果同 get_pattern_recognition。
+# 返回 股票键列表 和 (股票数, 形态数) 的 int8 矩阵，值为形态函数结果除以100(-2~2)，只包含有形态的股票。
+def scan_patterns(stocks, stock_column, date=None, calc_threshold=12):
+    funcs = [stock_column[k]['func'] for k in stock_column]
+    keys, windows, lengths = _tail_windows(stocks, date, calc_threshold)
+    result = np.zeros((len(keys), len(funcs)), dtype=np.int8)
+    for i in range(len(keys)):
+        s = calc_threshold - lengths[i]
+        o, h, l, c = windows[0, i, s:], windows[1, i, s:], windows[2, i, s:], windows[3, i, s:]
+        row = result[i]
+        for j, func in enumerate(funcs):
+            try:
+                row[j] = func(o, h, l, c)[-1] // 100
+            except Exception as e:
+                logging.error(f"pattern_recognitions.scan_patterns处理异常：{keys[i][1]}代码{e}")
+    mask = result.any(axis=1)
+    return [k for k, m in zip(keys, mask) if m], result[mask]
+
+
+# 多个日期的K线形态，每只股票每个形态函数只在覆盖全部日期的一段数据上计算一次，再取出每个日期那一行。
+# 单日计算只用截止那天的最后 calc_threshold 行，形态需要的行数(lookback)超过那天可用行数时结果为0，这里同样置0。
+# dates 为升序的日期，返回 (日期, 代码, 名称) 键列表 和 int8 矩阵，只包含有形态的行，结果同逐日 scan_patterns。
+def scan_patterns_range(stocks, stock_column, dates, calc_threshold=12):
+    funcs = [stock_column[k]['func'] for k in stock_column]
+    lookbacks = np.array([_lookback(func) for func in funcs], dtype=np.int64)
+    date_strs = [d.strftime("%Y-%m-%d") for d in dates]
+    if isinstance(stocks, hpl.PanelData):
+        items = zip(stocks.keys_list, stocks.extents)
+        date_row = stocks.columns.index('date')
+        rows = [stocks.columns.index(f) for f in _OHLC]
+        requested = hst.to_days(date_strs)
+    else:
+        items = stocks.items()
+        requested = np.array(date_strs, dtype=object)
+    keys = []
+    parts = []
+    for key, data in items:
+        try:
+            if isinstance(stocks, hpl.PanelData):
+                if data[1] <= 1:
+                    continue
+                block = stocks.block_at(*data)
+                ends = np.searchsorted(block[date_row], requested, side='right')
+                columns = [block[r] for r in rows]
+            else:
+                if data is None or len(data.index) <= 1:
+                    continue
+                ends = np.searchsorted(data['date'].values, requested, side='right')
+                columns = [data[f].values for f in _OHLC]
+            has = ends > 0
+            if not has.any():
+                continue
+            ends = ends[has]
+            s = max(0, int(ends[0]) - calc_threshold)
+            o, h, l, c = (np.ascontiguousarray(values[s:ends[-1]], dtype=np.float64) for values in columns)
+            at = ends - 1 - s
+            result = np.zeros((len(ends), len(funcs)), dtype=np.int8)
+            for j, func in enumerate(funcs):
+                result[:, j] = func(o, h, l, c)[at] // 100
+            # 单日窗口里可用的历史行数
+            history = np.minimum(ends - 1, calc_threshold - 1)
+            result[lookbacks[None, :] > history[:, None]] = 0
+            mask = result.any(axis=1)
+            if not mask.any():
+                continue
+            for i in np.flatnonzero(has)[mask]:
+                keys.append((date_strs[i], key[1], key[2]))
+            parts.append(result[mask])
+        except Exception as e:
+            logging.error(f"pattern_recognitions.scan_patterns_range处理异常：{key[1]}代码{e}")
+    if not parts:
+        return [], np.zeros((0, len(funcs)), dtype=np.int8)
+    return keys, np.concatenate(parts)
+
+
+# 形态函数需要的历史行数。
+def _lookback(func):
+    try:
+        from talib import abstract
+        return abstract.Function(func.__name__).lookback
+    except Exception:
+        return 0
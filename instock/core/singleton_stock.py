@@ -6,6 +6,8 @@ import concurrent.futures
 import instock.core.stockfetch as stf
 import instock.core.tablestructure as tbs
 import instock.lib.trade_time as trd
+import instock.lib.rate_limiter as rlm
+import instock.core.hist_panel as hpl
 from instock.lib.singleton_type import singleton_type
 
 __author__ = 'myh '
@@ -25,8 +27,10 @@ class stock_data(metaclass=singleton_type):
 
 
 # 读取股票历史数据
+# 收盘后的全部股票历史发布成当天的面板文件(hist_panel)，同一天的其他作业、其他进程直接映射，不再重新加载。
 class stock_hist_data(metaclass=singleton_type):
-    def __init__(self, date=None, stocks=None, workers=15):
+    def __init__(self, date=None, stocks=None, workers=None):
+        is_all = stocks is None
         if stocks is None:
             _subset = stock_data(date).get_data()[list(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])]
             stocks = [tuple(x) for x in _subset.values]
@@ -34,22 +38,22 @@ class stock_hist_data(metaclass=singleton_type):
             self.data = None
             return
         date_start, is_cache = trd.get_trade_hist_interval(stocks[0][0])  # 提高运行效率，只运行一次
-        _data = {}
-        try:
-            # max_workers是None还是没有给出，将默认为机器cup个数*5
-            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-                future_to_stock = {executor.submit(stf.fetch_stock_hist, stock, date_start, is_cache): stock for stock
-                                   in stocks}
-                for future in concurrent.futures.as_completed(future_to_stock):
-                    stock = future_to_stock[future]
-                    try:
-                        __data = future.result()
-                        if __data is not None:
-                            _data[stock] = __data
-                    except Exception as e:
-                        logging.error(f"singleton.stock_hist_data处理异常：{stock[1]}代码{e}")
-        except Exception as e:
-            logging.error(f"singleton.stock_hist_data处理异常：{e}")
+        _data = None
+        is_loaded = False
+        if is_all and is_cache:
+            try:
+                with hpl.lock(stocks[0][0]):
+                    _data = hpl.attach(stocks[0][0])
+                    if _data is None:
+                        _data = _publish(stocks, date_start, is_cache, workers)
+                    elif _data.missing:
+                        _data = _publish(_data.missing, date_start, is_cache, workers, _data)
+                    # 面板发布或映射失败时改为直接抓取
+                    is_loaded = _data is not None
+            except Exception as e:
+                logging.error(f"singleton.stock_hist_data面板处理异常：{e}")
+        if not is_loaded:
+            _data, _ = _fetch_hist(stocks, date_start, is_cache, workers)
         if not _data:
             self.data = None
         else:
@@ -59,9 +63,70 @@ class stock_hist_data(metaclass=singleton_type):
         return self.data
 
 
+# 抓取并发布当天的面板，没有抓取到数据的股票记录在面板里。
+# panel 为已发布但缺少股票的面板，这时 stocks 为缺少的股票，只重新抓取这些，抓到的补进面板重新发布。
+def _publish(stocks, date_start, is_cache, workers, panel=None):
+    fetched = None
+    if panel is not None:
+        fetched, missing = _fetch_hist(stocks, date_start, is_cache, workers)
+        if not fetched:
+            return panel
+    writer = hpl.PanelWriter(stocks[0][0])
+    try:
+        if panel is None:
+            _, missing = _fetch_hist(stocks, date_start, is_cache, workers, writer)
+        else:
+            writer.add_panel(panel)
+            for stock, data in fetched.items():
+                writer.add(stock, data)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.finish(missing)
+
+
+# 抓取历史数据，有 writer 时逐只写入面板文件，不在内存里保留。
+# 出错或没有数据的股票再抓取一次，返回 (数据, 仍然没有数据的股票键列表)。
+def _fetch_hist(stocks, date_start, is_cache, workers, writer=None):
+    _data = {}
+    missing = list(stocks)
+    try:
+        # 线程数只是上限，实际的请求速率和并发由 rate_limiter 按接口控制
+        # 列式存储批量写入，全部完成后保存一次索引。
+        with stf.stock_raw_store().batch(), \
+                concurrent.futures.ThreadPoolExecutor(max_workers=workers or rlm.max_workers()) as executor:
+            for _ in range(2):
+                future_to_stock = {executor.submit(stf.fetch_stock_hist, stock, date_start, is_cache): stock for stock
+                                   in missing}
+                missing = []
+                for future in concurrent.futures.as_completed(future_to_stock):
+                    stock = future_to_stock[future]
+                    try:
+                        __data = future.result()
+                    except Exception as e:
+                        logging.error(f"singleton.stock_hist_data处理异常：{stock[1]}代码{e}")
+                        __data = None
+                    if __data is None:
+                        missing.append(stock)
+                    elif writer is None:
+                        _data[stock] = __data
+                    else:
+                        writer.add(stock, __data)
+                if not missing:
+                    break
+    except Exception as e:
+        if writer is not None:
+            raise
+        logging.error(f"singleton.stock_hist_data处理异常：{e}")
+    if missing:
+        logging.error(f"singleton.stock_hist_data没有数据：{len(missing)}只股票{[s[1] for s in missing[:20]]}")
+    logging.info(f"singleton.stock_hist_data抓取统计：\n{rlm.report()}")
+    return _data, missing
+
+
 # 读取股票min历史数据
 class stock_hist_min_data(metaclass=singleton_type):
-    def __init__(self, date=None, stocks=None, workers=15):
+    def __init__(self, date=None, stocks=None, workers=None):
         if stocks is None:
             _subset = stock_data(date).get_data()[list(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])]
             stocks = [tuple(x) for x in _subset.values]
@@ -74,8 +139,8 @@ class stock_hist_min_data(metaclass=singleton_type):
         is_cache = True
         _data = {}
         try:
-            # max_workers是None还是没有给出，将默认为机器cup个数*5
-            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            # 线程数只是上限，实际的请求速率和并发由 rate_limiter 按接口控制
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers or rlm.max_workers()) as executor:
                 future_to_stock = {executor.submit(stf.fetch_stock_hist_min, stock, date_start, is_cache): stock for stock
                                    in stocks}
                 for future in concurrent.futures.as_completed(future_to_stock):
@@ -110,7 +175,7 @@ class etf_data(metaclass=singleton_type):
     
 # 读取etf-min历史数据  todo
 class etf_hist_min_data(metaclass=singleton_type):
-    def __init__(self, date=None, etfs=None, workers=15):
+    def __init__(self, date=None, etfs=None, workers=None):
         if etfs is None:
             _subset = etf_data(date).get_data()[list(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])]
             etfs = [tuple(x) for x in _subset.values]
@@ -123,8 +188,8 @@ class etf_hist_min_data(metaclass=singleton_type):
         is_cache = True
         _data = {}
         try:
-            # max_workers是None还是没有给出，将默认为机器cup个数*5
-            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            # 线程数只是上限，实际的请求速率和并发由 rate_limiter 按接口控制
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers or rlm.max_workers()) as executor:
                 future_to_stock = {executor.submit(stf.fetch_etf_hist_min, stock, date_start, is_cache): stock for stock
                                    in etfs}
                 for future in concurrent.futures.as_completed(future_to_stock):
@@ -147,7 +212,7 @@ class etf_hist_min_data(metaclass=singleton_type):
 
 # 读取股票历史数据
 class etf_hist_data(metaclass=singleton_type):
-    def __init__(self, date=None, stocks=None, workers=15):
+    def __init__(self, date=None, stocks=None, workers=None):
         if stocks is None:
             _subset = etf_data(date).get_data()[list(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])]
             stocks = [tuple(x) for x in _subset.values]
@@ -157,8 +222,9 @@ class etf_hist_data(metaclass=singleton_type):
         date_start, is_cache = trd.get_trade_hist_interval(stocks[0][0])  # 提高运行效率，只运行一次
         _data = {}
         try:
-            # max_workers是None还是没有给出，将默认为机器cup个数*5
-            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            # 线程数只是上限，实际的请求速率和并发由 rate_limiter 按接口控制
+            with stf.etf_hist_store('qfq').batch(), \
+                    concurrent.futures.ThreadPoolExecutor(max_workers=workers or rlm.max_workers()) as executor:
                 future_to_stock = {executor.submit(stf.fetch_etf_hist, stock, date_start,None, is_cache,'qfq'): stock for stock
                                    in stocks}
                 for future in concurrent.futures.as_completed(future_to_stock):
@@ -171,6 +237,7 @@ class etf_hist_data(metaclass=singleton_type):
                         logging.error(f"singleton.stock_hist_data处理异常：{stock[1]}代码{e}")
         except Exception as e:
             logging.error(f"singleton.etf_hist_data处理异常：{e}")
+        logging.info(f"singleton.etf_hist_data抓取统计：\n{rlm.report()}")
         if not _data:
             self.data = None
         else:
@@ -2,20 +2,33 @@
 # -*- coding: utf-8 -*-
 
 import logging
-import instock.core.stockfetch as stf
+import instock.core.trade_calendar as tcal
 from instock.lib.singleton_type import singleton_type
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
 
 
-# 读取股票交易日历数据
-class stock_trade_date(metaclass=singleton_type):
+# 读取股票交易日历，本地缓存，过期才下载
+class stock_trade_calendar(metaclass=singleton_type):
     def __init__(self):
+        self.data = None
         try:
-            self.data = stf.fetch_stocks_trade_date()
+            self.data = tcal.load_calendar()
         except Exception as e:
-            logging.error(f"singleton.stock_trade_date处理异常：{e}")
+            logging.error(f"singleton.stock_trade_calendar处理异常：{e}")
+
+    def get_data(self):
+        return self.data
+
+
+# 读取股票交易日历数据(日期集合)
+class stock_trade_date(metaclass=singleton_type):
+    def __init__(self):
+        self.data = None
+        calendar = stock_trade_calendar().get_data()
+        if calendar is not None:
+            self.data = calendar.to_set()
 
     def get_data(self):
         return self.data
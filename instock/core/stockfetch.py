@@ -4,14 +4,14 @@
 import logging
 import os.path
 import datetime
-import time
+import threading
 import numpy as np
 import pandas as pd
 import talib as tl
-from retry import retry
 import instock.core.tablestructure as tbs
+import instock.core.hist_store as hst
+import instock.core.hist_panel as hpl
 import instock.lib.trade_time as trd
-import instock.core.crawling.trade_date_hist as tdh
 import instock.core.crawling.fund_etf_em as fee
 import instock.core.crawling.stock_selection as sst
 import instock.core.crawling.stock_lhb_em as sle
@@ -63,19 +63,6 @@ def is_open_with_line(price):
     return price != '-'
 
 
-# 读取股票交易日历数据
-def fetch_stocks_trade_date():
-    try:
-        data = tdh.tool_trade_date_hist_sina()
-        if data is None or len(data.index) == 0:
-            return None
-        data_date = set(data['trade_date'].values.tolist())
-        return data_date
-    except Exception as e:
-        logging.error(f"stockfetch.fetch_stocks_trade_date处理异常：{e}")
-    return None
-
-
 # 读取当天股票数据
 def fetch_etfs(date):
     try:
@@ -247,7 +234,6 @@ def fetch_stock_blocktrade_data(date):
 
 
 # 读取etf历史数据   
-@retry(tries=3, delay=2) #自动重试机制会处理失败情况
 def fetch_etf_hist(data_base, date_start=None, date_end=None,is_cache=True, adjust='qfq'):
     date = data_base[0]
     code = data_base[1]
@@ -255,48 +241,8 @@ def fetch_etf_hist(data_base, date_start=None, date_end=None,is_cache=True, adju
     if date_start is None:
         date_start, is_cache = trd.get_trade_hist_interval(date)  # 提高运行效率，只运行一次
     try:
-        cache_dir = os.path.join(etf_hist_cache_path, "daily")
-        # 全部存在一个一个文件里面
-        try:
-            if not os.path.exists(cache_dir):
-                os.makedirs(cache_dir)
-        except Exception:
-            pass
-        cache_file = os.path.join(cache_dir, "%s%s.gzip.pickle" % (code, adjust))
-        # 如果缓存存在就直接返回缓存数据。压缩方式。
-        if os.path.isfile(cache_file):
-            cached_data = pd.read_pickle(cache_file, compression="gzip")
-
-            # 获取今天的数据(目前只获取一天，添加到缓存中，todo：获取多天数据，合并进去，防止前面有意外没成功的)
-            today_str = datetime.datetime.now().strftime("%Y%m%d")
-            latest_stock = fee.fund_etf_hist_em(symbol=code, period="daily", start_date=today_str, adjust=adjust)
-
-            if latest_stock is not None and len(latest_stock.index) > 0:
-                latest_stock.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
-
-                # 合并缓存数据与最新数据
-                stock = pd.concat([cached_data, latest_stock], ignore_index=True)
-
-                if is_cache:
-                    stock.to_pickle(cache_file, compression="gzip")
-        else:
-            if date_end is not None:
-                stock = fee.fund_etf_hist_em(symbol=code, period="daily", start_date=date_start, end_date=date_end,
-                                            adjust=adjust)
-            else:
-                stock = fee.fund_etf_hist_em(symbol=code, period="daily", start_date=date_start, adjust=adjust)
-
-            if stock is None or len(stock.index) == 0:
-                return None
-            stock.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
-            stock = stock.sort_index()  # 将数据按照日期排序下。
-            try:
-                if is_cache:
-                    stock.to_pickle(cache_file, compression="gzip")
-            except Exception as e:
-                pass
-            # time.sleep(0.3)
-        data=stock
+        data = hist_store_cache(fee.fund_etf_hist_em, etf_hist_store(adjust), etf_hist_cache_path,
+                                code, date_start, date_end, is_cache, adjust)
         if data is not None:
             data.loc[:, 'p_change'] = tl.ROC(data['close'].values, 1)
             data['p_change'].values[np.isnan(data['p_change'].values)] = 0.0
@@ -316,6 +262,11 @@ def fetch_stock_hist(data_base, date_start=None, is_cache=True):
     if date_start is None:
         date_start, is_cache = trd.get_trade_hist_interval(date)  # 提高运行效率，只运行一次
         # date_end = date_end.strftime("%Y%m%d")
+        # 当天的面板文件已发布时直接从映射里取，数值列只读。
+        if is_cache:
+            data = hpl.get_frame(date, code)
+            if data is not None:
+                return data
     try:
         data = stock_hist_cache(code, date_start, None, is_cache, 'qfq')
         if data is not None:
@@ -329,67 +280,209 @@ def fetch_stock_hist(data_base, date_start=None, is_cache=True):
 
 
 # 增加读取股票缓存方法。加快处理速度。多线程解决效率
-@retry(tries=3, delay=2) #自动重试机制会处理失败情况
+# 缓存的是不复权数据和复权因子，前复权/后复权在读取时计算，除权除息后不需要重新下载历史。
 def stock_hist_cache(code, date_start, date_end=None, is_cache=True, adjust=''):
-    cache_dir = os.path.join(stock_hist_cache_path, "daily")
-    # 全部存在一个一个文件里面
-    try:
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
-    except Exception:
-        pass
-    cache_file = os.path.join(cache_dir, "%s%s.gzip.pickle" % (code, adjust))
-    # 如果缓存存在就直接返回缓存数据。压缩方式。
     try:
-        if os.path.isfile(cache_file):
-            cached_data = pd.read_pickle(cache_file, compression="gzip")
+        # 旧版本缓存的是前复权数据，换算不出不复权价格和后复权因子，不导入，首次运行重新下载全部历史。
+        store = stock_raw_store()
+        data = hist_store_cache(she.stock_zh_a_hist, store, None,
+                                code, date_start, date_end, is_cache, '', _stock_hist_factor)
+        return adjust_hist(data, adjust)
+    except Exception as e:
+        logging.error(f"stockfetch.stock_hist_cache处理异常：{code}代码{e}")
+        raise
 
-            # 获取今天的数据(目前只获取一天，添加到缓存中，todo：获取多天数据，合并进去，防止前面有意外没成功的)
-            today_str = datetime.datetime.now().strftime("%Y%m%d")
-            latest_stock = she.stock_zh_a_hist(symbol=code, period="daily", start_date=today_str, adjust=adjust)
 
-            if latest_stock is not None and len(latest_stock.index) > 0:
-                latest_stock.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
+HIST_RAW_FIELDS = hst.HIST_FIELDS + ('factor',)
+_ADJUST_COLUMNS = ('open', 'close', 'high', 'low', 'ups_downs')
 
-                # 合并缓存数据与最新数据
-                stock = pd.concat([cached_data, latest_stock], ignore_index=True)
 
-                if is_cache:
-                    stock.to_pickle(cache_file, compression="gzip")
-                
-                return stock
-        else:
-            if date_end is not None:
-                stock = she.stock_zh_a_hist(symbol=code, period="daily", start_date=date_start, end_date=date_end,
-                                            adjust=adjust)
-            else:
-                stock = she.stock_zh_a_hist(symbol=code, period="daily", start_date=date_start, adjust=adjust)
-
-            if stock is None or len(stock.index) == 0:
-                return None
-            stock.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
-            stock = stock.sort_index()  # 将数据按照日期排序下。
-            try:
-                if is_cache:
-                    stock.to_pickle(cache_file, compression="gzip")
-            except Exception as e:
-                pass
-            time.sleep(0.3)
-            return stock
-    except Exception as e:
-        logging.error(f"stockfetch.stock_hist_cache处理异常：{code}代码{e}")
-        raise
-    return None
+# 股票不复权日线和复权因子(后复权价格 = 不复权价格 * factor)的列式存储。
+def stock_raw_store():
+    return hst.open_store(os.path.join(stock_hist_cache_path, 'store', 'raw'), HIST_RAW_FIELDS)
 
 
+# ETF日线历史数据列式存储，每个复权方式一个。
+def etf_hist_store(adjust=''):
+    return hst.open_store(os.path.join(etf_hist_cache_path, 'store', adjust if adjust else 'none'))
 
 
+# 由不复权数据和复权因子计算复权数据。
+# 前复权以最后一天为基准：qfq = raw * factor / factor[-1]；后复权：hfq = raw * factor。
+def adjust_hist(data, adjust=''):
+    if data is None or 'factor' not in data.columns:
+        return data
+    factor = data['factor'].values
+    data = data.drop(columns='factor')
+    if adjust == 'qfq':
+        ratio = factor / factor[-1]
+    elif adjust == 'hfq':
+        ratio = factor
+    else:
+        return data
+    for col in _ADJUST_COLUMNS:
+        data[col] = data[col].values * ratio
+    return data
+
+
+# 计算新数据的复权因子，返回(数据，是否可以写入缓存)。
+# 首次下载时用同区间的后复权数据计算：factor = 后复权收盘价 / 不复权收盘价；
+# 增量更新时沿用上一天的因子，遇到除权除息日按分红送配方案调整：
+# 除权参考价 = (前收盘价 - 每股派现) / (1 + 每股送转)，factor = factor_prev * 前收盘价 / 除权参考价。
+def _stock_hist_factor(code, cached_data, stock, date_start=None, date_end=None):
+    if cached_data is None:
+        if date_end is not None:
+            hfq = she.stock_zh_a_hist(symbol=code, period="daily", start_date=date_start, end_date=date_end,
+                                      adjust='hfq')
+        else:
+            hfq = she.stock_zh_a_hist(symbol=code, period="daily", start_date=date_start, adjust='hfq')
+        if hfq is None or len(hfq.index) == 0:
+            raise Exception(f"{code}后复权数据为空")
+        hfq.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
+        hfq_close = pd.Series(hfq['close'].values, index=hfq['date'].values)
+        raw_close = stock['close'].values
+        with np.errstate(divide='ignore', invalid='ignore'):
+            factor = hfq_close.reindex(stock['date'].values).values / raw_close
+        factor[~np.isfinite(factor) | (factor <= 0)] = np.nan
+        stock['factor'] = pd.Series(factor).ffill().bfill().fillna(1.0).values
+        return stock, True
+
+    last_date = cached_data['date'].values[-1] if len(cached_data.index) > 0 else stock['date'].values[0]
+    events = _bonus_events(hst.to_date(hst.to_days([last_date])[0]))
+    factor = cached_data['factor'].values[-1] if len(cached_data.index) > 0 else 1.0
+    pre_close = cached_data['close'].values[-1] if len(cached_data.index) > 0 else np.nan
+    factors = np.empty(len(stock.index))
+    for i, (day, close) in enumerate(zip(hst.to_days(stock['date'].values), stock['close'].values)):
+        if events is not None and (code, day) in events and pre_close > 0:
+            shares, cash = events[(code, day)]
+            ex_close = (pre_close - cash) / (1 + shares)
+            if ex_close > 0:
+                factor = factor * pre_close / ex_close
+        factors[i] = factor
+        pre_close = close
+    stock['factor'] = factors
+    # 取不到分红送配数据时不写缓存，下次运行再补。
+    return stock, events is not None
+
+
+_bonus_events_data = {}
+_bonus_events_lock = threading.Lock()
+
+
+# 从 date 前一年的中报开始到最近报告期的全部分红送配报告期，
+# 报告期之后较晚的除权除息日、以及漏跑或晚跑的那几天的除权除息都能取到。
+def _bonus_report_dates(date):
+    last = trd.get_bonus_report_date()
+    report_date = min(f"{date.year - 1}0630", last)
+    report_dates = []
+    while report_date <= last:
+        report_dates.append(report_date)
+        if report_date.endswith('0630'):
+            report_date = f"{report_date[:4]}1231"
+        else:
+            report_date = f"{int(report_date[:4]) + 1}0630"
+    return tuple(report_dates)
+
+
+# 缓存最后一天 date 之后可能用到的除权除息事件：(代码, 除权除息日天数) -> (每股送转, 每股派现)。
+# 每个进程每个报告期只下载一次，下载失败返回None。
+def _bonus_events(date):
+    report_dates = _bonus_report_dates(date)
+    with _bonus_events_lock:
+        if report_dates in _bonus_events_data:
+            return _bonus_events_data[report_dates]
+        events = {}
+        for report_date in report_dates:
+            if report_date not in _bonus_events_data:
+                _bonus_events_data[report_date] = _bonus_report_events(report_date)
+            if _bonus_events_data[report_date] is None:
+                events = None
+                break
+            events.update(_bonus_events_data[report_date])
+        _bonus_events_data[report_dates] = events
+        return events
+
+
+# 一个报告期的除权除息事件，下载失败返回None。
+def _bonus_report_events(report_date):
+    events = {}
+    try:
+        data = sfe.stock_fhps_em(date=report_date)
+        if data is None or len(data.index) == 0:
+            return events
+        data = data[data['除权除息日'].notnull()]
+        days = hst.to_days(data['除权除息日'].values)
+        shares = data['送转股份-送转总比例'].fillna(0).values / 10  # 每10股
+        cash = data['现金分红-现金分红比例'].fillna(0).values / 10
+        for code, day, share, money in zip(data['代码'].values, days, shares, cash):
+            events[(code, day)] = (share, money)
+    except Exception as e:
+        logging.error(f"stockfetch._bonus_report_events处理异常：{report_date}{e}")
+        return None
+    return events
 
 
+# 把旧版本 daily/<code><adjust>.gzip.pickle 缓存导入列式存储，只执行一次。
+def _migrate_hist_pickle(store, cache_path, code, adjust):
+    cache_file = os.path.join(cache_path, "daily", "%s%s.gzip.pickle" % (code, adjust))
+    if not os.path.isfile(cache_file):
+        return
+    try:
+        cached_data = pd.read_pickle(cache_file, compression="gzip")
+        if cached_data is not None and len(cached_data.index) > 0:
+            cached_data = cached_data.drop_duplicates(subset='date', keep='last').sort_values('date')
+            store.upsert(code, cached_data)
+    except Exception as e:
+        logging.error(f"stockfetch._migrate_hist_pickle处理异常：{code}代码{e}")
+
+
+# 从列式存储读取日线数据。缓存不存在时下载全部历史；
+# 存在时按交易日历从最后缓存日的下一个交易日开始补齐，按日期去重后只写入尾部，
+# 某天失败了下次运行会自动补上。盘中(is_cache=False)的当天数据不写入缓存。
+# factor_fun 不为空时用于给新数据计算复权因子。
+def hist_store_cache(fetch_fun, store, cache_path, code, date_start, date_end=None, is_cache=True, adjust='',
+                     factor_fun=None):
+    if cache_path is not None and not store.has(code):
+        _migrate_hist_pickle(store, cache_path, code, adjust)
+    if store.has(code):
+        cached_data = store.get_frame(code)
+        last_day = store.last_day(code)
+        if is_cache and last_day >= hst.to_days([trd.get_trade_date_last()[0]])[0]:
+            return cached_data
+        start_date = trd.get_next_trade_date(hst.to_date(last_day))
+        latest_stock = fetch_fun(symbol=code, period="daily", start_date=start_date.strftime("%Y%m%d"),
+                                 adjust=adjust)
+        if latest_stock is None or len(latest_stock.index) == 0:
+            return cached_data
+        latest_stock.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
+        latest_stock = latest_stock.drop_duplicates(subset='date', keep='last')
+        first_day = hst.to_days(latest_stock['date'].values[:1])[0]
+        n = int(np.searchsorted(hst.to_days(cached_data['date'].values), first_day, side='left'))
+        if factor_fun is not None:
+            latest_stock, can_cache = factor_fun(code, cached_data.iloc[:n], latest_stock)
+            is_cache = is_cache and can_cache
+        if is_cache:
+            store.upsert(code, latest_stock)
+        # 合并缓存数据与最新数据，重叠的日期以最新数据为准
+        return pd.concat([cached_data.iloc[:n], latest_stock], ignore_index=True)
+
+    if date_end is not None:
+        stock = fetch_fun(symbol=code, period="daily", start_date=date_start, end_date=date_end, adjust=adjust)
+    else:
+        stock = fetch_fun(symbol=code, period="daily", start_date=date_start, adjust=adjust)
+    if stock is None or len(stock.index) == 0:
+        return None
+    stock.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
+    stock = stock.sort_index()  # 将数据按照日期排序下。
+    if factor_fun is not None:
+        stock, can_cache = factor_fun(code, None, stock, date_start, date_end)
+        is_cache = is_cache and can_cache
+    if is_cache:
+        store.upsert(code, stock)
+    return stock
 
 
 # 读取股票历史数据# min
-@retry(tries=3, delay=2) #自动重试机制会处理失败情况
 def fetch_stock_hist_min(data_base, date_start=None, is_cache=True):
     date = data_base[0]
     code = data_base[1]
@@ -400,7 +493,6 @@ def fetch_stock_hist_min(data_base, date_start=None, is_cache=True):
             data.loc[:, 'p_change'] = tl.ROC(data['close'].values, 1)
             data['p_change'].values[np.isnan(data['p_change'].values)] = 0.0
             data["volume"] = data['volume'].values.astype('double') * 100  # 成交量单位从手变成股。
-        time.sleep(0.3)
         return data
     except Exception as e:
         logging.error(f"stockfetch.fetch_stock_hist_min处理异常：{e}")
@@ -458,7 +550,6 @@ def stock_hist_min_cache(code, date_start, date_end=None, is_cache=True, adjust=
     return None
 
 # 读取etf历史数据  min
-@retry(tries=3, delay=2) #自动重试机制会处理失败情况
 def fetch_etf_hist_min(data_base, date_start=None, adjust='qfq'):
     date = data_base[0]
     code = data_base[1]
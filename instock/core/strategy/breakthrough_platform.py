@@ -1,7 +1,6 @@
 #!/usr/local/bin/python
 # -*- coding: utf-8 -*-
 
-from datetime import datetime
 import numpy as np
 import talib as tl
 from instock.core.strategy import enter
@@ -15,35 +14,36 @@ __date__ = '2023/3/10 '
 # 2.且【1】放量上涨
 # 3.且【1】间之前时间，任意一天收盘价与60日均线偏离在-5%~20%之间。
 def check(code_name, data, date=None, threshold=60):
-    origin_data = data
     if date is None:
         end_date = code_name[0]
     else:
         end_date = date.strftime("%Y-%m-%d")
     if end_date is not None:
         mask = (data['date'] <= end_date)
-        data = data.loc[mask].copy()
+        data = data.loc[mask]
     if len(data.index) < threshold:
         return False
 
-    data.loc[:, 'ma60'] = tl.MA(data['close'].values, timeperiod=60)
-    data['ma60'].values[np.isnan(data['ma60'].values)] = 0.0
-
-    data = data.tail(n=threshold)
+    close = data['close'].values
+    open_price = data['open'].values
+    ma60 = tl.MA(close, timeperiod=60)
+    ma60[np.isnan(ma60)] = 0.0
+    # 每天是否放量上涨，只计算一次
+    volume_signal = enter.check_volume_signal(data, threshold=threshold)
+    n = len(close)
+    start = n - threshold
 
     breakthrough_row = None
-    for _close, _open, _date, _ma60 in zip(data['close'].values, data['open'].values, data['date'].values, data['ma60'].values):
-        if _open < _ma60 <= _close:
-            if enter.check_volume(code_name, origin_data, date=datetime.date(datetime.strptime(_date, '%Y-%m-%d')), threshold=threshold):
-                breakthrough_row = _date
-                break
+    for i in range(start, n):
+        if open_price[i] < ma60[i] <= close[i] and volume_signal[i]:
+            breakthrough_row = i
+            break
 
     if breakthrough_row is None:
         return False
 
-    data_front = data.loc[(data['date'] < breakthrough_row) & (data['ma60'] > 0)]
-    for _close, _ma60 in zip(data_front['close'].values, data_front['ma60'].values):
-        if not (-0.05 < ((_ma60 - _close) / _ma60) < 0.2):
+    for _close, _ma60 in zip(close[start:breakthrough_row], ma60[start:breakthrough_row]):
+        if _ma60 > 0 and not (-0.05 < ((_ma60 - _close) / _ma60) < 0.2):
             return False
 
     return True
@@ -55,3 +55,23 @@ def check_volume(code_name, data, date=None, threshold=60):
         return True
     else:
         return False
+
+
+# 每一天是否满足放量上涨，和逐日调用 check_volume(date=该日) 的结果相同。
+# data 为截止日之前的数据，均线只计算一次，供组合策略按行号查询。
+def check_volume_signal(data, threshold=60):
+    n = len(data.index)
+    signal = np.zeros(n, dtype=bool)
+    if n < threshold + 1:
+        return signal
+    close = data['close'].values
+    open_price = data['open'].values
+    volume = data['volume'].values
+    p_change = data['p_change'].values
+    vol_ma5 = tl.MA(volume, timeperiod=5)
+    vol_ma5[np.isnan(vol_ma5)] = 0.0
+    j = slice(threshold, n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        signal[j] = (~(p_change[j] < 2) & ~(close[j] < open_price[j]) & ~(close[j] * volume[j] < 200000000)
+                     & (volume[j] / vol_ma5[threshold - 1:n - 1] >= 2))
+    return signal
@@ -28,7 +28,8 @@ def check(code_name, data, date=None, threshold=60):
 
     # 允许有一次“洗盘”
     previous_p_change = 100.0
-    previous_open = -1000000.0
+    # 第一天没有前一天，用当天开盘价，两日高开低走的条件不会因为初值成立
+    previous_open = data['open'].values[0]
     for _p_change, _close, _open in zip(data['p_change'].values, data['close'].values, data['open'].values):
         # 单日跌幅超7%；高开低走7%；两日累计跌幅10%；两日高开低走累计10%
         if _p_change < -7 or (_close - _open) / _open * 100 < -7 \
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import numpy as np
+import talib as tl
+import instock.core.hist_store as hst
+import instock.core.hist_panel as hpl
+from instock.core.strategy import enter
+from instock.core.strategy import keep_increasing
+from instock.core.strategy import parking_apron
+from instock.core.strategy import backtrace_ma250
+from instock.core.strategy import breakthrough_platform
+from instock.core.strategy import low_backtrace_increase
+from instock.core.strategy import turtle_trade
+from instock.core.strategy import high_tight_flag
+from instock.core.strategy import climax_limitdown
+from instock.core.strategy import low_atr
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 全部股票一次完成的策略选股，结果和逐只调用各策略函数相同。
+# 每只股票按截止日截取历史、计算一次共用的均线(成交量MA5，收盘MA30/MA60/MA250)，
+# 然后取最后 LENGTH 行右对齐叠成 (股票数, LENGTH) 的面板，左侧不足的补 NaN。
+# 均线在截止日前的全部历史上计算，和原函数一样；TA-Lib 的滑动求和与起点有关，只算尾部会有舍入差异。
+# 各策略在面板上按列做向量运算，逐行判断的条件用按列循环保持原来的先后顺序和比较方式。
+
+LENGTH = 120  # 面板行数，需不少于各策略回看的最大行数
+CHUNK_ROWS = 8192  # 多日期选股时每批的面板行数
+_FIELDS = ('open', 'high', 'low', 'close', 'volume', 'p_change')
+
+
+class ScreenPanel:
+    def __init__(self, keys, lengths, fields):
+        self.keys = keys
+        self.lengths = lengths  # 截止日(含)之前的行数
+        self.fields = fields
+
+    def __getitem__(self, field):
+        return self.fields[field]
+
+    def __len__(self):
+        return len(self.keys)
+
+    # 第 j 列(及之前)的历史行数。
+    def length_at(self, j):
+        return self.lengths - (LENGTH - 1 - j)
+
+
+def _ma(values, period):
+    ma = tl.MA(values, timeperiod=period)
+    ma[np.isnan(ma)] = 0.0
+    return ma
+
+
+# 按截止日截取每只股票，计算共用均线，叠成面板。date 为 None 时用各股票键里的日期。
+def build_panel(stocks, date=None):
+    is_panel = isinstance(stocks, hpl.PanelData)
+    size = len(stocks)
+    names = _FIELDS + ('day', 'vol_ma5', 'ma30', 'ma60', 'ma250')
+    fields = {f: np.full((size, LENGTH), np.nan) for f in names}
+    lengths = np.zeros(size, dtype=np.int64)
+    keys = []
+    end_date = None if date is None else date.strftime("%Y-%m-%d")
+    end_days = {}
+    if is_panel:
+        items = zip(stocks.keys_list, stocks.extents)
+        date_row = stocks.columns.index('date')
+        rows = [stocks.columns.index(f) for f in _FIELDS]
+    else:
+        items = stocks.items()
+    i = 0
+    for key, data in items:
+        _date = key[0] if end_date is None else end_date
+        if is_panel:
+            block = stocks.block_at(*data)
+            day = end_days.get(_date)
+            if day is None:
+                day = end_days[_date] = int(np.datetime64(_date, 'D').astype(np.int64))
+            e = int(np.searchsorted(block[date_row], day, side='right'))
+            columns = [block[r][:e] for r in rows]
+            days = block[date_row][:e]
+        else:
+            if data is None:
+                continue
+            e = int(np.searchsorted(data['date'].values, _date, side='right'))
+            columns = [data[f].values[:e] for f in _FIELDS]
+            days = None
+        if e == 0:
+            continue
+        n = min(e, LENGTH)
+        values = dict(zip(_FIELDS, columns))
+        close = np.ascontiguousarray(values['close'], dtype=np.float64)
+        volume = np.ascontiguousarray(values['volume'], dtype=np.float64)
+        values['vol_ma5'] = _ma(volume, 5)
+        values['ma30'] = _ma(close, 30)
+        values['ma60'] = _ma(close, 60)
+        values['ma250'] = _ma(close, 250)
+        if days is None:
+            days = data['date'].values[e - n:e].astype('datetime64[D]').astype(np.int64)
+            values['day'] = days
+        else:
+            values['day'] = days
+        for f in names:
+            v = values[f]
+            fields[f][i, LENGTH - n:] = v[len(v) - n:]
+        lengths[i] = e
+        keys.append(key)
+        i += 1
+    return ScreenPanel(keys, lengths[:i], {f: v[:i] for f, v in fields.items()})
+
+
+# 放量上涨(enter.check_volume)在第 j 列是否成立。
+def _volume_at(panel, j, threshold=60, ratio=2):
+    close, open_price, volume, p_change, vol_ma5 = (panel['close'][:, j], panel['open'][:, j],
+                                                    panel['volume'][:, j], panel['p_change'][:, j],
+                                                    panel['vol_ma5'][:, j - 1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return ((panel.length_at(j) >= threshold + 1) & ~(p_change < 2) & ~(close < open_price)
+                & ~(close * volume < 200000000) & (volume / vol_ma5 >= ratio))
+
+
+def screen_enter(panel, threshold=60):
+    return _volume_at(panel, LENGTH - 1, threshold)
+
+
+def screen_keep_increasing(panel, threshold=30):
+    ma30 = panel['ma30']
+    s = LENGTH - threshold
+    m0, m1, m2, m3 = ma30[:, s], ma30[:, s + round(threshold / 3)], ma30[:, s + round(threshold * 2 / 3)], ma30[:, -1]
+    return (panel.lengths >= threshold) & (m0 < m1) & (m1 < m2) & (m2 < m3) & (m3 > 1.2 * m0)
+
+
+# 海龟交易法则(turtle_trade.check_enter)在第 j 列是否成立：收盘价为最近 threshold 日最高。
+def _turtle_at(panel, j, threshold=60):
+    close = panel['close'][:, j - threshold + 1:j + 1]
+    max_price = np.maximum(np.fmax.reduce(close, axis=1), 0)
+    return (panel.length_at(j) >= threshold) & (close[:, -1] >= max_price)
+
+
+def screen_turtle_trade(panel, threshold=60):
+    return _turtle_at(panel, LENGTH - 1, threshold)
+
+
+def screen_parking_apron(panel, threshold=15):
+    close, open_price, p_change = panel['close'], panel['open'], panel['p_change']
+    result = np.zeros(len(panel), dtype=bool)
+    # 涨停日之后需要3天整理，窗口最后3天的涨停不会成立。
+    for j in range(LENGTH - threshold, LENGTH - 3):
+        price = close[:, j]
+        hit = (panel.lengths >= threshold) & (p_change[:, j] > 9.5) & _turtle_at(panel, j, threshold)
+        c, o = close[:, j + 1], open_price[:, j + 1]
+        hit &= (c > price) & (o > price) & (0.97 < c / o) & (c / o < 1.03)
+        for k in (j + 2, j + 3):
+            c, o, p = close[:, k], open_price[:, k], p_change[:, k]
+            hit &= (0.97 < c / o) & (c / o < 1.03) & (-5 < p) & (p < 5) & (c > price) & (o > price)
+        result |= hit
+    return result
+
+
+def screen_backtrace_ma250(panel, threshold=60):
+    close, volume, ma250, day = panel['close'], panel['volume'], panel['ma250'], panel['day']
+    size = len(panel)
+    s = LENGTH - threshold
+    rows = np.arange(size)
+    # 区间最高、最低点，和原来一样创新高的那天不参与最低点比较。
+    highest = np.zeros(size)
+    highest_at = np.full(size, -1)
+    lowest = np.full(size, 1000000.0)
+    lowest_at = np.full(size, -1)
+    for j in range(s, LENGTH):
+        c = close[:, j]
+        is_high = c > highest
+        is_low = ~is_high & (c < lowest)
+        highest = np.where(is_high, c, highest)
+        highest_at = np.where(is_high, j, highest_at)
+        lowest = np.where(is_low, c, lowest)
+        lowest_at = np.where(is_low, j, lowest_at)
+    h = np.maximum(highest_at, s)
+    hit = (panel.lengths >= 250) & (highest_at >= 0) & (lowest_at >= 0) & (highest_at > s)
+    hit &= (volume[rows, h] != 0) & (volume[rows, np.maximum(lowest_at, s)] != 0)
+    # 前半段由年线以下向上突破
+    hit &= (close[:, s] < ma250[:, s]) & (close[rows, h - 1] > ma250[rows, h - 1])
+    # 后半段必须在年线以上运行，找出近期低点
+    recent = np.full(size, 1000000.0)
+    recent_at = np.full(size, -1)
+    for j in range(s, LENGTH):
+        after = j >= h
+        c = close[:, j]
+        hit &= ~(after & (c < ma250[:, j]))
+        is_low = after & (c < recent)
+        recent = np.where(is_low, c, recent)
+        recent_at = np.where(is_low, j, recent_at)
+    hit &= recent_at >= 0
+    r = np.maximum(recent_at, s)
+    date_diff = day[rows, r] - day[rows, h]
+    hit &= (10 <= date_diff) & (date_diff <= 50)
+    # 回踩伴随缩量
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hit &= (volume[rows, h] / volume[rows, r] > 2) & (close[rows, r] / close[rows, h] < 0.8)
+    return hit
+
+
+def screen_breakthrough_platform(panel, threshold=60):
+    close, open_price, ma60 = panel['close'], panel['open'], panel['ma60']
+    size = len(panel)
+    s = LENGTH - threshold
+    # 第一次放量突破 MA60 的位置
+    found = np.full(size, -1)
+    for j in range(s, LENGTH):
+        cross = (found < 0) & (open_price[:, j] < ma60[:, j]) & (ma60[:, j] <= close[:, j]) & _volume_at(panel, j, threshold)
+        found = np.where(cross, j, found)
+    hit = (panel.lengths >= threshold) & (found >= 0)
+    # 突破前均线上方运行
+    for j in range(s, LENGTH):
+        m, c = ma60[:, j], close[:, j]
+        front = (j < found) & (m > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = (m - c) / m
+        hit &= ~(front & ~((-0.05 < ratio) & (ratio < 0.2)))
+    return hit
+
+
+def screen_low_backtrace_increase(panel, threshold=60):
+    close, open_price, p_change = panel['close'], panel['open'], panel['p_change']
+    s = LENGTH - threshold
+    hit = (panel.lengths >= threshold) & ~((close[:, -1] - close[:, s]) / close[:, s] < 0.6)
+    previous_p_change = np.full(len(panel), 100.0)
+    previous_open = open_price[:, s].copy()  # 第一天用当天开盘价，同 low_backtrace_increase.check
+    # 单日跌幅超7%；高开低走7%；两日累计跌幅10%；两日高开低走累计10%
+    for j in range(s, LENGTH):
+        p, c, o = p_change[:, j], close[:, j], open_price[:, j]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hit &= ~((p < -7) | ((c - o) / o * 100 < -7) | (previous_p_change + p < -10)
+                     | ((c - previous_open) / previous_open * 100 < -10))
+        previous_p_change = p
+        previous_open = o
+    return hit
+
+
+def screen_high_tight_flag(panel, istop, threshold=60):
+    low, high, p_change = panel['low'][:, -24:-10], panel['high'][:, -24:-10], panel['p_change'][:, -24:-10]
+    hit = istop & (panel.lengths >= threshold)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hit &= ~(high[:, -1] / low.min(axis=1) < 1.9)
+    # 连续两天涨幅大于等于10%
+    hit &= ((p_change[:, 1:] >= 9.5) & (p_change[:, :-1] >= 9.5)).any(axis=1)
+    return hit
+
+
+def screen_climax_limitdown(panel, threshold=60):
+    close, volume = panel['close'][:, -1], panel['volume'][:, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return ((panel.lengths >= threshold + 1) & ~(panel['p_change'][:, -1] > -9.5)
+                & ~(close * volume < 200000000) & (volume / panel['vol_ma5'][:, -2] >= 4))
+
+
+def screen_low_atr(panel, ma_long=250, threshold=10):
+    close, p_change = panel['close'], panel['p_change']
+    size = len(panel)
+    total_change = np.zeros(size)
+    highest = np.zeros(size)
+    lowest = np.full(size, 1000000.0)
+    for j in range(LENGTH - threshold, LENGTH):
+        p, c = p_change[:, j], close[:, j]
+        total_change = np.where((p > 0) | (p < 0), total_change + np.abs(p), total_change)
+        is_high = c > highest
+        lowest = np.where(~is_high & (c < lowest), c, lowest)
+        highest = np.where(is_high, c, highest)
+    atr = total_change / threshold
+    return (panel.lengths >= ma_long) & ~(atr > 10) & ((highest - lowest) / lowest > 1.1)
+
+
+# 策略函数 -> 面板选股函数
+SCREENS = {
+    enter.check_volume: screen_enter,
+    keep_increasing.check: screen_keep_increasing,
+    parking_apron.check: screen_parking_apron,
+    backtrace_ma250.check: screen_backtrace_ma250,
+    breakthrough_platform.check: screen_breakthrough_platform,
+    low_backtrace_increase.check: screen_low_backtrace_increase,
+    turtle_trade.check_enter: screen_turtle_trade,
+    high_tight_flag.check_high_tight: screen_high_tight_flag,
+    climax_limitdown.check: screen_climax_limitdown,
+    low_atr.check_low_increase: screen_low_atr,
+}
+
+
+# 对 strategies(tablestructure 里的策略定义)一次完成选股，返回 {表名: 选中的股票键列表}。
+# 没有面板实现的策略不在结果里。tops 为龙虎榜机构买入的代码集合，None 表示没有数据。
+def screen(stocks, strategies, date=None, tops=None):
+    panel = build_panel(stocks, date)
+    istop = np.array([k[1] in tops for k in panel.keys], dtype=bool) if tops else None
+    results = {}
+    _apply(panel, strategies, istop, results)
+    return results
+
+
+# 在面板上执行各策略，选中的键追加到 results。
+def _apply(panel, strategies, istop, results):
+    for strategy in strategies:
+        fun = SCREENS.get(strategy['func'])
+        if fun is None:
+            continue
+        try:
+            if fun is screen_high_tight_flag:
+                mask = fun(panel, np.zeros(len(panel), dtype=bool) if istop is None else istop)
+            else:
+                mask = fun(panel)
+            results.setdefault(strategy['name'], []).extend(k for k, m in zip(panel.keys, mask) if m)
+        except Exception as e:
+            logging.error(f"screen.screen处理异常：{strategy['name']}策略{e}")
+
+
+# 多个日期一次完成选股，结果同逐日调用 screen。dates 为升序的日期，tops 为 {日期字符串: 代码集合}。
+# 每只股票的均线只在截止最后一天的历史上计算一次(均线只依赖之前的数据，和逐日截取的结果相同)，
+# 每个日期取截止那天的 LENGTH 行作为面板的一行，按 CHUNK_ROWS 行分批执行各策略。
+# 返回 {表名: (日期, 代码, 名称) 键列表}。
+def screen_range(stocks, strategies, dates, tops=None):
+    is_panel = isinstance(stocks, hpl.PanelData)
+    names = _FIELDS + ('day', 'vol_ma5', 'ma30', 'ma60', 'ma250')
+    date_strs = [d.strftime("%Y-%m-%d") for d in dates]
+    tops = tops or {}
+    if is_panel:
+        items = zip(stocks.keys_list, stocks.extents)
+        date_row = stocks.columns.index('date')
+        rows = [stocks.columns.index(f) for f in _FIELDS]
+        requested = hst.to_days(date_strs)
+    else:
+        items = stocks.items()
+        requested = np.array(date_strs, dtype=object)
+    results = {}
+    pad = np.full(LENGTH, np.nan)
+    parts = {f: [] for f in names}
+    lengths = []
+    keys = []
+
+    def flush():
+        if not keys:
+            return
+        panel = ScreenPanel(list(keys), np.concatenate(lengths), {f: np.concatenate(parts[f]) for f in names})
+        istop = np.array([k[1] in tops.get(k[0], ()) for k in panel.keys], dtype=bool) if tops else None
+        _apply(panel, strategies, istop, results)
+        for f in names:
+            parts[f].clear()
+        lengths.clear()
+        keys.clear()
+
+    for key, data in items:
+        try:
+            if is_panel:
+                block = stocks.block_at(*data)
+                ends = np.searchsorted(block[date_row], requested, side='right')
+                columns = [block[r] for r in rows]
+                days = block[date_row]
+            else:
+                if data is None:
+                    continue
+                ends = np.searchsorted(data['date'].values, requested, side='right')
+                columns = [data[f].values for f in _FIELDS]
+                days = None
+            has = ends > 0
+            if not has.any():
+                continue
+            ends = ends[has]
+            e = int(ends[-1])
+            s = max(0, int(ends[0]) - LENGTH)
+            values = {f: v[s:e] for f, v in zip(_FIELDS, columns)}
+            close = np.ascontiguousarray(columns[_FIELDS.index('close')][:e], dtype=np.float64)
+            volume = np.ascontiguousarray(columns[_FIELDS.index('volume')][:e], dtype=np.float64)
+            values['vol_ma5'] = _ma(volume, 5)[s:]
+            values['ma30'] = _ma(close, 30)[s:]
+            values['ma60'] = _ma(close, 60)[s:]
+            values['ma250'] = _ma(close, 250)[s:]
+            if days is None:
+                values['day'] = data['date'].values[s:e].astype('datetime64[D]').astype(np.int64)
+            else:
+                values['day'] = days[s:e]
+            # 左侧补 LENGTH 个 NaN，第 i 个滑动窗口以第 s+i-1 行结尾。
+            at = ends - s
+            for f in names:
+                window = np.lib.stride_tricks.sliding_window_view(np.concatenate((pad, values[f])), LENGTH)
+                parts[f].append(window[at])
+            lengths.append(ends)
+            keys.extend((date_strs[i], key[1], key[2]) for i in np.flatnonzero(has))
+        except Exception as e:
+            logging.error(f"screen.screen_range处理异常：{key[1]}代码{e}")
+        if len(keys) >= CHUNK_ROWS:
+            flush()
+    flush()
+    return results
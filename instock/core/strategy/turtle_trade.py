@@ -1,6 +1,7 @@
 #!/usr/local/bin/python
 # -*- coding: utf-8 -*-
 
+import numpy as np
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
@@ -35,3 +36,15 @@ def check_enter(code_name, data, date=None, threshold=60):
         return True
 
     return False
+
+
+# 每一天是否满足买入条件，和逐日调用 check_enter(date=该日) 的结果相同，供组合策略按行号查询。
+def check_enter_signal(data, threshold=60):
+    n = len(data.index)
+    signal = np.zeros(n, dtype=bool)
+    if n < threshold:
+        return signal
+    close = data['close'].values
+    max_price = np.maximum(np.fmax.reduce(np.lib.stride_tricks.sliding_window_view(close, threshold), axis=1), 0)
+    signal[threshold - 1:] = close[threshold - 1:] >= max_price
+    return signal
@@ -1000,6 +1000,30 @@ def get_field_cns(cols):
     return data
 
 
+# 每日作业写入的表，init_job 启动时按此建表、维护分区。
+# primary_keys 主键；partition 按月分区的日期字段，每天几千行的表按月分区；indexs 附加索引。
+# 回测表按 `rate_100` IS NULL AND `date` < 今天 查询待回测的信号，用 (rate_100, date, code, name) 覆盖索引。
+_BACKTEST_INDEXS = {'_BACKTEST': ('rate_%s' % RATE_FIELDS_COUNT, 'date', 'code', 'name')}
+TABLE_SCHEMAS = [{'table': TABLE_CN_STOCK_SPOT, 'primary_keys': ('date', 'code'), 'partition': 'date'},
+                 {'table': TABLE_CN_ETF_SPOT, 'primary_keys': ('date', 'code'), 'partition': 'date'},
+                 {'table': TABLE_CN_STOCK_SPOT_BUY, 'primary_keys': ('date', 'code')},
+                 {'table': TABLE_CN_STOCK_FUND_FLOW, 'primary_keys': ('date', 'code'), 'partition': 'date'},
+                 {'table': TABLE_CN_STOCK_FUND_FLOW_INDUSTRY, 'primary_keys': ('date', 'name')},
+                 {'table': TABLE_CN_STOCK_FUND_FLOW_CONCEPT, 'primary_keys': ('date', 'name')},
+                 {'table': TABLE_CN_STOCK_BONUS, 'primary_keys': ('date', 'code')},
+                 {'table': TABLE_CN_STOCK_TOP, 'primary_keys': ('date', 'code')},
+                 {'table': TABLE_CN_STOCK_BLOCKTRADE, 'primary_keys': ('date', 'code')},
+                 {'table': TABLE_CN_STOCK_SELECTION, 'primary_keys': ('date', 'code'), 'partition': 'date'},
+                 {'table': TABLE_CN_STOCK_INDICATORS, 'primary_keys': ('date', 'code'), 'partition': 'date'},
+                 {'table': TABLE_CN_STOCK_INDICATORS_BUY, 'primary_keys': ('date', 'code'),
+                  'indexs': _BACKTEST_INDEXS},
+                 {'table': TABLE_CN_STOCK_INDICATORS_SELL, 'primary_keys': ('date', 'code'),
+                  'indexs': _BACKTEST_INDEXS},
+                 {'table': TABLE_CN_STOCK_KLINE_PATTERN, 'primary_keys': ('date', 'code'), 'partition': 'date'}]
+TABLE_SCHEMAS.extend({'table': table, 'primary_keys': ('date', 'code'), 'partition': 'date',
+                      'indexs': _BACKTEST_INDEXS} for table in TABLE_CN_STOCK_STRATEGIES)
+
+
 def get_field_types(cols):
     data = {}
     for k in cols:
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import logging
+import datetime
+import numpy as np
+import instock.core.crawling.trade_date_hist as tdh
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 交易日历。
+# 交易日保存为升序的 int32 天数数组(距1970-01-01)，前后交易日用二分查找，是否交易日用位图 O(1) 判断。
+# 日历文件缓存在本地，过期(超过最后一个交易日或文件超过 EXPIRE_DAYS 天)才重新下载，
+# 只有下载时才会加载 py_mini_racer 解码。
+
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+calendar_cache_path = os.path.join(cpath_current, 'cache', 'trade_calendar')
+calendar_cache_file = os.path.join(calendar_cache_path, 'trade_date.npy')
+EXPIRE_DAYS = 30
+
+_EPOCH = datetime.date(1970, 1, 1)
+
+
+def _to_day(date):
+    if isinstance(date, datetime.datetime):
+        date = date.date()
+    return (date - _EPOCH).days
+
+
+def _to_date(day):
+    return _EPOCH + datetime.timedelta(days=int(day))
+
+
+def _today():
+    return _to_day(datetime.date.today())
+
+
+class TradeCalendar:
+    def __init__(self, days):
+        self.days = np.ascontiguousarray(days, dtype=np.int32)
+        self.first = int(self.days[0])
+        self.last = int(self.days[-1])
+        self.bitmap = np.zeros(self.last - self.first + 1, dtype=np.bool_)
+        self.bitmap[self.days - self.first] = True
+
+    def __len__(self):
+        return len(self.days)
+
+    def expired(self, file_time=None):
+        if self.last < _today():
+            return True
+        return file_time is not None and (datetime.datetime.now().timestamp() - file_time) > EXPIRE_DAYS * 86400
+
+    def is_trade_date(self, date):
+        day = _to_day(date)
+        if day < self.first or day > self.last:
+            return False
+        return bool(self.bitmap[day - self.first])
+
+    # 之前第n个交易日(不含当天)，超出日历范围返回None。
+    def previous(self, date, n=1):
+        i = int(np.searchsorted(self.days, _to_day(date), side='left')) - n
+        return _to_date(self.days[i]) if 0 <= i < len(self.days) else None
+
+    # 之后第n个交易日(不含当天)，超出日历范围返回None。
+    def next(self, date, n=1):
+        i = int(np.searchsorted(self.days, _to_day(date), side='right')) + n - 1
+        return _to_date(self.days[i]) if 0 <= i < len(self.days) else None
+
+    # 日期集合，兼容原来 set 形式的交易日历。
+    def to_set(self):
+        return set(_to_date(d) for d in self.days)
+
+    def save(self, file=calendar_cache_file):
+        if not os.path.exists(os.path.dirname(file)):
+            os.makedirs(os.path.dirname(file))
+        tmp_file = file + '.tmp.npy'
+        np.save(tmp_file, self.days)
+        os.replace(tmp_file, file)
+
+    @classmethod
+    def from_dates(cls, dates):
+        days = np.unique(np.array([_to_day(d) for d in dates], dtype=np.int32))
+        return cls(days)
+
+
+def _download():
+    data = tdh.tool_trade_date_hist_sina()
+    if data is None or len(data.index) == 0:
+        return None
+    return TradeCalendar.from_dates(data['trade_date'].values.tolist())
+
+
+# 读取本地日历，过期时下载更新，下载失败继续用本地的。
+def load_calendar(file=calendar_cache_file):
+    calendar = None
+    file_time = None
+    if os.path.isfile(file):
+        try:
+            calendar = TradeCalendar(np.load(file))
+            file_time = os.path.getmtime(file)
+        except Exception as e:
+            logging.error(f"trade_calendar.load_calendar读取异常：{e}")
+    if calendar is None or calendar.expired(file_time):
+        try:
+            new_calendar = _download()
+            if new_calendar is not None:
+                new_calendar.save(file)
+                calendar = new_calendar
+        except Exception as e:
+            logging.error(f"trade_calendar.load_calendar下载异常：{e}")
+    return calendar
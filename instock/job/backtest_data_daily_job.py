@@ -4,6 +4,7 @@
 
 import logging
 import concurrent.futures
+import numpy as np
 import pandas as pd
 import os.path
 import sys
@@ -22,6 +23,7 @@ __date__ = '2023/3/10 '
 
 
 # 股票策略回归测试。
+# 先读出各表待回测的信号，合在一起一次算出收益率矩阵，再分别更新各表。
 def prepare():
     tables = [tbs.TABLE_CN_STOCK_INDICATORS_BUY, tbs.TABLE_CN_STOCK_INDICATORS_SELL]
     tables.extend(tbs.TABLE_CN_STOCK_STRATEGIES)
@@ -38,60 +40,65 @@ def prepare():
         break
     # 回归测试表
     with concurrent.futures.ThreadPoolExecutor() as executor:
-        for table in tables:
-            executor.submit(process, table, stocks_data, date, backtest_column)
+        pending = dict(zip([table['name'] for table in tables], executor.map(load, tables)))
+    stocks = []
+    for table in tables:
+        stocks.extend(pending[table['name']])
+    results = run_check(stocks, stocks_data, date, backtest_column)
+    if results is None:
+        return
+    valid, data_new = results
+    tables_of = np.repeat(np.arange(len(tables)), [len(pending[table['name']]) for table in tables])[valid]
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        for i, table in enumerate(tables):
+            rows = tables_of == i
+            if rows.any():
+                executor.submit(process, table, data_new[rows])
 
 
-def process(table, data_all, date, backtest_column):
+# 读出表里还没有回测结果的信号 (日期, 代码, 名称)。
+def load(table):
     table_name = table['name']
     if not mdb.checkTableIsExist(table_name):
-        return
+        return []
 
     column_tail = tuple(table['columns'])[-1]
     now_date = datetime.datetime.now().date()
-    sql = f"SELECT * FROM `{table_name}` WHERE `date` < '{now_date}' AND `{column_tail}` is NULL"
+    sql = f"SELECT `date`,`code`,`name` FROM `{table_name}` WHERE `date` < '{now_date}' AND `{column_tail}` is NULL"
     try:
         data = pd.read_sql(sql=sql, con=mdb.engine())
         if data is None or len(data.index) == 0:
-            return
+            return []
 
         subset = data[list(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])]
         # subset['date'] = subset['date'].values.astype('str')
         subset = subset.astype({'date': 'string'})
-        stocks = [tuple(x) for x in subset.values]
-
-        results = run_check(stocks, data_all, date, backtest_column)
-        if results is None:
-            return
+        return [tuple(x) for x in subset.values]
+    except Exception as e:
+        logging.error(f"backtest_data_daily_job.load处理异常：{table}表{e}")
+    return []
 
-        data_new = pd.DataFrame(results.values())
-        mdb.update_db_from_df(data_new, table_name, ('date', 'code'))
 
+def process(table, data_new):
+    try:
+        mdb.upsert_df(data_new, table['name'], ('date', 'code'))
     except Exception as e:
         logging.error(f"backtest_data_daily_job.process处理异常：{table}表{e}")
 
 
-def run_check(stocks, data_all, date, backtest_column, workers=40):
-    data = {}
+# 返回 有结果的信号下标 和 对应的回测数据 DataFrame(日期、代码、各日收益率)。
+def run_check(stocks, data_all, date, backtest_column):
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            future_to_data = {executor.submit(rate.get_rates, stock,
-                                              data_all.get((date, stock[1], stock[2])), backtest_column,
-                                              len(backtest_column) - 1): stock for stock in stocks}
-            for future in concurrent.futures.as_completed(future_to_data):
-                stock = future_to_data[future]
-                try:
-                    _data_ = future.result()
-                    if _data_ is not None:
-                        data[stock] = _data_
-                except Exception as e:
-                    logging.error(f"backtest_data_daily_job.run_check处理异常：{stock[1]}代码{e}")
+        valid, rates = rate.get_rates_matrix(stocks, data_all, date, threshold=len(backtest_column) - 1)
     except Exception as e:
         logging.error(f"backtest_data_daily_job.run_check处理异常：{e}")
-    if not data:
         return None
-    else:
-        return data
+    if len(valid) == 0:
+        return None
+    data = pd.DataFrame(rates, columns=backtest_column[2:2 + rates.shape[1]])
+    data.insert(0, 'code', [stocks[i][1] for i in valid])
+    data.insert(0, 'date', [stocks[i][0] for i in valid])
+    return valid, data.reindex(columns=backtest_column)
 
 
 def main():
@@ -3,7 +3,6 @@
 
 
 import logging
-import concurrent.futures
 import pandas as pd
 import os.path
 import sys
@@ -14,7 +13,7 @@ sys.path.append(cpath)
 import instock.lib.run_template as runt
 import instock.core.tablestructure as tbs
 import instock.lib.database as mdb
-import instock.core.indicator.calculate_indicator as idr
+import instock.core.indicator.panel_indicator as pidr
 from instock.core.singleton_stock import stock_hist_data
 
 __author__ = 'myh '
@@ -58,23 +57,48 @@ def prepare(date):
         logging.error(f"indicators_data_daily_job.prepare处理异常：{e}")
 
 
-def run_check(stocks, date=None, workers=40):
+# 多个日期一次完成：各日期截止那天的窗口堆成面板批量计算，结果同逐日计算，一次写入。
+# 股票列表是 dates[-1] 的 stock_hist_data，每个日期都用这一个列表：fetch_stocks 取的是运行时的实时行情，
+# 和日期无关，逐日运行时每天拿到的也是同一个列表，所以结果和逐日计算一致(都不含已退市的股票)。
+def prepare_range(dates):
+    try:
+        stocks_data = stock_hist_data(date=dates[-1]).get_data()
+        if stocks_data is None:
+            return
+        columns = list(tbs.STOCK_STATS_DATA['columns'])
+        columns.insert(0, 'code')
+        columns.insert(0, 'date')
+        data = pidr.get_indicators_range(stocks_data, columns, dates)
+        if data is None or len(data.index) == 0:
+            return
+
+        table_name = tbs.TABLE_CN_STOCK_INDICATORS['name']
+        # 删除老数据。
+        if mdb.checkTableIsExist(table_name):
+            _dates = [d.strftime("%Y-%m-%d") for d in dates]
+            del_sql = f"DELETE FROM `{table_name}` where `date` in ({','.join(['%s'] * len(_dates))})"
+            mdb.executeSql(del_sql, _dates)
+            cols_type = None
+        else:
+            cols_type = tbs.get_field_types(tbs.TABLE_CN_STOCK_INDICATORS['columns'])
+
+        names = {k[1]: k[2] for k in stocks_data.keys()}
+        data.insert(2, 'name', data['code'].map(names))
+        mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
+
+    except Exception as e:
+        logging.error(f"indicators_data_daily_job.prepare_range处理异常：{e}")
+
+
+# 全部股票堆成二维数组批量计算，个别数据异常的股票逐只计算。
+def run_check(stocks, date=None):
     data = {}
     columns = list(tbs.STOCK_STATS_DATA['columns'])
     columns.insert(0, 'code')
     columns.insert(0, 'date')
     data_column = columns
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            future_to_data = {executor.submit(idr.get_indicator, k, stocks[k], data_column, date=date): k for k in stocks}
-            for future in concurrent.futures.as_completed(future_to_data):
-                stock = future_to_data[future]
-                try:
-                    _data_ = future.result()
-                    if _data_ is not None:
-                        data[stock] = _data_
-                except Exception as e:
-                    logging.error(f"indicators_data_daily_job.run_check处理异常：{stock[1]}代码{e}")
+        data = pidr.get_indicators_last(stocks, data_column, date=date)
     except Exception as e:
         logging.error(f"indicators_data_daily_job.run_check处理异常：{e}")
     if not data:
@@ -155,7 +179,7 @@ def guess_sell(date):
 
 def main():
     # 使用方法传递。
-    runt.run_with_args(prepare)
+    runt.run_with_args(prepare, range_fun=prepare_range)
     # 二次筛选数据。直接计算买卖股票数据。
     runt.run_with_args(guess_buy)
     runt.run_with_args(guess_sell)
@@ -11,6 +11,7 @@ cpath_current = os.path.dirname(os.path.dirname(__file__))
 cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
 sys.path.append(cpath)
 import instock.lib.database as mdb
+import instock.core.tablestructure as tbs
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
@@ -43,6 +44,14 @@ def create_new_base_table():
             db.execute(create_table_sql)
 
 
+# 按表定义建好每日作业的表、主键和索引，维护按月分区，之后各作业写入时不再查询表结构。
+def create_tables():
+    for schema in tbs.TABLE_SCHEMAS:
+        table = schema['table']
+        mdb.create_table(table['name'], tbs.get_field_types(table['columns']), schema['primary_keys'],
+                         indexs=schema.get('indexs'), partition=schema.get('partition'))
+
+
 def check_database():
     with pymysql.connect(**mdb.MYSQL_CONN_DBAPI) as conn:
         with conn.cursor() as db:
@@ -58,6 +67,10 @@ def main():
         # 检查数据库失败，
         create_new_database()
     # 执行数据初始化。
+    try:
+        create_tables()
+    except Exception as e:
+        logging.error(f"init_job.create_tables处理异常：{e}")
 
 
 # main函数入口
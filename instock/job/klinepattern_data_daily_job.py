@@ -3,7 +3,7 @@
 
 
 import logging
-import concurrent.futures
+import numpy as np
 import pandas as pd
 import os.path
 import sys
@@ -39,13 +39,10 @@ def prepare(date):
         else:
             cols_type = tbs.get_field_types(tbs.TABLE_CN_STOCK_KLINE_PATTERN['columns'])
 
-        dataKey = pd.DataFrame(results.keys())
-        _columns = tuple(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])
-        dataKey.columns = _columns
-
-        dataVal = pd.DataFrame(results.values())
-
-        data = pd.merge(dataKey, dataVal, on=['code'], how='left')
+        keys, values = results
+        data = pd.DataFrame(keys, columns=list(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns']))
+        data = pd.concat([data, pd.DataFrame(values.astype(np.int16) * 100,
+                                             columns=list(tbs.STOCK_KLINE_PATTERN_DATA['columns']))], axis=1)
         # 单例，时间段循环必须改时间
         date_str = date.strftime("%Y-%m-%d")
         if date.strftime("%Y-%m-%d") != data.iloc[0]['date']:
@@ -56,32 +53,52 @@ def prepare(date):
         logging.error(f"klinepattern_data_daily_job.prepare处理异常：{e}")
 
 
-def run_check(stocks, date=None, workers=40):
-    data = {}
-    columns = tbs.STOCK_KLINE_PATTERN_DATA['columns']
-    data_column = columns
+# 多个日期一次完成：每只股票每个形态只计算一次，取出各日期的结果，一次写入。
+# 各日期的股票列表都是 dates[-1] 的 stock_hist_data，与逐日运行相同(fetch_stocks 不区分日期，取运行时的实时行情)。
+def prepare_range(dates):
+    try:
+        stocks_data = stock_hist_data(date=dates[-1]).get_data()
+        if stocks_data is None:
+            return
+        keys, values = kpr.scan_patterns_range(stocks_data, tbs.STOCK_KLINE_PATTERN_DATA['columns'], dates)
+        if not keys:
+            return
+
+        table_name = tbs.TABLE_CN_STOCK_KLINE_PATTERN['name']
+        # 删除老数据。
+        if mdb.checkTableIsExist(table_name):
+            _dates = [d.strftime("%Y-%m-%d") for d in dates]
+            del_sql = f"DELETE FROM `{table_name}` where `date` in ({','.join(['%s'] * len(_dates))})"
+            mdb.executeSql(del_sql, _dates)
+            cols_type = None
+        else:
+            cols_type = tbs.get_field_types(tbs.TABLE_CN_STOCK_KLINE_PATTERN['columns'])
+
+        data = pd.DataFrame(keys, columns=list(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns']))
+        data = pd.concat([data, pd.DataFrame(values.astype(np.int16) * 100,
+                                             columns=list(tbs.STOCK_KLINE_PATTERN_DATA['columns']))], axis=1)
+        mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
+
+    except Exception as e:
+        logging.error(f"klinepattern_data_daily_job.prepare_range处理异常：{e}")
+
+
+# 返回 有形态的股票键 和 (股票数, 形态数) 的 int8 矩阵(形态结果除以100)。
+def run_check(stocks, date=None):
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            future_to_data = {executor.submit(kpr.get_pattern_recognition, k, stocks[k], data_column, date=date): k for k in stocks}
-            for future in concurrent.futures.as_completed(future_to_data):
-                stock = future_to_data[future]
-                try:
-                    _data_ = future.result()
-                    if _data_ is not None:
-                        data[stock] = _data_
-                except Exception as e:
-                    logging.error(f"klinepattern_data_daily_job.run_check处理异常：{stock[1]}代码{e}")
+        keys, values = kpr.scan_patterns(stocks, tbs.STOCK_KLINE_PATTERN_DATA['columns'], date=date)
     except Exception as e:
         logging.error(f"klinepattern_data_daily_job.run_check处理异常：{e}")
-    if not data:
+        return None
+    if not keys:
         return None
     else:
-        return data
+        return keys, values
 
 
 def main():
     # 使用方法传递。
-    runt.run_with_args(prepare)
+    runt.run_with_args(prepare, range_fun=prepare_range)
 
 
 # main函数入口
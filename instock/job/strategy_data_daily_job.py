@@ -15,19 +15,23 @@ import instock.core.tablestructure as tbs
 import instock.lib.database as mdb
 from instock.core.singleton_stock import stock_hist_data
 from instock.core.stockfetch import fetch_stock_top_entity_data
+import instock.core.strategy.screen as scr
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
 
 
-def prepare(date, strategy):
+# screened 为面板选股的结果 {表名: 股票键列表}，没有的策略逐只计算。
+def prepare(date, strategy, screened=None):
     try:
-        stocks_data = stock_hist_data(date=date).get_data()
-        if stocks_data is None:
-            return
         table_name = strategy['name']
-        strategy_func = strategy['func']
-        results = run_check(strategy_func, table_name, stocks_data, date)
+        if screened is not None and table_name in screened:
+            results = screened[table_name] or None
+        else:
+            stocks_data = stock_hist_data(date=date).get_data()
+            if stocks_data is None:
+                return
+            results = run_check(strategy['func'], table_name, stocks_data, date)
         if results is None:
             return
 
@@ -82,11 +86,76 @@ def run_check(strategy_fun, table_name, stocks, date, workers=40):
         return data
 
 
-def main():
-    # 使用方法传递。
+# 全部策略一次完成选股，再分别写入各策略表。
+def prepare_all(date):
+    stocks_data = stock_hist_data(date=date).get_data()
+    if stocks_data is None:
+        return
+    screened = None
+    try:
+        strategies = tbs.TABLE_CN_STOCK_STRATEGIES
+        tops = None
+        if any(s['func'].__name__ == 'check_high_tight' for s in strategies):
+            tops = fetch_stock_top_entity_data(date)
+        screened = scr.screen(stocks_data, strategies, date=date, tops=tops)
+    except Exception as e:
+        logging.error(f"strategy_data_daily_job.prepare_all处理异常：{e}")
     with concurrent.futures.ThreadPoolExecutor() as executor:
         for strategy in tbs.TABLE_CN_STOCK_STRATEGIES:
-            executor.submit(runt.run_with_args, prepare, strategy)
+            executor.submit(prepare, date, strategy, screened)
+
+
+# 多个日期一次完成选股，每个策略表删除这些日期的老数据后一次写入。
+# 各日期的股票列表都是 dates[-1] 的 stock_hist_data，与逐日运行相同(fetch_stocks 不区分日期，取运行时的实时行情)。
+def prepare_all_range(dates):
+    stocks_data = stock_hist_data(date=dates[-1]).get_data()
+    if stocks_data is None:
+        return
+    strategies = tbs.TABLE_CN_STOCK_STRATEGIES
+    try:
+        tops = None
+        if any(s['func'].__name__ == 'check_high_tight' for s in strategies):
+            tops = {}
+            for date in dates:
+                stock_tops = fetch_stock_top_entity_data(date)
+                if stock_tops is not None:
+                    tops[date.strftime("%Y-%m-%d")] = stock_tops
+        screened = scr.screen_range(stocks_data, strategies, dates, tops=tops)
+    except Exception as e:
+        logging.error(f"strategy_data_daily_job.prepare_all_range处理异常：{e}")
+        for date in dates:
+            prepare_all(date)
+        return
+    _dates = [d.strftime("%Y-%m-%d") for d in dates]
+    for strategy in strategies:
+        table_name = strategy['name']
+        if table_name not in screened:
+            for date in dates:
+                prepare(date, strategy)
+            continue
+        try:
+            results = screened[table_name]
+            # 删除老数据。
+            if mdb.checkTableIsExist(table_name):
+                del_sql = f"DELETE FROM `{table_name}` where `date` in ({','.join(['%s'] * len(_dates))})"
+                mdb.executeSql(del_sql, _dates)
+                cols_type = None
+            else:
+                cols_type = tbs.get_field_types(tbs.TABLE_CN_STOCK_STRATEGIES[0]['columns'])
+            if not results:
+                continue
+
+            data = pd.DataFrame(results, columns=list(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns']))
+            _columns_backtest = tuple(tbs.TABLE_CN_STOCK_BACKTEST_DATA['columns'])
+            data = pd.concat([data, pd.DataFrame(columns=_columns_backtest)])
+            mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
+        except Exception as e:
+            logging.error(f"strategy_data_daily_job.prepare_all_range处理异常：{strategy}策略{e}")
+
+
+def main():
+    # 使用方法传递。
+    runt.run_with_args(prepare_all, range_fun=prepare_all_range)
 
 
 # main函数入口
@@ -3,10 +3,15 @@
 
 import logging
 import os
-import pymysql
+import datetime
+import time
+import threading
+import contextlib
 from sqlalchemy import create_engine
 from sqlalchemy.types import NVARCHAR
 from sqlalchemy import inspect
+from sqlalchemy import MetaData, Table, Column, Index
+import instock.lib.table_version as tvr
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
@@ -43,6 +48,37 @@ _db_port = os.environ.get('db_port')
 if _db_port is not None:
     db_port = int(_db_port)
 
+db_batch_size = 5000  # 批量写入每批行数
+db_stmt_length = 4000000  # 批量写入每条语句的最大字节数，需小于数据库的 max_allowed_packet
+_db_batch_size = os.environ.get('db_batch_size')
+if _db_batch_size is not None:
+    db_batch_size = int(_db_batch_size)
+_db_stmt_length = os.environ.get('db_stmt_length')
+if _db_stmt_length is not None:
+    db_stmt_length = int(_db_stmt_length)
+
+db_partition_ahead = 3  # 按月分区的表预先建好之后几个月的分区
+db_partition_retention = 0  # 按月分区的表保留最近几个月的数据，0 为全部保留
+_db_partition_ahead = os.environ.get('db_partition_ahead')
+if _db_partition_ahead is not None:
+    db_partition_ahead = int(_db_partition_ahead)
+_db_partition_retention = os.environ.get('db_partition_retention')
+if _db_partition_retention is not None:
+    db_partition_retention = int(_db_partition_retention)
+
+db_pool_size = 10  # 连接池常驻连接数
+db_max_overflow = 20  # 连接池可临时增加的连接数
+db_pool_recycle = 3600  # 连接最长使用秒数，需小于数据库的 wait_timeout
+_db_pool_size = os.environ.get('db_pool_size')
+if _db_pool_size is not None:
+    db_pool_size = int(_db_pool_size)
+_db_max_overflow = os.environ.get('db_max_overflow')
+if _db_max_overflow is not None:
+    db_max_overflow = int(_db_max_overflow)
+_db_pool_recycle = os.environ.get('db_pool_recycle')
+if _db_pool_recycle is not None:
+    db_pool_recycle = int(_db_pool_recycle)
+
 MYSQL_CONN_URL = "mysql+pymysql://%s:%s@%s:%s/%s?charset=%s" % (
     db_user, db_password, db_host, db_port, db_database, db_charset)
 logging.info(f"数据库链接信息：{ MYSQL_CONN_URL}")
@@ -54,23 +90,56 @@ MYSQL_CONN_TORNDB = {'host': f'{db_host}:{str(db_port)}', 'user': db_user, 'pass
                      'database': db_database, 'charset': db_charset, 'max_idle_time': 3600, 'connect_timeout': 1000}
 
 
+# 进程内按数据库各共用一个带连接池的 engine：连接数有上限，取用前 ping 检查，超过 db_pool_recycle 秒的连接重建。
+# 连接为自动提交，需要事务时显式 begin/commit。
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _get_engine(database=None):
+    database = database or db_database
+    with _engines_lock:
+        _engine = _engines.get(database)
+        if _engine is None:
+            _engine = create_engine(MYSQL_CONN_URL.replace(f'/{db_database}?', f'/{database}?'),
+                                    pool_size=db_pool_size, max_overflow=db_max_overflow, pool_pre_ping=True,
+                                    pool_recycle=db_pool_recycle, isolation_level='AUTOCOMMIT')
+            _engines[database] = _engine
+        return _engine
+
+
+# fork 出的子进程不能使用父进程池里的连接。
+def _reset_engines():
+    for _engine in _engines.values():
+        _engine.dispose(close=False)
+    _engines.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_engines)
+
+
 # 通过数据库链接 engine
 def engine():
-    return create_engine(MYSQL_CONN_URL)
+    return _get_engine()
 
 
 def engine_to_db(to_db):
-    _engine = create_engine(MYSQL_CONN_URL.replace(f'/{db_database}?', f'/{to_db}?'))
-    return _engine
+    return _get_engine(to_db)
 
 
-# DB Api -数据库连接对象connection
-def get_connection():
+# DB Api -数据库连接对象connection，从连接池取出，with 结束时归还。database 为 None 时连接默认数据库
+@contextlib.contextmanager
+def get_connection(database=None):
     try:
-        return pymysql.connect(**MYSQL_CONN_DBAPI)
+        conn = _get_engine(database).raw_connection()
     except Exception as e:
-        logging.error(f"database.conn_not_cursor处理异常：{MYSQL_CONN_DBAPI}{e}")
-    return None
+        logging.error(f"database.get_connection处理异常：{db_host}:{db_port}/{database or db_database}{e}")
+        raise
+    try:
+        yield conn
+    finally:
+        conn.close()
 
 
 # 定义通用方法函数，插入数据库表，并创建数据库主键，保证重跑数据的时候索引唯一。
@@ -86,32 +155,40 @@ def insert_other_db_from_df(to_db, data, table_name, cols_type, write_index, pri
         engine_mysql = engine()
     else:
         engine_mysql = engine_to_db(to_db)
-    # 使用 http://docs.sqlalchemy.org/en/latest/core/reflection.html
-    # 使用检查检查数据库表是否有主键。
-    ipt = inspect(engine_mysql)
     col_name_list = data.columns.tolist()
     # 如果有索引，把索引增加到varchar上面。
     if write_index:
         # 插入到第一个位置：
         col_name_list.insert(0, data.index.name)
+    # 已知存在的表(建表步骤建好的或本进程已检查过的)直接写入，不再查询表结构。
+    is_new = not _table_known(table_name, to_db)
     try:
-        if cols_type is None:
-            data.to_sql(name=table_name, con=engine_mysql, schema=to_db, if_exists='append',
-                        index=write_index, )
-        elif not cols_type:
-            data.to_sql(name=table_name, con=engine_mysql, schema=to_db, if_exists='append',
-                        dtype={col_name: NVARCHAR(255) for col_name in col_name_list}, index=write_index, )
-        else:
-            data.to_sql(name=table_name, con=engine_mysql, schema=to_db, if_exists='append',
-                        dtype=cols_type, index=write_index, )
+        # 表不存在时由 to_sql 按字段类型建表(不写数据)，数据统一走批量写入。
+        if is_new and not checkTableIsExist(table_name, to_db):
+            _data = data.head(0)
+            if cols_type is None:
+                _data.to_sql(name=table_name, con=engine_mysql, schema=to_db, if_exists='append',
+                             index=write_index, )
+            elif not cols_type:
+                _data.to_sql(name=table_name, con=engine_mysql, schema=to_db, if_exists='append',
+                             dtype={col_name: NVARCHAR(255) for col_name in col_name_list}, index=write_index, )
+            else:
+                _data.to_sql(name=table_name, con=engine_mysql, schema=to_db, if_exists='append',
+                             dtype=cols_type, index=write_index, )
+            _add_table(table_name, to_db)
+        bulk_insert_df(data.reset_index() if write_index else data, table_name, to_db)
     except Exception as e:
         logging.error(f"database.insert_other_db_from_df处理异常：{table_name}表{e}")
 
+    if not is_new:
+        return
     # 判断是否存在主键
+    # 使用 http://docs.sqlalchemy.org/en/latest/core/reflection.html
+    ipt = inspect(engine_mysql)
     if not ipt.get_pk_constraint(table_name)['constrained_columns']:
         try:
             # 执行数据库插入数据。
-            with get_connection() as conn:
+            with get_connection(to_db) as conn:
                 with conn.cursor() as db:
                     db.execute(f'ALTER TABLE `{table_name}` ADD PRIMARY KEY ({primary_keys});')
                     if indexs is not None:
@@ -121,6 +198,124 @@ def insert_other_db_from_df(to_db, data, table_name, cols_type, write_index, pri
             logging.error(f"database.insert_other_db_from_df处理异常：{table_name}表{e}")
 
 
+# 按 tablestructure 的表定义建表，带主键和索引，已存在的表只补上缺少的索引。
+# primary_keys、indexs 为字段名元组、{索引名: 字段名元组}；partition 为日期字段时按月分区。
+def create_table(table_name, cols_type, primary_keys, indexs=None, partition=None, to_db=None):
+    try:
+        if not _table_known(table_name, to_db):
+            metadata = MetaData()
+            table = Table(table_name, metadata,
+                          *[Column(k, v, primary_key=k in primary_keys) for k, v in cols_type.items()],
+                          mysql_charset=db_charset)
+            for k in indexs or {}:
+                Index(f'IN{k}', *[table.c[c] for c in indexs[k]])
+            metadata.create_all(engine_to_db(to_db) if to_db else engine(), checkfirst=True)
+            _add_table(table_name, to_db)
+        elif indexs:
+            _add_indexs(table_name, indexs, to_db)
+        if partition is not None:
+            partition_by_month(table_name, partition, to_db)
+    except Exception as e:
+        logging.error(f"database.create_table处理异常：{table_name}表{e}")
+
+
+def _add_indexs(table_name, indexs, to_db=None):
+    with get_connection(to_db) as conn:
+        with conn.cursor() as db:
+            db.execute("SELECT DISTINCT index_name FROM information_schema.statistics "
+                       "WHERE table_schema = %s AND table_name = %s", (to_db or db_database, table_name))
+            names = {r[0] for r in db.fetchall()}
+            for k in indexs:
+                if f'IN{k}' not in names:
+                    _cols = '`,`'.join(indexs[k])
+                    db.execute(f'ALTER TABLE `{table_name}` ADD INDEX `IN{k}`(`{_cols}`);')
+
+
+def _month(date, months=0):
+    n = date.year * 12 + date.month - 1 + months
+    return datetime.date(n // 12, n % 12 + 1, 1)
+
+
+def _month_partition(month):
+    return f"PARTITION p{month.strftime('%Y%m')} VALUES LESS THAN (TO_DAYS('{_month(month, 1)}'))"
+
+
+# 按月 RANGE 分区：每月一个分区 pYYYYMM，之前的数据在 pold，之后的在 pmax。
+# 按日期的删除、查询只访问对应月份的分区；每次运行补齐到 db_partition_ahead 个月之后的分区，
+# db_partition_retention 大于0时删除更早月份的分区(直接丢弃整月数据)。
+# 分区字段必须包含在主键里。未分区的已有表第一次运行时整表重建为分区表。
+def partition_by_month(table_name, column, to_db=None):
+    today = datetime.date.today()
+    last = _month(today, db_partition_ahead)
+    with get_connection(to_db) as conn:
+        with conn.cursor() as db:
+            db.execute("SELECT partition_name FROM information_schema.partitions "
+                       "WHERE table_schema = %s AND table_name = %s AND partition_name IS NOT NULL",
+                       (to_db or db_database, table_name))
+            names = [r[0] for r in db.fetchall()]
+            months = sorted(datetime.date(int(n[1:5]), int(n[5:7]), 1) for n in names
+                            if len(n) == 7 and n[1:].isdigit())
+            if not names:
+                db.execute(f"SELECT MIN(`{column}`) FROM `{table_name}`")
+                first = db.fetchone()[0]
+                month = _month(first if first is not None else today)
+                parts = [f"PARTITION pold VALUES LESS THAN (TO_DAYS('{month}'))"]
+                while month <= last:
+                    parts.append(_month_partition(month))
+                    month = _month(month, 1)
+                parts.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+                db.execute(f"ALTER TABLE `{table_name}` PARTITION BY RANGE (TO_DAYS(`{column}`)) ({','.join(parts)})")
+                logging.info(f"database.partition_by_month{table_name}表按月分区{len(parts)}个")
+            elif months and months[-1] < last:
+                parts = []
+                month = _month(months[-1], 1)
+                while month <= last:
+                    parts.append(_month_partition(month))
+                    month = _month(month, 1)
+                parts.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+                db.execute(f"ALTER TABLE `{table_name}` REORGANIZE PARTITION pmax INTO ({','.join(parts)})")
+            if db_partition_retention > 0 and months:
+                cutoff = _month(today, -db_partition_retention)
+                drops = [f"p{m.strftime('%Y%m')}" for m in months if m < cutoff]
+                if drops:
+                    if 'pold' in names:
+                        drops.insert(0, 'pold')
+                    db.execute(f"ALTER TABLE `{table_name}` DROP PARTITION {','.join(drops)}")
+                    logging.info(f"database.partition_by_month{table_name}表删除分区{drops}")
+
+
+# 批量插入：按 db_batch_size 行一批执行多行 VALUES 的 INSERT，全部在一个事务里，失败时回滚。
+def bulk_insert_df(data, table_name, to_db=None, batch_size=None):
+    if data is None or len(data.index) == 0:
+        return
+    batch_size = batch_size or db_batch_size
+    _cols = '`,`'.join(data.columns)
+    _values = ','.join(['%s'] * len(data.columns))
+    sql = f"INSERT INTO `{table_name}` (`{_cols}`) VALUES ({_values})"
+    rows = _rows(data)
+    start = time.time()
+    with get_connection(to_db) as conn:
+        try:
+            conn.begin()
+            with conn.cursor() as db:
+                db.max_stmt_length = db_stmt_length
+                for i in range(0, len(rows), batch_size):
+                    db.executemany(sql, rows[i:i + batch_size])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    _touch(table_name, data)
+    seconds = time.time() - start
+    logging.info(f"database.bulk_insert_df写入{table_name}表{len(rows)}行，{seconds:.2f}秒，"
+                 f"{len(rows) / max(seconds, 1e-6):.0f}行/秒")
+
+
+# DataFrame 转为参数列表，NaN 为 None。
+def _rows(data):
+    return data.astype(object).where(data.notnull(), None).values.tolist()
+
+
 # 更新数据
 def update_db_from_df(data, table_name, where):
     data = data.where(data.notnull(), None)
@@ -162,16 +357,81 @@ def update_db_from_df(data, table_name, where):
                 logging.error(f"database.update_db_from_df处理异常：{sql}{e}")
 
 
-# 检查表是否存在
-def checkTableIsExist(tableName):
+# 批量写入：INSERT ... ON DUPLICATE KEY UPDATE，主键(或唯一索引)相同的行更新 keys 以外的字段。
+# pymysql 的 executemany 把参数拼成多行 VALUES，每条语句不超过 max_stmt_length 字节(需小于 max_allowed_packet)，
+# 几万行只需要几次往返。NaN 写为 NULL。全部在一个事务里，失败时回滚，只有提交成功才更新表的版本。
+def upsert_df(data, table_name, keys, max_stmt_length=None):
+    max_stmt_length = max_stmt_length or db_stmt_length
+    if data is None or len(data.index) == 0:
+        return
+    cols = tuple(data.columns)
+    _cols = '`,`'.join(cols)
+    _values = ','.join(['%s'] * len(cols))
+    _updates = ','.join(f'`{c}`=VALUES(`{c}`)' for c in cols if c not in keys)
+    sql = f"INSERT INTO `{table_name}` (`{_cols}`) VALUES ({_values}) ON DUPLICATE KEY UPDATE {_updates}"
+    rows = _rows(data)
     with get_connection() as conn:
+        try:
+            conn.begin()
+            with conn.cursor() as db:
+                db.max_stmt_length = max_stmt_length
+                db.executemany(sql, rows)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"database.upsert_df处理异常：{table_name}表{e}")
+            return
+    _touch(table_name, data)
+
+
+# 更新写入的表、日期的版本，web 缓存据此失效。
+def _touch(table_name, data):
+    tvr.touch(table_name, data['date'].unique() if 'date' in data.columns else None)
+
+
+# 进程内缓存已存在的表名，第一次使用时一次读出数据库里的全部表。只缓存存在的表，表删除后需重启进程。
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def _table_known(table_name, to_db=None):
+    database = to_db or db_database
+    with _tables_lock:
+        tables = _tables.get(database)
+    if tables is None:
+        tables = set()
+        try:
+            with get_connection(to_db) as conn:
+                with conn.cursor() as db:
+                    db.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = %s",
+                               (database,))
+                    tables.update(r[0] for r in db.fetchall())
+        except Exception as e:
+            logging.error(f"database._table_known处理异常：{database}{e}")
+            return False
+        with _tables_lock:
+            tables = _tables.setdefault(database, tables)
+    return table_name in tables
+
+
+def _add_table(table_name, to_db=None):
+    with _tables_lock:
+        _tables.setdefault(to_db or db_database, set()).add(table_name)
+
+
+# 检查表是否存在，已知存在的表不再查询数据库。
+def checkTableIsExist(tableName, to_db=None):
+    if _table_known(tableName, to_db):
+        return True
+    with get_connection(to_db) as conn:
         with conn.cursor() as db:
             db.execute("""
                 SELECT COUNT(*)
                 FROM information_schema.tables
-                WHERE table_name = '{0}'
-                """.format(tableName.replace('\'', '\'\'')))
+                WHERE table_schema = %s AND table_name = %s
+                """, (to_db or db_database, tableName))
             if db.fetchone()[0] == 1:
+                _add_table(tableName, to_db)
                 return True
     return False
 
@@ -184,6 +444,7 @@ def executeSql(sql, params=()):
                 db.execute(sql, params)
             except Exception as e:
                 logging.error(f"database.executeSql处理异常：{sql}{e}")
+    tvr.touch_sql(sql)
 
 
 # 查询数据
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import json
+import random
+import logging
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+import instock.lib.rate_limiter as rlm
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 爬虫共用的HTTP请求层。
+# 每个域名一个带连接池的 requests.Session（keep-alive，省掉每次请求的TCP/TLS握手），
+# 每个接口的请求速率和并发由 rate_limiter 控制，另有全局并发上限、超时，
+# 以及带随机抖动的指数退避重试。这是唯一的一层重试，调用方不再另外重试。
+
+MAX_CONCURRENCY = 64  # 全部接口同时进行的请求数
+POOL_SIZE = 32  # 每个域名的连接池大小
+TIMEOUT = (5, 20)  # 连接超时，读取超时(秒)
+RETRIES = 3
+BACKOFF = 0.5  # 第n次重试前等待 BACKOFF * 2**n 秒，再乘以0.5~1.5的随机数
+RETRY_STATUS = (429, 500, 502, 503, 504)
+EMPTY_JSON_SIZE = 1024  # 小于该长度的 JSON 响应才检查是否为空数据
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/118.0.0.0 Safari/537.36',
+}
+
+_global_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _new_session():
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _get_session(host):
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = _new_session()
+            _sessions[host] = session
+        return session
+
+
+class EmptyResponse(requests.RequestException):
+    pass
+
+
+# 被限流时接口常返回 200 和 {"rc": 非0, ...}，按空响应处理。
+# rc 为0的 {"data": null} 是正常的查询结果(确实没有数据)，不重试。
+# 空数据的响应都很短，只解析短的响应，不重复解析正常数据。
+def _empty_json(r):
+    content = r.content
+    if len(content) >= EMPTY_JSON_SIZE or not content.lstrip().startswith(b'{'):
+        return False
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return False
+    if not isinstance(data, dict):
+        return False
+    return data.get('rc') not in (None, 0)
+
+
+# 替代 requests.get，参数相同。网络错误、超时、空响应(含 rc 非0的 JSON)和 RETRY_STATUS 状态码会重试，
+# 同时让限流降低并发。重试用完后抛出最后一次的异常；rc 非0的 JSON 返回最后一次的响应，由调用方处理。
+def get(url, params=None, headers=None, timeout=TIMEOUT, retries=RETRIES, **kwargs):
+    parts = urlsplit(url)
+    session = _get_session(parts.netloc)
+    endpoint = rlm.get_endpoint(parts.netloc, parts.path)
+    attempt = 0
+    while True:
+        try:
+            # 先等接口的限流再占全局并发，被限流的接口不占用其他接口的全局并发名额。
+            start = endpoint.acquire()
+            ok = False
+            try:
+                with _global_slots:
+                    start = time.monotonic()  # 等全局并发的时间不计入接口延迟
+                    r = session.get(url, params=params, headers=headers, timeout=timeout, **kwargs)
+                    if r.status_code in RETRY_STATUS:
+                        r.raise_for_status()
+                    if r.status_code == 200 and len(r.content) == 0:
+                        raise EmptyResponse(f"空响应：{url}")
+                    if r.status_code == 200 and _empty_json(r):
+                        raise EmptyResponse(f"空数据：{url}", response=r)
+                    ok = True
+            finally:
+                endpoint.release(start, ok)
+            return r
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError, EmptyResponse) as e:
+            if attempt >= retries:
+                if isinstance(e, EmptyResponse) and e.response is not None:
+                    return e.response
+                raise
+            delay = BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+            logging.debug(f"fetcher.get第{attempt + 1}次重试：{url}{e}")
+            attempt += 1
+            time.sleep(delay)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+import collections
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 数据抓取限流。
+# 每个接口(endpoint，域名+路径)有一个预算：令牌桶限制每秒请求数，
+# 并发数按 AIMD 自适应：延迟和错误正常时每完成一轮并发加1，
+# 遇到 429/5xx、超时、空响应或延迟过高时减半。同时统计最近的吞吐量。
+
+# 域名+路径 或 域名(含上级域名，如 push2.eastmoney.com 也用于 82.push2.eastmoney.com) -> (每秒请求数, 桶容量, 最大并发)
+BUDGETS = {
+    'push2his.eastmoney.com': (30.0, 30, 32),
+    'push2.eastmoney.com': (10.0, 10, 8),
+    'datacenter-web.eastmoney.com': (10.0, 10, 8),
+    'finance.sina.com.cn': (5.0, 5, 4),
+}
+DEFAULT_BUDGET = (20.0, 20, 16)
+INITIAL_CONCURRENCY = 4
+TARGET_LATENCY = 2.0  # 秒，超过时视为拥塞
+WINDOW = 10.0  # 吞吐量统计窗口(秒)
+
+
+# 令牌桶，acquire 在没有令牌时等待。
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.time) * self.rate)
+                self.time = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# AIMD 自适应并发上限。
+class AdaptiveLimiter:
+    def __init__(self, max_limit, initial=INITIAL_CONCURRENCY, target_latency=TARGET_LATENCY):
+        self.max_limit = max_limit
+        self.limit = float(min(initial, max_limit))
+        self.target_latency = target_latency
+        self.inflight = 0
+        self.last_decrease = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.inflight >= int(self.limit):
+                self.cond.wait()
+            self.inflight += 1
+
+    def release(self, ok, latency):
+        with self.cond:
+            self.inflight -= 1
+            if ok and latency <= self.target_latency:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            elif time.monotonic() - self.last_decrease > self.target_latency:
+                # 同一轮里的多个失败只减一次
+                self.limit = max(1.0, self.limit / 2)
+                self.last_decrease = time.monotonic()
+            self.cond.notify_all()
+
+
+class Endpoint:
+    def __init__(self, key, rate, capacity, max_concurrency):
+        self.key = key
+        self.bucket = TokenBucket(rate, capacity)
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.lock = threading.Lock()
+        self.done = collections.deque()
+        self.requests = 0
+        self.errors = 0
+
+    # 先占并发再取令牌，返回开始时间，请求结束后必须调用 release。
+    def acquire(self):
+        self.limiter.acquire()
+        self.bucket.acquire()
+        return time.monotonic()
+
+    def release(self, start, ok):
+        now = time.monotonic()
+        self.limiter.release(ok, now - start)
+        with self.lock:
+            self.requests += 1
+            if not ok:
+                self.errors += 1
+            self.done.append(now)
+            while self.done and self.done[0] < now - WINDOW:
+                self.done.popleft()
+
+    def stats(self):
+        with self.lock:
+            now = time.monotonic()
+            while self.done and self.done[0] < now - WINDOW:
+                self.done.popleft()
+            return {'endpoint': self.key, 'throughput': len(self.done) / WINDOW,
+                    'concurrency': self.limiter.inflight, 'limit': int(self.limiter.limit),
+                    'requests': self.requests, 'errors': self.errors}
+
+
+_endpoints = {}
+_endpoints_lock = threading.Lock()
+
+
+def _budget(host, path):
+    if host + path in BUDGETS:
+        return BUDGETS[host + path]
+    parts = host.split('.')
+    for i in range(len(parts) - 1):
+        domain = '.'.join(parts[i:])
+        if domain in BUDGETS:
+            return BUDGETS[domain]
+    return DEFAULT_BUDGET
+
+
+def get_endpoint(host, path=''):
+    key = host + path
+    with _endpoints_lock:
+        ep = _endpoints.get(key)
+        if ep is None:
+            rate, capacity, max_concurrency = _budget(host, path)
+            ep = Endpoint(key, rate, capacity, max_concurrency)
+            _endpoints[key] = ep
+        return ep
+
+
+# 所有预算中最大的并发数，线程池大小用它，实际并发由限流决定。
+def max_workers():
+    return max([DEFAULT_BUDGET[2]] + [b[2] for b in BUDGETS.values()])
+
+
+def stats():
+    with _endpoints_lock:
+        endpoints = list(_endpoints.values())
+    return [ep.stats() for ep in endpoints]
+
+
+# 当前吞吐量报告，每个接口一行。
+def report():
+    return '\n'.join(f"{s['endpoint']}：{s['throughput']:.1f}次/秒，并发{s['concurrency']}/{s['limit']}，"
+                     f"请求{s['requests']}次，失败{s['errors']}次" for s in stats())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import re
+import logging
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 表数据的版本戳，作业进程写表后更新，web 进程据此判断缓存是否过期。
+# 每个 (表, 日期) 一个空文件，版本为文件修改时间；日期为 ALL 的文件表示整表的版本，不能确定日期的写入更新它。
+# 查询版本只需要一次 stat，不访问数据库。
+
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+table_version_path = os.path.join(cpath_current, 'cache', 'table_version')
+ALL = '_all'
+
+_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+_TABLE = re.compile(r'^\s*(?:DELETE\s+FROM|UPDATE|INSERT\s+INTO|REPLACE\s+INTO)\s+`?(\w+)`?', re.IGNORECASE)
+
+
+def _file(table_name, date):
+    return os.path.join(table_version_path, table_name, str(date)[:10])
+
+
+# 更新表的版本，dates 为 None 时更新整表版本。
+def touch(table_name, dates=None):
+    try:
+        path = os.path.join(table_version_path, table_name)
+        if not os.path.exists(path):
+            os.makedirs(path, exist_ok=True)
+        for date in ([ALL] if dates is None else set(str(d)[:10] for d in dates)):
+            file = _file(table_name, date)
+            with open(file, 'a'):
+                os.utime(file, None)
+    except Exception as e:
+        logging.error(f"table_version.touch处理异常：{table_name}{e}")
+
+
+# SQL 写语句对应的表和日期，条件里有日期时只更新这些日期，否则更新整表。
+def touch_sql(sql):
+    match = _TABLE.match(sql)
+    if match is None:
+        return
+    dates = _DATE.findall(sql[match.end():])
+    touch(match.group(1), dates or None)
+
+
+# 版本号，没有写入过为 0。
+def get(table_name, date=ALL):
+    try:
+        return os.stat(_file(table_name, date)).st_mtime_ns
+    except OSError:
+        return 0
+
+
+# 多个 (表, 日期) 的版本，日期为 None 时取整表版本。
+def get_all(deps):
+    return tuple(get(t, ALL if d is None else d) for t, d in deps)
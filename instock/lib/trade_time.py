@@ -2,44 +2,33 @@
 # -*- coding: utf-8 -*-
 
 import datetime
-from instock.core.singleton_trade_date import stock_trade_date
+from instock.core.singleton_trade_date import stock_trade_calendar
 
 __author__ = 'myh '
 __date__ = '2023/4/10 '
 
 
 def is_trade_date(date=None):
-    trade_date = stock_trade_date().get_data()
-    if trade_date is None:
-        return False
-    if date in trade_date:
-        return True
-    else:
+    calendar = stock_trade_calendar().get_data()
+    if calendar is None or date is None:
         return False
+    return calendar.is_trade_date(date)
 
 
 def get_previous_trade_date(date):
-    trade_date = stock_trade_date().get_data()
-    if trade_date is None:
+    calendar = stock_trade_calendar().get_data()
+    if calendar is None:
         return date
-    tmp_date = date
-    while True:
-        tmp_date += datetime.timedelta(days=-1)
-        if tmp_date in trade_date:
-            break
-    return tmp_date
+    tmp_date = calendar.previous(date)
+    return date if tmp_date is None else tmp_date
 
 
 def get_next_trade_date(date):
-    trade_date = stock_trade_date().get_data()
-    if trade_date is None:
+    calendar = stock_trade_calendar().get_data()
+    if calendar is None:
         return date
-    tmp_date = date
-    while True:
-        tmp_date += datetime.timedelta(days=1)
-        if tmp_date in trade_date:
-            break
-    return tmp_date
+    tmp_date = calendar.next(date)
+    return date if tmp_date is None else tmp_date
 
 
 OPEN_TIME = (
@@ -7,18 +7,42 @@ import logging
 import instock.core.stockfetch as stf
 import instock.core.kline.visualization as vis
 import instock.web.base as webBase
+import instock.web.response_cache as rcc
+import instock.lib.trade_time as trd
+import instock.lib.table_version as tvr
+import instock.core.hist_panel as hpl
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
 
 
-# 获得页面数据。
+# 获得页面数据。已收盘交易日的图表按历史数据版本缓存，重新发布当天的历史数据后失效。
 class GetDataIndicatorsHandler(webBase.BaseHandler, ABC):
     @gen.coroutine
     def get(self):
         code = self.get_argument("code", default=None, strip=False)
         date = self.get_argument("date", default=None, strip=False)
         name = self.get_argument("name", default=None, strip=False)
+        result = {}
+
+        def get_page():
+            comp_list = result['comp_list'] = self.get_comp_list(code, date, name)
+            if not comp_list:
+                return None
+            return self.render_string("stock_indicators.html", comp_list=comp_list,
+                                      leftMenu=webBase.GetLeftMenu(self.request.uri))
+
+        if code is not None and date is not None and date <= trd.get_trade_date_last()[0].strftime("%Y-%m-%d"):
+            if rcc.serve(self, [(hpl.HIST_TABLE, date)], get_page, 'text/html; charset=UTF-8'):
+                return
+        comp_list = result['comp_list'] if 'comp_list' in result else self.get_comp_list(code, date, name)
+        if comp_list is None:
+            return
+        self.render("stock_indicators.html", comp_list=comp_list,
+                    leftMenu=webBase.GetLeftMenu(self.request.uri))
+
+    # 没有数据返回 None，处理异常返回空列表。
+    def get_comp_list(self, code, date, name):
         comp_list = []
         try:
             if code.startswith(('1', '5')):
@@ -26,18 +50,16 @@ class GetDataIndicatorsHandler(webBase.BaseHandler, ABC):
             else:
                 stock = stf.fetch_stock_hist((date, code))
             if stock is None:
-                return
+                return None
 
             pk = vis.get_plot_kline(code, stock, date, name)
             if pk is None:
-                return
+                return None
 
             comp_list.append(pk)
         except Exception as e:
             logging.error(f"dataIndicatorsHandler.GetDataIndicatorsHandler处理异常：{e}")
-
-        self.render("stock_indicators.html", comp_list=comp_list,
-                    leftMenu=webBase.GetLeftMenu(self.request.uri))
+        return comp_list
 
 
 # 关注股票。
@@ -55,6 +77,7 @@ class SaveCollectHandler(webBase.BaseHandler, ABC):
             else:
                 sql = f"INSERT INTO `{table_name}`(`datetime`, `code`) VALUE('{datetime.datetime.now()}','{code}')"
             self.db.query(sql)
+            tvr.touch(table_name)
         except Exception as e:
             err = {"error": str(e)}
             logging.info(err)
@@ -8,8 +8,10 @@ from tornado import gen
 # import logging
 import datetime
 import instock.lib.trade_time as trd
+import instock.core.tablestructure as tbs
 import instock.core.singleton_stock_web_module_data as sswmd
 import instock.web.base as webBase
+import instock.web.response_cache as rcc
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
@@ -43,27 +45,127 @@ class GetStockHtmlHandler(webBase.BaseHandler, ABC):
                     leftMenu=webBase.GetLeftMenu(self.request.uri))
 
 
+# 分页查询参数。
+PAGE_ARGUMENTS = ('offset', 'limit', 'sort', 'columns', 'filter')
+PAGE_LIMIT = 100  # 默认每页行数
+PAGE_MAX_LIMIT = 1000  # 每页最多行数
+FILTER_OPERATORS = {'eq': '=', 'ne': '<>', 'gt': '>', 'ge': '>=', 'lt': '<', 'le': '<=', 'like': 'LIKE'}
+
+
 # 获得股票数据内容。
+# 带 offset/limit/sort/columns/filter 参数时只返回一页数据，否则返回整表(整天)数据：
+# columns=code,name,close 只取这些字段；sort=-cdatetime,code 排序，前面加 - 为降序；
+# filter=close:gt:10 过滤，可以有多个，操作符见 FILTER_OPERATORS；offset、limit 分页。
+# 返回 {"total": 符合条件的总行数, "offset", "limit", "data": 当前页}。
+# 页面(stock_web.html)的表格目前仍读取整天数据，筛选、排序在浏览器端进行，切换到分页读取待表格改为按需加载。
+# 已收盘交易日的数据按 (表, 日期) 缓存，作业重写后失效。
 class GetStockDataHandler(webBase.BaseHandler, ABC):
     def get(self):
         name = self.get_argument("name", default=None, strip=False)
         date = self.get_argument("date", default=None, strip=False)
         web_module_data = sswmd.stock_web_module_data().get_data(name)
-        self.set_header('Content-Type', 'application/json;charset=UTF-8')
+        content_type = 'application/json;charset=UTF-8'
+        try:
+            if date is not None and date <= trd.get_trade_date_last()[0].strftime("%Y-%m-%d"):
+                deps = [(web_module_data.table_name, date), (web_module_data.table_name, None)]
+                if web_module_data.order_columns is not None:
+                    deps.append((tbs.TABLE_CN_STOCK_ATTENTION['name'], None))
+                rcc.serve(self, deps, lambda: self.get_body(web_module_data, date), content_type)
+                return
+            body = self.get_body(web_module_data, date)
+        except ValueError as e:
+            self.set_status(400)
+            body = json.dumps({"error": str(e)}, ensure_ascii=False)
+        self.set_header('Content-Type', content_type)
+        self.write(body)
+
+    def get_body(self, web_module_data, date):
+        if any(k in self.request.arguments for k in PAGE_ARGUMENTS):
+            return json.dumps(self.get_page(web_module_data, date), cls=MyEncoder)
+
+        params = []
         if date is None:
             where = ""
         else:
-            where = f" WHERE `date` = '{date}'"
+            where = " WHERE t.`date` = %s"
+            params.append(date)
 
         order_by = ""
         if web_module_data.order_by is not None:
             order_by = f" ORDER BY {web_module_data.order_by}"
 
-        order_columns = ""
-        if web_module_data.order_columns is not None:
-            order_columns = f",{web_module_data.order_columns}"
+        # 关注时间和分页查询一样用一次 LEFT JOIN 关注表(code 为主键)取得，不再每行执行一次子查询。
+        select = "t.*"
+        join = ""
+        if web_module_data.order_columns is not None and 'code' in web_module_data.columns:
+            select = "t.*,a.`datetime` AS `cdatetime`"
+            join = f" LEFT JOIN `{tbs.TABLE_CN_STOCK_ATTENTION['name']}` a ON a.`code` = t.`code`"
+
+        sql = f" SELECT {select} FROM `{web_module_data.table_name}` t{join}{where}{order_by}"
+
+        data = self.db.query(sql, *params)
+        return json.dumps(data, cls=MyEncoder)
+
+    # 分页、排序、过滤都在数据库里完成，关注时间用 LEFT JOIN 关注表取得。字段名只接受表定义里的字段，值都用参数传递。
+    def get_page(self, web_module_data, date):
+        table_columns = web_module_data.columns
+        is_join = web_module_data.order_columns is not None and 'code' in table_columns
+        sortable = set(table_columns)
+        if is_join:
+            sortable.add('cdatetime')
+
+        columns = self.get_argument("columns", default=None)
+        if columns:
+            columns = [c for c in columns.split(',') if c]
+            unknown = [c for c in columns if c not in sortable]
+            if unknown:
+                raise ValueError(f"未知字段：{','.join(unknown)}")
+        else:
+            columns = list(sortable if is_join else table_columns)
+        select = [f"t.`{c}`" for c in table_columns if c in columns]
+        if is_join and 'cdatetime' in columns:
+            select.append("a.`datetime` AS `cdatetime`")
+
+        where = []
+        params = []
+        if date is not None:
+            where.append("t.`date` = %s")
+            params.append(date)
+        for f in self.get_arguments("filter"):
+            col, op, value = (f.split(':', 2) + [None, None])[:3]
+            if col not in table_columns or op not in FILTER_OPERATORS or value is None:
+                raise ValueError(f"过滤条件错误：{f}")
+            where.append(f"t.`{col}` {FILTER_OPERATORS[op]} %s")
+            params.append(value)
+        where = f" WHERE {' AND '.join(where)}" if where else ""
+
+        order_by = []
+        sort = self.get_argument("sort", default=None)
+        if sort:
+            for c in sort.split(','):
+                desc = c.startswith('-')
+                c = c.lstrip('-')
+                if c not in sortable:
+                    raise ValueError(f"未知排序字段：{c}")
+                order_by.append(f"{'a.`datetime`' if c == 'cdatetime' else f't.`{c}`'}{' DESC' if desc else ''}")
+        elif is_join:
+            order_by.append("a.`datetime` DESC")
+        elif web_module_data.order_by is not None:
+            order_by.append(web_module_data.order_by)
+        # 排序相同时按代码，保证翻页稳定
+        if 'code' in table_columns:
+            order_by.append("t.`code`")
+        order_by = f" ORDER BY {','.join(order_by)}" if order_by else ""
 
-        sql = f" SELECT *{order_columns} FROM `{web_module_data.table_name}`{where}{order_by}"
+        try:
+            offset = max(0, int(self.get_argument("offset", default=0)))
+            limit = min(PAGE_MAX_LIMIT, max(1, int(self.get_argument("limit", default=PAGE_LIMIT))))
+        except ValueError:
+            raise ValueError("offset、limit 必须是整数")
 
-        data = self.db.query(sql)
-        self.write(json.dumps(data, cls=MyEncoder))
+        table = f"`{web_module_data.table_name}` t"
+        join = f" LEFT JOIN `{tbs.TABLE_CN_STOCK_ATTENTION['name']}` a ON a.`code` = t.`code`" if is_join else ""
+        total = self.db.get(f"SELECT COUNT(*) AS `total` FROM {table}{where}", *params)['total']
+        sql = f"SELECT {','.join(select)} FROM {table}{join}{where}{order_by} LIMIT %s OFFSET %s"
+        data = self.db.query(sql, *params, limit, offset)
+        return {"total": total, "offset": offset, "limit": limit, "data": data}
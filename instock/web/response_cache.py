@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import time
+import gzip
+import json
+import hashlib
+import logging
+import threading
+import collections
+import email.utils
+import instock.lib.table_version as tvr
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 已收盘交易日的 web 响应缓存，进程内 LRU，可选再存一份到本地磁盘。
+# 按请求键缓存 gzip 压缩好的响应体，带 ETag、Last-Modified。
+# 每条缓存记录生成时依赖的 (表, 日期) 版本(table_version)，作业重写了这些数据版本变化，缓存随之失效。
+
+web_cache_entries = 512  # 内存缓存最多条数
+web_cache_bytes = 128 * 1024 * 1024  # 内存缓存最多字节数(压缩后)
+web_cache_disk = False  # 是否同时缓存到磁盘，web 重启后可以继续使用
+
+# 使用环境变量配置,docker -e 传递
+_web_cache_entries = os.environ.get('web_cache_entries')
+if _web_cache_entries is not None:
+    web_cache_entries = int(_web_cache_entries)
+_web_cache_bytes = os.environ.get('web_cache_bytes')
+if _web_cache_bytes is not None:
+    web_cache_bytes = int(_web_cache_bytes)
+_web_cache_disk = os.environ.get('web_cache_disk')
+if _web_cache_disk is not None:
+    web_cache_disk = _web_cache_disk.lower() in ('1', 'true', 'yes')
+
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+web_cache_path = os.path.join(cpath_current, 'cache', 'web_response')
+
+
+class Entry:
+    def __init__(self, body, content_type, versions, last_modified, etag=None):
+        self.body = body  # gzip 压缩后的响应体
+        self.content_type = content_type
+        self.versions = tuple(versions)
+        self.last_modified = last_modified  # 秒
+        self.etag = etag or f'"{hashlib.sha1(body).hexdigest()}"'
+
+    # 未压缩的响应体，给不支持 gzip 的客户端。
+    def raw(self):
+        return gzip.decompress(self.body)
+
+
+class ResponseCache:
+    def __init__(self, entries=None, size=None, disk=None, path=web_cache_path):
+        self.entries = entries or web_cache_entries
+        self.size = size or web_cache_bytes
+        self.disk = web_cache_disk if disk is None else disk
+        self.path = path
+        self._data = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    # 取缓存，versions 为当前的依赖版本，和缓存记录的不同时丢弃。
+    def get(self, key, versions):
+        versions = tuple(versions)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry.versions == versions:
+                    self._data.move_to_end(key)
+                    return entry
+                self._remove(key)
+        if self.disk:
+            entry = self._load(key)
+            if entry is not None and entry.versions == versions:
+                self._put(key, entry)
+                return entry
+        return None
+
+    # 放入缓存，versions 须在生成响应之前取得，生成期间有写入时下次取用即失效。
+    def put(self, key, versions, body, content_type):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        # 最后修改时间取依赖数据最近的写入时间
+        mtime = max(versions, default=0) / 1e9 or time.time()
+        entry = Entry(gzip.compress(body, compresslevel=6), content_type, versions, mtime)
+        self._put(key, entry)
+        if self.disk:
+            self._save(key, entry)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _put(self, key, entry):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = entry
+            self._bytes += len(entry.body)
+            while self._data and (len(self._data) > self.entries or self._bytes > self.size):
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key):
+        entry = self._data.pop(key)
+        self._bytes -= len(entry.body)
+
+    def _files(self, key):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, name + '.gz'), os.path.join(self.path, name + '.json')
+
+    def _save(self, key, entry):
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path, exist_ok=True)
+            body_file, meta_file = self._files(key)
+            with open(body_file + '.tmp', 'wb') as f:
+                f.write(entry.body)
+            os.replace(body_file + '.tmp', body_file)
+            meta = {'key': key, 'content_type': entry.content_type, 'versions': entry.versions,
+                    'last_modified': entry.last_modified, 'etag': entry.etag}
+            with open(meta_file + '.tmp', 'w') as f:
+                json.dump(meta, f)
+            os.replace(meta_file + '.tmp', meta_file)
+        except Exception as e:
+            logging.error(f"response_cache._save处理异常：{key}{e}")
+
+    def _load(self, key):
+        body_file, meta_file = self._files(key)
+        if not os.path.isfile(meta_file):
+            return None
+        try:
+            with open(meta_file, 'r') as f:
+                meta = json.load(f)
+            if meta['key'] != key:
+                return None
+            with open(body_file, 'rb') as f:
+                body = f.read()
+            return Entry(body, meta['content_type'], meta['versions'], meta['last_modified'], meta['etag'])
+        except Exception as e:
+            logging.error(f"response_cache._load处理异常：{key}{e}")
+        return None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+
+# 写出缓存的响应：If-None-Match 相同时返回 304，客户端支持 gzip 时直接写出压缩好的响应体。
+def write_entry(handler, entry):
+    handler.set_header('Content-Type', entry.content_type)
+    handler.set_header('ETag', entry.etag)
+    handler.set_header('Last-Modified', email.utils.formatdate(entry.last_modified, usegmt=True))
+    handler.set_header('Cache-Control', 'no-cache')
+    handler.set_header('Vary', 'Accept-Encoding')
+    if entry.etag in handler.request.headers.get('If-None-Match', ''):
+        handler.set_status(304)
+        handler.finish()
+        return
+    if 'gzip' in handler.request.headers.get('Accept-Encoding', ''):
+        handler.set_header('Content-Encoding', 'gzip')
+        handler.finish(entry.body)
+    else:
+        handler.finish(entry.raw())
+
+
+# 按依赖的 (表, 日期) 缓存 produce() 生成的响应并写出，缓存键默认为请求的 uri。
+# produce 返回 None 时不缓存、不写出，返回 False。
+def serve(handler, deps, produce, content_type, key=None):
+    cache = get_cache()
+    key = key or handler.request.uri
+    versions = tvr.get_all(deps)
+    entry = cache.get(key, versions)
+    if entry is None:
+        body = produce()
+        if body is None:
+            return False
+        entry = cache.put(key, versions, body, content_type)
+    write_entry(handler, entry)
+    return True
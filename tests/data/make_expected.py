@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import datetime
+import numpy as np
+import pandas as pd
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 用原来逐只计算的实现(基线提交)生成 tests/data 下的预期值，测试用这些固定值检查批量计算的结果。
+# 用法：git worktree add /tmp/base <基线提交> && python tests/data/make_expected.py /tmp/base
+# 基线的 low_backtrace_increase 第一天用 previous_open = -1000000.0 做初值，两日累计条件总成立，从不选中；
+# 生成时只改这一处(第一天用当天开盘价)，其他都是基线代码。
+
+data_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(os.path.dirname(data_path)))
+from tests.synthetic import make_stocks, INDICATOR_DATES, STRATEGY_DATES, PATTERN_DATES, is_top, rate_signals
+
+
+def _low_backtrace_increase(base):
+    file = os.path.join(base, 'instock', 'core', 'strategy', 'low_backtrace_increase.py')
+    with open(file, 'r', encoding='utf-8') as f:
+        source = f.read()
+    fixed = source.replace("previous_open = -1000000.0", "previous_open = data['open'].values[0]")
+    assert fixed != source
+    scope = {}
+    exec(compile(fixed, file, 'exec'), scope)
+    return scope['check']
+
+
+def main(base):
+    sys.path.insert(0, base)
+    import instock.core.tablestructure as tbs
+    import instock.core.indicator.calculate_indicator as idr
+    import instock.core.pattern.pattern_recognitions as kpr
+    import instock.core.backtest.rate_stats as rate
+    assert os.path.abspath(tbs.__file__).startswith(os.path.abspath(base))
+
+    stocks, dates = make_stocks()
+
+    columns = ['date', 'code'] + list(tbs.STOCK_STATS_DATA['columns'])
+    rows = []
+    for day in INDICATOR_DATES:
+        date = datetime.date.fromisoformat(dates[day])
+        for key, data in list(stocks.items())[::4]:
+            row = idr.get_indicator(key, data, columns, date=date)
+            if row is not None:
+                rows.append(row)
+    pd.DataFrame(rows).to_csv(os.path.join(data_path, 'indicators.csv'), index=False, float_format='%.12g')
+
+    rows = []
+    for strategy in tbs.TABLE_CN_STOCK_STRATEGIES:
+        func = strategy['func']
+        if strategy['name'] == 'cn_stock_strategy_low_backtrace_increase':
+            func = _low_backtrace_increase(base)
+        for day in STRATEGY_DATES:
+            date = datetime.date.fromisoformat(dates[day])
+            codes = []
+            for key, data in stocks.items():
+                if func.__name__ == 'check_high_tight':
+                    hit = func(key, data, date=date, istop=is_top(key[1]))
+                else:
+                    hit = func(key, data, date=date)
+                if hit:
+                    codes.append(key[1])
+            rows.append((dates[day], strategy['name'], ' '.join(codes)))
+    pd.DataFrame(rows, columns=['date', 'name', 'codes']).to_csv(os.path.join(data_path, 'strategies.csv'),
+                                                                 index=False)
+
+    pattern_column = tbs.STOCK_KLINE_PATTERN_DATA['columns']
+    rows = []
+    for day in PATTERN_DATES:
+        date = datetime.date.fromisoformat(dates[day])
+        for key, data in stocks.items():
+            row = kpr.get_pattern_recognition(key, data, pattern_column, date=date)
+            if row is not None:
+                hits = ';'.join(f"{k}={int(row[k])}" for k in pattern_column if row[k] != 0)
+                rows.append((dates[day], key[1], hits))
+    pd.DataFrame(rows, columns=['date', 'code', 'patterns']).to_csv(os.path.join(data_path, 'patterns.csv'),
+                                                                    index=False)
+
+    columns = ['date', 'code'] + ['rate_%d' % i for i in range(1, 101)]
+    rows = []
+    for signal in rate_signals(stocks, dates):
+        row = rate.get_rates(signal, stocks.get((dates[-1], signal[1], signal[2])), columns, 101)
+        if row is not None:
+            rows.append([signal[0], signal[1], signal[2]] + [np.nan if x is None else x for x in row.values[2:]])
+    pd.DataFrame(rows, columns=['date', 'code', 'name'] + columns[2:]).to_csv(
+        os.path.join(data_path, 'rates.csv'), index=False, float_format='%.2f')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1])
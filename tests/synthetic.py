@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import numpy as np
+import pandas as pd
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+# tests/data 里预期值对应的日期(make_stocks 日期列表的下标)
+INDICATOR_DATES = (-25, -3)
+STRATEGY_DATES = (-12, -10, -8, -6, -4, -2, -1)
+PATTERN_DATES = tuple(range(-9, -1))
+
+
+# 随机生成的日线数据，{(最后一天, 代码, 名称): DataFrame}，列同 stock_hist_data。
+# 上市天数、停牌各不相同，带涨停、跌停、放量，另有几类按策略条件构造的走势，让每个策略和形态都有命中：
+# i % 11 == 5 最后90天稳步上涨(无大幅回撤)；i % 11 == 6 年线下方突破后回踩年线；跌停有一半放量(放量跌停)。
+# 用 RandomState 生成，不同 numpy 版本得到相同的数据，tests/data 里固定的预期值才能对上。
+def make_stocks(n=300, days=400, seed=7):
+    rng = np.random.RandomState(seed)
+    dates = pd.bdate_range('2020-01-01', periods=days).strftime('%Y-%m-%d').values
+    stocks = {}
+    for i in range(n):
+        length = int(rng.randint(5, days - 10))
+        off = int(rng.randint(0, 3))
+        r = rng.normal(0.002, .04, length)
+        jumps = rng.random_sample(length)
+        r[jumps < 0.05] = 0.1
+        r[jumps > 0.97] = -0.1
+        if i % 3 == 0:
+            r += np.where(np.arange(length) > length - 80, 0.01, 0)
+        if i % 7 == 1 and length > 20:
+            r[-10:] = -0.085 + rng.normal(0, 0.003, 10)
+        volume = rng.uniform(1e6, 5e7, length) * np.where(jumps < 0.1, 5, 1) * np.where(jumps > 0.985, 8, 1)
+        if i % 7 == 2 and length > 20:
+            volume[-3:] *= 20
+        if i % 11 == 5 and length > 100:
+            r[-90:] = rng.normal(0.012, 0.008, 90)
+        if i % 11 == 6:
+            length, off = days - 10, 0
+            r, volume = _backtrace_ma250(rng, length)
+        close = 10 * np.exp(np.cumsum(r))
+        open_price = close / (1 + r) * (1 + rng.normal(0, .005, length))
+        high = np.maximum(open_price, close) * (1 + abs(rng.normal(0, .01, length)))
+        low = np.minimum(open_price, close) * (1 - abs(rng.normal(0, .01, length)))
+        p_change = np.r_[0, np.diff(close) / close[:-1] * 100]
+        stocks[(dates[-1], f"{i:06d}", f"n{i}")] = pd.DataFrame({
+            'date': dates[days - length - off:days - off].astype(object), 'open': open_price, 'close': close,
+            'high': high, 'low': low, 'volume': volume, 'amount': volume * close, 'p_change': p_change})
+    return stocks, dates
+
+
+# 回踩年线：长期横盘后跌到年线下方，放量上涨到高点，再缩量回落约25%，始终在年线上方。
+def _backtrace_ma250(rng, length):
+    r = rng.normal(0, 0.004, length)
+    r[-75:-65] = -0.012
+    r[-52:-32] = 0.035
+    r[-32:-18] = -0.02
+    r[-18:] = rng.normal(0.002, 0.002, 18)
+    volume = rng.uniform(1e7, 2e7, length)
+    volume[-34:-31] *= 4
+    volume[-20:-10] *= 0.3
+    return r, volume
+
+
+# 高而窄的旗形需要的"上榜"标记，预期值按代码奇偶固定。
+def is_top(code):
+    return int(code) % 2 == 0
+
+
+# 回测用的选股信号 (日期, 代码, 名称)，少数名称对不上，取不到数据。
+def rate_signals(stocks, dates, n=120, seed=3):
+    rng = np.random.RandomState(seed)
+    keys = list(stocks)
+    signals = []
+    for _ in range(n):
+        key = keys[rng.randint(len(keys))]
+        signals.append((dates[rng.randint(len(dates) - 150, len(dates))], key[1],
+                        key[2] if rng.random_sample() > 0.05 else 'x'))
+    return signals
+
+
+# tests/data 下由 make_expected.py 用原来逐只计算的实现生成的预期值。
+def load_expected(name):
+    return pd.read_csv(os.path.join(data_path, name + '.csv'), dtype={'date': str, 'code': str, 'name': str},
+                       keep_default_na=False, na_values=[''])
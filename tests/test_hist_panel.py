@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import numpy as np
+import instock.core.hist_panel as hpl
+import instock.lib.table_version as tvr
+from tests.synthetic import make_stocks
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+
+def _assert_panel(panel, stocks):
+    assert set(panel) == set(stocks)
+    for key, data in stocks.items():
+        got = panel[key]
+        assert got['date'].tolist() == data['date'].tolist()
+        for field in data.columns[1:]:
+            np.testing.assert_array_equal(got[field].values, data[field].values)
+
+
+def test_missing_stocks_are_recorded_and_added(tmp_path, monkeypatch):
+    monkeypatch.setattr(tvr, 'table_version_path', str(tmp_path / 'version'))
+    path = str(tmp_path / 'panel')
+    stocks, dates = make_stocks(n=20)
+    keys = list(stocks)
+    writer = hpl.PanelWriter(dates[-1], path)
+    for key in keys[:15]:
+        writer.add(key, stocks[key])
+    panel = writer.finish(keys[15:])
+    assert panel.missing == keys[15:]
+    _assert_panel(hpl.attach(dates[-1], path), {k: stocks[k] for k in keys[:15]})
+
+    writer = hpl.PanelWriter(dates[-1], path)
+    writer.add_panel(panel)
+    for key in keys[15:18]:
+        writer.add(key, stocks[key])
+    panel = writer.finish(keys[18:])
+    assert panel.missing == keys[18:]
+    _assert_panel(panel, {k: stocks[k] for k in keys[:18]})
+
+
+def test_remove_old_keeps_lock_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(tvr, 'table_version_path', str(tmp_path / 'version'))
+    path = str(tmp_path)
+    stocks, dates = make_stocks(n=3)
+    days = dates[-hpl.KEEP_PANELS - 2:]
+    for day in days:
+        with hpl.lock(day, path):
+            writer = hpl.PanelWriter(day, path)
+            for key, data in stocks.items():
+                writer.add(key, data)
+            writer.finish()
+    files = os.listdir(path)
+    assert sorted(f for f in files if f.endswith('.json')) == [d.replace('-', '') + '.json'
+                                                               for d in days[-hpl.KEEP_PANELS:]]
+    assert sorted(f for f in files if f.endswith('.lock')) == [d.replace('-', '') + '.lock' for d in days]
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import numpy as np
+import pandas as pd
+import instock.core.hist_store as hst
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+
+def _frame(start, n, value):
+    data = pd.DataFrame({'date': pd.bdate_range(start, periods=n).strftime('%Y-%m-%d').astype(object)})
+    for field in hst.HIST_FIELDS[1:]:
+        data[field] = np.arange(n, dtype=np.float64) + value
+    return data
+
+
+def _assert_frame(store, code, expected):
+    got = store.get_frame(code)
+    assert list(got.columns) == list(hst.HIST_FIELDS)
+    assert got['date'].tolist() == expected['date'].tolist()
+    for field in hst.HIST_FIELDS[1:]:
+        np.testing.assert_array_equal(got[field].values, expected[field].values)
+
+
+def test_append_and_reopen(tmp_path):
+    store = hst.HistStore(str(tmp_path))
+    a1, a2, b = _frame('2024-01-01', 5, 0), _frame('2024-01-08', 3, 100), _frame('2024-01-01', 4, 50)
+    with store.batch():
+        store.append('A', a1)
+        store.append('B', b)
+        store.append('A', a2)
+    expected = pd.concat([a1, a2], ignore_index=True)
+    _assert_frame(store, 'A', expected)
+    _assert_frame(store, 'B', b)
+    assert store.last_day('A') == hst.to_days(a2['date'].values[-1:])[0]
+    reopened = hst.HistStore(str(tmp_path))
+    assert sorted(reopened.codes()) == ['A', 'B']
+    _assert_frame(reopened, 'A', expected)
+
+
+def test_upsert_replaces_overlapping_dates(tmp_path):
+    store = hst.HistStore(str(tmp_path))
+    store.upsert('A', _frame('2024-01-01', 10, 0))
+    update = _frame('2024-01-10', 4, 100)
+    store.upsert('A', update)
+    expected = pd.concat([_frame('2024-01-01', 10, 0).iloc[:7], update], ignore_index=True)
+    _assert_frame(store, 'A', expected)
+    assert store.length('A') == 11
+
+
+def test_compact_keeps_data(tmp_path):
+    store = hst.HistStore(str(tmp_path))
+    expected = {}
+    for i in range(30):
+        for code in ('A', 'B', 'C'):
+            data = _frame(pd.Timestamp('2024-01-01') + pd.offsets.BDay(i), 1, i)
+            store.upsert(code, data)
+            expected[code] = pd.concat([expected.get(code), data], ignore_index=True)
+    store.upsert('B', _frame('2024-01-05', 2, 500))
+    expected['B'] = pd.concat([expected['B'].iloc[:4], _frame('2024-01-05', 2, 500)], ignore_index=True)
+    generation = store._generation
+    store.compact()
+    assert store._generation == generation + 1
+    assert all(len(store._index[code]) == 1 for code in expected)
+    files = os.listdir(str(tmp_path))
+    assert not any(f.endswith(f".{generation}.bin") for f in files)
+    for code, data in expected.items():
+        _assert_frame(store, code, data)
+        _assert_frame(hst.HistStore(str(tmp_path)), code, data)
+
+
+def test_reader_sees_other_writer(tmp_path):
+    writer = hst.HistStore(str(tmp_path))
+    reader = hst.HistStore(str(tmp_path))
+    writer.append('A', _frame('2024-01-01', 3, 0))
+    assert reader.has('A')
+    writer.compact()
+    writer.append('A', _frame('2024-01-04', 2, 10))
+    _assert_frame(reader, 'A', pd.concat([_frame('2024-01-01', 3, 0), _frame('2024-01-04', 2, 10)],
+                                         ignore_index=True))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+import numpy as np
+import instock.core.tablestructure as tbs
+import instock.core.indicator.calculate_indicator as idr
+import instock.core.indicator.panel_indicator as pidr
+import instock.core.indicator.panel_talib as ptl
+from tests.synthetic import make_stocks, load_expected, INDICATOR_DATES
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+COLUMNS = ['date', 'code'] + list(tbs.STOCK_STATS_DATA['columns'])
+
+
+# 原来(基线提交)逐行计算 supertrend 的循环。
+def _supertrend_loop(close, b_ub, b_lb):
+    size = len(close)
+    ub = np.empty(size)
+    lb = np.empty(size)
+    st = np.empty(size)
+    for i in range(size):
+        if i == 0:
+            ub[i] = b_ub[i]
+            lb[i] = b_lb[i]
+            st[i] = ub[i] if close[i] <= ub[i] else lb[i]
+            continue
+        last_close = close[i - 1]
+        ub[i] = b_ub[i] if b_ub[i] < ub[i - 1] or last_close > ub[i - 1] else ub[i - 1]
+        lb[i] = b_lb[i] if b_lb[i] > lb[i - 1] or last_close < lb[i - 1] else lb[i - 1]
+        if st[i - 1] == ub[i - 1]:
+            st[i] = ub[i] if close[i] <= ub[i] else lb[i]
+        elif st[i - 1] == lb[i - 1]:
+            st[i] = lb[i] if close[i] > lb[i] else ub[i]
+    return ub, lb, st
+
+
+def test_supertrend_matches_loop():
+    rng = np.random.RandomState(1)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, .03, (50, 200)), axis=1))
+    width = close * rng.uniform(0.02, 0.1, close.shape)
+    b_ub, b_lb = close + width + rng.normal(0, .1, close.shape), close - width + rng.normal(0, .1, close.shape)
+    ub, lb, st = idr.supertrend(close, b_ub, b_lb)
+    for i in range(len(close)):
+        expected = _supertrend_loop(close[i], b_ub[i], b_lb[i])
+        for got, exp in zip((ub[i], lb[i], st[i]), expected):
+            np.testing.assert_array_equal(got, exp)
+
+
+def test_panel_talib_matches_talib():
+    rng = np.random.RandomState(3)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, .03, (20, 120)), axis=1))
+    high, low = close * 1.02, close * 0.97
+    volume = rng.uniform(1e6, 5e7, close.shape)
+    calls = [(ptl.MA, (close,), {'timeperiod': 20}), (ptl.EMA, (close,), {'timeperiod': 9}),
+             (ptl.SUM, (close,), {'timeperiod': 26}), (ptl.MAX, (close,), {'timeperiod': 28}),
+             (ptl.MIN, (close,), {'timeperiod': 28}), (ptl.ROC, (close,), {'timeperiod': 12}),
+             (ptl.MACD, (close,), {}), (ptl.PPO, (close,), {'matype': 1}),
+             (ptl.STOCH, (high, low, close), {'fastk_period': 9, 'slowk_period': 5, 'slowk_matype': 1,
+                                              'slowd_period': 5, 'slowd_matype': 1}),
+             (ptl.BBANDS, (close,), {'timeperiod': 20}), (ptl.TRIX, (close,), {'timeperiod': 12}),
+             (ptl.TEMA, (close,), {'timeperiod': 14}), (ptl.RSI, (close,), {'timeperiod': 6}),
+             (ptl.ATR, (high, low, close), {}), (ptl.WILLR, (high, low, close), {'timeperiod': 10}),
+             (ptl.CCI, (high, low, close), {'timeperiod': 84}), (ptl.MFI, (high, low, close, volume), {}),
+             (ptl.OBV, (close, volume), {}), (ptl.SAR, (high, low), {})]
+    for fun, args, kwargs in calls:
+        got = fun(*args, **kwargs)
+        for i in range(len(close)):
+            expected = fun(*[a[i] for a in args], **kwargs)
+            for g, e in zip(got if isinstance(got, tuple) else (got,),
+                            expected if isinstance(expected, tuple) else (expected,)):
+                np.testing.assert_allclose(g[i], e, rtol=1e-9, atol=1e-9, err_msg=fun.__name__)
+
+
+
+# 预期值为原来逐只计算的 get_indicator 对每4只股票的结果。
+def _sample():
+    stocks, dates = make_stocks()
+    return dict(list(stocks.items())[::4]), dates
+
+
+def _assert_matches_expected(got, expected):
+    assert set(got) == set(expected.index)
+    for code, values in got.items():
+        np.testing.assert_allclose(values, expected.loc[code, COLUMNS[2:]].values.astype(float),
+                                   rtol=1e-9, atol=1e-9, err_msg=code)
+
+
+def test_panel_indicators_match_baseline():
+    stocks, dates = _sample()
+    expected = load_expected('indicators')
+    for day in INDICATOR_DATES:
+        results = pidr.get_indicators_last(stocks, COLUMNS, date=datetime.date.fromisoformat(dates[day]))
+        assert all(series['date'] == dates[day] for series in results.values())
+        got = {key[1]: series.values[2:].astype(float) for key, series in results.items()}
+        _assert_matches_expected(got, expected[expected['date'] == dates[day]].set_index('code'))
+
+
+def test_indicators_range_matches_baseline():
+    stocks, dates = _sample()
+    expected = load_expected('indicators')
+    days = [datetime.date.fromisoformat(dates[d]) for d in INDICATOR_DATES]
+    data = pidr.get_indicators_range(stocks, COLUMNS, days)
+    assert list(data.columns) == COLUMNS
+    for day in INDICATOR_DATES:
+        rows = data[data['date'] == dates[day]]
+        got = {code: values.astype(float) for code, values in zip(rows['code'], rows[COLUMNS[2:]].values)}
+        assert len(got) == len(rows)
+        _assert_matches_expected(got, expected[expected['date'] == dates[day]].set_index('code'))
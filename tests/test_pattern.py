@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+import numpy as np
+import instock.core.tablestructure as tbs
+import instock.core.pattern.pattern_recognitions as kpr
+from tests.synthetic import make_stocks, load_expected, PATTERN_DATES
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+COLUMNS = tbs.STOCK_KLINE_PATTERN_DATA['columns']
+
+
+# 预期值为原来逐只计算的 get_pattern_recognition 的结果：{(日期, 代码): 形态值/100 的数组}，只有有形态的股票。
+def expected_patterns():
+    names = list(COLUMNS)
+    expected = {}
+    for date, code, patterns in load_expected('patterns').itertuples(index=False):
+        values = np.zeros(len(names), dtype=np.int8)
+        for item in patterns.split(';'):
+            name, value = item.split('=')
+            values[names.index(name)] = int(value) // 100
+        expected[(date, code)] = values
+    return expected
+
+
+def test_scan_patterns_match_baseline():
+    stocks, dates = make_stocks()
+    expected = expected_patterns()
+    for day in PATTERN_DATES:
+        keys, values = kpr.scan_patterns(stocks, COLUMNS, date=datetime.date.fromisoformat(dates[day]))
+        got = {(dates[day], k[1]): v for k, v in zip(keys, values)}
+        day_expected = {k: v for k, v in expected.items() if k[0] == dates[day]}
+        assert day_expected
+        assert set(got) == set(day_expected)
+        for k, v in day_expected.items():
+            np.testing.assert_array_equal(got[k], v, err_msg=str(k))
+
+
+def test_scan_patterns_range_matches_baseline():
+    stocks, dates = make_stocks()
+    days = [datetime.date.fromisoformat(dates[d]) for d in PATTERN_DATES]
+    keys, values = kpr.scan_patterns_range(stocks, COLUMNS, days)
+    got = {k[:2]: v for k, v in zip(keys, values)}
+    expected = expected_patterns()
+    assert set(got) == set(expected)
+    for k, v in expected.items():
+        np.testing.assert_array_equal(got[k], v, err_msg=str(k))
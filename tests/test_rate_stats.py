@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import instock.core.backtest.rate_stats as rate
+from tests.synthetic import make_stocks, load_expected, rate_signals
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+
+# 预期值为原来逐个信号调用 get_rates 的结果，只有取得到数据的信号，顺序同信号。
+def test_rates_matrix_matches_baseline():
+    stocks, dates = make_stocks()
+    signals = rate_signals(stocks, dates)
+    expected = load_expected('rates')
+    valid, rates = rate.get_rates_matrix(signals, stocks, dates[-1])
+    assert [signals[i] for i in valid] == list(expected[['date', 'code', 'name']].itertuples(index=False, name=None))
+    assert len(valid) < len(signals)
+    np.testing.assert_array_equal(rates, expected.iloc[:, 3:].values.astype(float))
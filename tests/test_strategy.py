@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+import instock.core.tablestructure as tbs
+import instock.core.strategy.screen as scr
+from tests.synthetic import make_stocks, load_expected, is_top, STRATEGY_DATES
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+
+# 预期值为原来逐只调用各策略函数选中的股票：{(日期, 策略表名): 代码集合}。
+def expected_hits():
+    return {(date, name): set(codes.split()) if isinstance(codes, str) else set()
+            for date, name, codes in load_expected('strategies').itertuples(index=False)}
+
+
+# 下面单日比较的两天里每个策略都有选中的股票。
+def test_expected_hits_cover_every_strategy():
+    _, dates = make_stocks(n=1)
+    expected = expected_hits()
+    for strategy in tbs.TABLE_CN_STOCK_STRATEGIES:
+        assert expected[(dates[-2], strategy['name'])] | expected[(dates[-1], strategy['name'])], strategy['name']
+
+
+def test_check_matches_baseline():
+    stocks, dates = make_stocks()
+    expected = expected_hits()
+    for day in (-2, -1):
+        date = datetime.date.fromisoformat(dates[day])
+        for strategy in tbs.TABLE_CN_STOCK_STRATEGIES:
+            func = strategy['func']
+            if func.__name__ == 'check_high_tight':
+                got = {k[1] for k, data in stocks.items() if func(k, data, date=date, istop=is_top(k[1]))}
+            else:
+                got = {k[1] for k, data in stocks.items() if func(k, data, date=date)}
+            assert got == expected[(dates[day], strategy['name'])], strategy['name']
+
+
+def test_screen_matches_baseline():
+    stocks, dates = make_stocks()
+    tops = {k[1] for k in stocks if is_top(k[1])}
+    expected = expected_hits()
+    for day, date in ((-2, datetime.date.fromisoformat(dates[-2])), (-1, None)):
+        results = scr.screen(stocks, tbs.TABLE_CN_STOCK_STRATEGIES, date=date, tops=tops)
+        for strategy in tbs.TABLE_CN_STOCK_STRATEGIES:
+            got = {k[1] for k in results[strategy['name']]}
+            assert got == expected[(dates[day], strategy['name'])], strategy['name']
+
+
+def test_screen_range_matches_baseline():
+    stocks, dates = make_stocks()
+    days = [datetime.date.fromisoformat(dates[d]) for d in STRATEGY_DATES]
+    tops = {k[1] for k in stocks if is_top(k[1])}
+    results = scr.screen_range(stocks, tbs.TABLE_CN_STOCK_STRATEGIES, days,
+                               tops={d.strftime("%Y-%m-%d"): tops for d in days})
+    expected = expected_hits()
+    for strategy in tbs.TABLE_CN_STOCK_STRATEGIES:
+        got = {k[:2] for k in results.get(strategy['name'], [])}
+        assert got == {(dates[d], code) for d in STRATEGY_DATES for code in expected[(dates[d], strategy['name'])]}, \
+            strategy['name']